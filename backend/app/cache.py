@@ -0,0 +1,96 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    In-process cache for the results of coroutines.
+
+    Entries expire `ttl` seconds after being stored and the least recently used
+    entry is evicted once `maxsize` entries are stored. Concurrent misses of the
+    same key share a single call to the loader.
+
+    Usage:
+
+    ```python
+    cache = TTLCache(ttl=60, maxsize=128)
+    parties = await cache.get_or_load("parties", lambda: fetch_parties(es))
+    cache.invalidate()
+    ```
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 128):
+        """
+        Args:
+            ttl (float): Seconds an entry is served before it is loaded again.
+            maxsize (int): Maximum number of entries stored.
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Task] = {}
+        self._generation = 0
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Get the value of a key, loading it on a miss.
+
+        Args:
+            key (Hashable): Cache key.
+            loader (Callable[[], Awaitable[Any]]): Coroutine function returning the value of the key.
+
+        Returns:
+            Any: The cached or loaded value. Exceptions raised by the loader are propagated and not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader, self._generation))
+            self._loading[key] = task
+
+        # A waiter being cancelled must not cancel the load shared with other waiters
+        return await asyncio.shield(task)
+
+    async def _load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]], generation: int
+    ) -> Any:
+        try:
+            value = await loader()
+        finally:
+            if self._loading.get(key) is asyncio.current_task():
+                del self._loading[key]
+
+        # Values loaded before an invalidation may already be stale
+        if generation == self._generation:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """
+        Remove a key, or every key, from the cache.
+
+        Args:
+            key (Optional[Hashable]): Key to remove. Removes every key when None.
+        """
+        if key is None:
+            self._entries.clear()
+            self._loading.clear()
+        else:
+            self._entries.pop(key, None)
+            self._loading.pop(key, None)
+        self._generation += 1
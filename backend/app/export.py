@@ -0,0 +1,133 @@
+import asyncio
+import csv
+import io
+import os
+from contextlib import suppress
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from app.responses import FLOAT_FIELDS, POLITICIAN_FIELDS, dumps
+
+# Number of politicians fetched by each search of an export.
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 5000))
+# How long the point in time of an export is kept between two searches.
+EXPORT_KEEP_ALIVE = os.environ.get("EXPORT_KEEP_ALIVE", "1m")
+
+
+async def search_all(
+    es: AsyncElasticsearch,
+    pit_id: str,
+    query: Dict[str, Any],
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Iterate over every hit of a query with a point in time and `search_after`.
+
+    The search of the next batch is sent as soon as a batch is received, so it
+    runs while the current batch is being serialized and sent. At most two
+    batches are held in memory whatever the number of hits. The point in time
+    is closed once the iteration stops.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        pit_id (str): Point in time opened over the politicians index.
+        query (Dict[str, Any]): Query selecting the politicians.
+        batch_size (int): Number of hits per search.
+
+    Yields:
+        List[Dict[str, Any]]: Batches of hits, in index order.
+    """
+
+    def search(pit_id: str, search_after: Optional[List[Any]] = None):
+        body = {
+            "query": query,
+            "_source": POLITICIAN_FIELDS,
+            "size": batch_size,
+            "track_total_hits": False,
+            "pit": {"id": pit_id, "keep_alive": EXPORT_KEEP_ALIVE},
+            # Index order is the cheapest sort and unique across shards
+            "sort": [{"_shard_doc": {"order": "asc"}}],
+        }
+        if search_after:
+            body["search_after"] = search_after
+        return asyncio.create_task(es.search(body=body))
+
+    pending = search(pit_id)
+    try:
+        while True:
+            response = await pending
+            pending = None
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            if len(hits) == batch_size:
+                pending = search(pit_id, hits[-1]["sort"])
+            if hits:
+                yield hits
+            if pending is None:
+                break
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await pending
+        await es.close_point_in_time(id=pit_id)
+
+
+def format_decimal(value: Any) -> str:
+    # Same format as the imported CSV: comma as decimal separator
+    if value is None or value == "":
+        return ""
+    return f"{float(value):.2f}".replace(".", ",")
+
+
+def csv_header() -> bytes:
+    """
+    Returns:
+        bytes: Header of the import CSV format. It starts with a UTF-8 BOM so
+        spreadsheet applications detect the encoding, the import accepts files
+        with or without it.
+    """
+    return (
+        "\ufeff" + ";".join(field.upper() for field in POLITICIAN_FIELDS) + "\n"
+    ).encode("utf-8")
+
+
+def csv_rows(hits: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Serialize hits as rows of the import CSV format.
+
+    Args:
+        hits (Iterable[Dict[str, Any]]): Search hits of politicians.
+
+    Returns:
+        bytes: The UTF-8 encoded rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";", lineterminator="\n")
+    for hit in hits:
+        source = hit["_source"]
+        writer.writerow(
+            [
+                format_decimal(source.get(field))
+                if field in FLOAT_FIELDS
+                else source.get(field)
+                for field in POLITICIAN_FIELDS
+            ]
+        )
+    return buffer.getvalue().encode("utf-8")
+
+
+def ndjson_rows(hits: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Serialize hits as one JSON politician with its `_id` per line.
+
+    Args:
+        hits (Iterable[Dict[str, Any]]): Search hits of politicians.
+
+    Returns:
+        bytes: The UTF-8 encoded lines.
+    """
+    return b"".join(
+        dumps({"_id": hit["_id"], **hit["_source"]}) + b"\n" for hit in hits
+    )
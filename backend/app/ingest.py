@@ -0,0 +1,617 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from contextlib import suppress
+from typing import IO, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from elasticsearch import ApiError
+from elasticsearch.helpers import expand_action
+from fastapi.concurrency import run_in_threadpool
+
+from app.schemas import BulkChunkReport, Politician
+from app.search import type_map
+from app.utils import to_float_series
+
+# Number of CSV rows parsed per chunk. Peak memory of an import is bounded by
+# CSV_CHUNK_SIZE * (CSV_PREFETCH_CHUNKS + 1) rows regardless of the file size.
+CSV_CHUNK_SIZE = int(os.environ.get("CSV_CHUNK_SIZE", 5000))
+CSV_PREFETCH_CHUNKS = int(os.environ.get("CSV_PREFETCH_CHUNKS", 2))
+
+# Parallel bulk indexing defaults, overridable per request on POST /bulk.
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", 4))
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 500))
+BULK_MAX_CHUNK_BYTES = int(os.environ.get("BULK_MAX_CHUNK_BYTES", 10 * 1024 * 1024))
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", 5))
+BULK_INITIAL_BACKOFF = float(os.environ.get("BULK_INITIAL_BACKOFF", 1))
+BULK_MAX_BACKOFF = float(os.environ.get("BULK_MAX_BACKOFF", 30))
+
+# Fields identifying a politician, the id of each imported row is derived from
+# them so re-importing a file updates documents instead of duplicating them.
+# When empty the id is the hash of the whole row.
+BULK_ID_FIELDS = [
+    field.strip()
+    for field in os.environ.get("BULK_ID_FIELDS", "nombre,cargo,institucion").split(",")
+    if field.strip()
+]
+
+# Field storing the hash of the imported row, used to skip unchanged rows.
+CONTENT_HASH_FIELD = "content_hash"
+CONTENT_HASH_MAPPING = {"type": "keyword", "index": False, "doc_values": False}
+
+# Maximum number of row errors reported by an import, every invalid row is still counted.
+BULK_MAX_ROW_ERRORS = int(os.environ.get("BULK_MAX_ROW_ERRORS", 100))
+
+# Columns that must have a value for a row to be imported.
+REQUIRED_COLUMNS = ("nombre",)
+
+# Statuses returned by a cluster that is temporarily overloaded.
+RETRYABLE_STATUSES = (429, 503)
+
+_END_OF_FILE = object()
+_WORKER_DONE = object()
+
+
+def open_csv_reader(file: IO, chunk_size: int = CSV_CHUNK_SIZE):
+    """
+    Open a chunked pandas reader over a politicians CSV export.
+
+    Args:
+        file (IO): Binary file object with the CSV contents.
+        chunk_size (int): Number of rows returned by each read.
+
+    Returns:
+        TextFileReader: Iterator of DataFrames with at most `chunk_size` rows.
+    """
+    return pd.read_csv(
+        file,
+        delimiter=";",
+        decimal=",",
+        engine="c",
+        encoding="utf-8-sig",
+        chunksize=chunk_size,
+    )
+
+
+def _hash(value: Any) -> str:
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode(
+            "utf-8"
+        )
+    ).hexdigest()
+
+
+def add_document_ids(records: List[Dict[str, Any]], id_fields: List[str]):
+    """
+    Add a deterministic `_id` and the content hash to documents.
+
+    Args:
+        records (List[Dict[str, Any]]): Documents parsed from a CSV chunk, modified in place.
+        id_fields (List[str]): Fields the id is derived from, the whole document when empty.
+    """
+    for record in records:
+        content_hash = _hash(record)
+        record["_id"] = (
+            _hash([record.get(field) for field in id_fields])
+            if id_fields
+            else content_hash
+        )
+        record[CONTENT_HASH_FIELD] = content_hash
+
+
+class RowValidator:
+    """
+    Validates and coerces CSV chunks column by column before they are indexed.
+
+    Salary columns are converted to floats accepting `,` as decimal separator,
+    missing values of every politician field are replaced by the `null_value`
+    of their mapping, and rows with an invalid salary or without a required
+    column are dropped, so the cluster never receives a document it would reject.
+    Rows with the id of a previous row of the same chunk are dropped as well,
+    instead of silently overwriting it. Duplicates across chunks are only
+    found by the bulk results, see `reject_duplicate`.
+
+    Usage:
+
+    ```python
+    validator = RowValidator()
+    valid = validator.validate(df)
+    print(validator.rejected, validator.errors)
+    ```
+    """
+
+    def __init__(self, max_errors: int = BULK_MAX_ROW_ERRORS):
+        """
+        Args:
+            max_errors (int): Maximum number of errors kept for the report.
+        """
+        self.max_errors = max_errors
+        self.rejected = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def validate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Args:
+            df (pd.DataFrame): Chunk with lowercase column names, indexed by row number in the file.
+
+        Returns:
+            pd.DataFrame: The valid rows, coerced.
+        """
+        invalid = pd.Series(False, index=df.index)
+
+        for field, field_info in Politician.model_fields.items():
+            null_value = type_map[field_info.annotation].get("null_value")
+            if field_info.annotation is float:
+                null_value = float(null_value)
+            if field not in df:
+                df[field] = null_value
+                continue
+
+            if field_info.annotation is float:
+                values, errors = to_float_series(df[field])
+                self._record(df.loc[errors, field], "Could not convert string to float")
+            else:
+                values = df[field].astype("string").str.strip()
+                errors = pd.Series(False, index=df.index)
+                if field in REQUIRED_COLUMNS:
+                    errors = (values.fillna("") == "").astype(bool)
+                    self._record(df.loc[errors, field], "Missing value")
+
+            invalid |= errors
+            df[field] = values.astype(object).where(values.notna(), null_value)
+
+        self.rejected += int(invalid.sum())
+        return df[~invalid]
+
+    def drop_duplicate_ids(
+        self, records: List[Dict[str, Any]], rows: List[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        Args:
+            records (List[Dict[str, Any]]): Documents of a chunk with an `_id`, see `add_document_ids`.
+            rows (List[int]): Row number in the file of each document.
+
+        Returns:
+            List[Dict[str, Any]]: The documents whose id was not seen in a previous row of the chunk.
+        """
+        first_rows: Dict[str, int] = {}
+        unique = []
+        for record, row in zip(records, rows):
+            first = first_rows.setdefault(record["_id"], row)
+            if first == row:
+                unique.append(record)
+            else:
+                self.reject_duplicate(record["_id"], row, first)
+        return unique
+
+    def reject_duplicate(
+        self, id: str, row: Optional[int] = None, first: Optional[int] = None
+    ):
+        """
+        Counts a row whose id was already imported from a previous row.
+
+        Args:
+            id (str): Id of the row.
+            row (Optional[int]): Row number in the file, when known.
+            first (Optional[int]): Row number of the previous row, when known.
+        """
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(
+                {
+                    "row": None if row is None else row + 2,
+                    "id": id,
+                    "error": "Duplicate id of a previous row"
+                    if first is None
+                    else f"Duplicate id of row {first + 2}",
+                }
+            )
+
+    def _record(self, values: pd.Series, error: str):
+        for row, value in values.head(self.max_errors - len(self.errors)).items():
+            self.errors.append(
+                {
+                    # Line in the file, after the header
+                    "row": int(row) + 2,
+                    "column": values.name,
+                    "value": None if pd.isna(value) else str(value),
+                    "error": error,
+                }
+            )
+
+
+def read_csv_chunk(
+    reader,
+    id_fields: Optional[List[str]] = None,
+    validator: Optional[RowValidator] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Read the next chunk from a CSV reader and convert it to documents.
+
+    Args:
+        reader (TextFileReader): Reader returned by `open_csv_reader`.
+        id_fields (Optional[List[str]]): Add ids derived from these fields, see `add_document_ids`. No ids when None.
+        validator (Optional[RowValidator]): Validate and coerce the rows, dropping the invalid ones and
+            the ones with the id of a previous row.
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: List of row dicts with lowercase keys, or None when the file is exhausted.
+    """
+    df = next(reader, None)
+    if df is None:
+        return None
+
+    df = df.rename(lambda x: x.lower(), axis="columns")
+    if validator is not None:
+        df = validator.validate(df)
+    df = df.replace(np.nan, None)
+    records = df.to_dict(orient="records")
+    if id_fields is not None:
+        add_document_ids(records, id_fields)
+        if validator is not None:
+            records = validator.drop_duplicate_ids(records, df.index.tolist())
+    return records
+
+
+async def csv_row_generator(
+    upload_file,
+    index: str = "politicians",
+    chunk_size: int = CSV_CHUNK_SIZE,
+    prefetch: int = CSV_PREFETCH_CHUNKS,
+    id_fields: Optional[List[str]] = BULK_ID_FIELDS,
+    validator: Optional[RowValidator] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream bulk actions from an uploaded CSV file.
+
+    Chunks are parsed in the threadpool by a background task that stays up to
+    `prefetch` chunks ahead of the consumer, so parsing overlaps with indexing
+    while only a bounded number of rows is held in memory.
+
+    Args:
+        upload_file (UploadFile): The uploaded CSV file.
+        index (str): Index the actions target.
+        chunk_size (int): Number of rows parsed at a time.
+        prefetch (int): Number of parsed chunks buffered ahead of the consumer.
+        id_fields (Optional[List[str]]): Fields the `_id` of each row is derived from, see `add_document_ids`.
+            Elasticsearch generates the ids when None.
+        validator (Optional[RowValidator]): Validates the rows of each chunk while it is parsed.
+
+    Yields:
+        Dict[str, Any]: Bulk action for each CSV row.
+    """
+    reader = await run_in_threadpool(open_csv_reader, upload_file.file, chunk_size)
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=max(prefetch, 1))
+
+    async def produce():
+        try:
+            while True:
+                records = await run_in_threadpool(
+                    read_csv_chunk, reader, id_fields, validator
+                )
+                if records is None:
+                    break
+                await chunks.put(records)
+        except Exception as e:
+            await chunks.put(e)
+        await chunks.put(_END_OF_FILE)
+
+    producer = asyncio.create_task(produce())
+
+    try:
+        while True:
+            records = await chunks.get()
+            if records is _END_OF_FILE:
+                break
+            if isinstance(records, Exception):
+                raise records
+
+            for data in records:
+                yield {"_index": index, **data}
+    finally:
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
+        reader.close()
+
+
+class SkipUnchanged:
+    """
+    Drops the bulk actions of documents already indexed with the same content hash,
+    so re-importing a file only writes the rows that changed.
+
+    Usage:
+
+    ```python
+    unchanged = SkipUnchanged(es, "politicians")
+    async for action in unchanged.filter(actions):
+        ...
+    print(unchanged.skipped)
+    ```
+    """
+
+    def __init__(
+        self,
+        client,
+        index: str,
+        batch_size: int = BULK_CHUNK_SIZE,
+        fields: Optional[List[str]] = None,
+        on_replace: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        """
+        Args:
+            client (AsyncElasticsearch): Elasticsearch client.
+            index (str): Index the actions target.
+            batch_size (int): Number of documents looked up with each mget request.
+            fields (Optional[List[str]]): Fields of the indexed documents passed to `on_replace`.
+            on_replace (Optional[Callable[[Dict[str, Any]], None]]): Called with the indexed version of each changed document.
+        """
+        self.client = client
+        self.index = index
+        self.batch_size = batch_size
+        self.fields = fields or []
+        self.on_replace = on_replace
+        self.skipped = 0
+
+    async def filter(
+        self, actions: AsyncIterator[Dict[str, Any]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Args:
+            actions (AsyncIterator[Dict[str, Any]]): Bulk actions with an `_id` and a content hash.
+
+        Yields:
+            Dict[str, Any]: Actions of new or changed documents.
+        """
+        batch = []
+        async for action in actions:
+            batch.append(action)
+            if len(batch) >= self.batch_size:
+                for changed in await self._changed(batch):
+                    yield changed
+                batch = []
+        if batch:
+            for changed in await self._changed(batch):
+                yield changed
+
+    async def _changed(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        response = await self.client.mget(
+            index=self.index,
+            ids=[action["_id"] for action in batch],
+            source_includes=[CONTENT_HASH_FIELD] + self.fields,
+        )
+        indexed = {
+            doc["_id"]: doc["_source"] for doc in response["docs"] if doc.get("found")
+        }
+
+        changed = []
+        for action in batch:
+            source = indexed.get(action["_id"])
+            if (
+                source is not None
+                and source.get(CONTENT_HASH_FIELD) == action[CONTENT_HASH_FIELD]
+            ):
+                self.skipped += 1
+                continue
+            if source is not None and self.on_replace is not None:
+                self.on_replace(source)
+            changed.append(action)
+        return changed
+
+
+def _dumps(data: Dict[str, Any]) -> bytes:
+    return json.dumps(
+        data, separators=(",", ":"), ensure_ascii=False, default=str
+    ).encode("utf-8")
+
+
+async def chunk_actions(
+    actions: AsyncIterator[Dict[str, Any]],
+    chunk_size: int = BULK_CHUNK_SIZE,
+    max_chunk_bytes: int = BULK_MAX_CHUNK_BYTES,
+) -> AsyncIterator[List[List[bytes]]]:
+    """
+    Group bulk actions into serialized chunks bounded by count and size.
+
+    Args:
+        actions (AsyncIterator[Dict[str, Any]]): Bulk actions to group.
+        chunk_size (int): Maximum number of documents per chunk.
+        max_chunk_bytes (int): Maximum size in bytes of the request body of a chunk.
+
+    Yields:
+        List[List[bytes]]: Chunk of documents, each one as its NDJSON lines.
+    """
+    chunk, chunk_bytes = [], 0
+
+    async for action in actions:
+        operation, data = expand_action(action)
+        lines = [_dumps(operation)]
+        if data is not None:
+            lines.append(_dumps(data))
+        size = sum(len(line) + 1 for line in lines)
+
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + size > max_chunk_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+
+        chunk.append(lines)
+        chunk_bytes += size
+
+    if chunk:
+        yield chunk
+
+
+async def send_bulk_chunk(
+    client,
+    chunk: List[List[bytes]],
+    number: int,
+    max_retries: int = BULK_MAX_RETRIES,
+    initial_backoff: float = BULK_INITIAL_BACKOFF,
+    max_backoff: float = BULK_MAX_BACKOFF,
+    new_index: bool = False,
+) -> Tuple[BulkChunkReport, List[Dict[str, Any]]]:
+    """
+    Send a chunk with the bulk API, retrying rejected documents with exponential backoff.
+
+    Both whole requests and individual documents rejected with a 429 or 503
+    status are retried, waiting `initial_backoff * 2 ** attempt` seconds (capped
+    at `max_backoff`) between attempts.
+
+    Args:
+        client (AsyncElasticsearch): Elasticsearch client.
+        chunk (List[List[bytes]]): Chunk produced by `chunk_actions`.
+        number (int): Sequence number of the chunk, used in the report.
+        max_retries (int): Maximum number of retries for rejected documents.
+        initial_backoff (float): Seconds to wait before the first retry.
+        max_backoff (float): Maximum seconds to wait between retries.
+        new_index (bool): The chunk is loaded into a new index, so a document that
+            is updated instead of created has the id of a previous row of the import.
+
+    Returns:
+        Tuple[BulkChunkReport, List[Dict[str, Any]]]: Timings of the chunk and the bulk items
+        that failed, or that overwrote a previous row of a new index, which keep a 2xx status.
+    """
+    started = time.perf_counter()
+    pending = chunk
+    attempt, took, indexed = 0, 0, 0
+    errors, duplicates = [], []
+
+    while pending:
+        if attempt:
+            await asyncio.sleep(min(max_backoff, initial_backoff * 2 ** (attempt - 1)))
+
+        try:
+            response = await client.bulk(
+                operations=[line for lines in pending for line in lines]
+            )
+        except ApiError as e:
+            if e.meta.status not in RETRYABLE_STATUSES or attempt >= max_retries:
+                raise
+            attempt += 1
+            continue
+
+        took += response["took"]
+        rejected = []
+        for lines, item in zip(pending, response["items"]):
+            _, result = next(iter(item.items()))
+            if 200 <= result["status"] < 300:
+                if new_index and result.get("result") == "updated":
+                    duplicates.append(item)
+                else:
+                    indexed += 1
+            elif result["status"] in RETRYABLE_STATUSES and attempt < max_retries:
+                rejected.append(lines)
+            else:
+                errors.append(item)
+
+        pending = rejected
+        if pending:
+            attempt += 1
+
+    report = BulkChunkReport(
+        chunk=number,
+        docs=len(chunk),
+        bytes=sum(len(line) + 1 for lines in chunk for line in lines),
+        indexed=indexed,
+        failed=len(errors),
+        retries=attempt,
+        took_ms=took,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
+    return report, errors + duplicates
+
+
+async def parallel_bulk(
+    client,
+    actions: AsyncIterator[Dict[str, Any]],
+    workers: int = BULK_WORKERS,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    max_chunk_bytes: int = BULK_MAX_CHUNK_BYTES,
+    max_retries: int = BULK_MAX_RETRIES,
+    initial_backoff: float = BULK_INITIAL_BACKOFF,
+    max_backoff: float = BULK_MAX_BACKOFF,
+    new_index: bool = False,
+) -> AsyncIterator[Tuple[BulkChunkReport, List[Dict[str, Any]]]]:
+    """
+    Index actions with several bulk requests in flight at the same time.
+
+    Chunks are handed to `workers` concurrent senders through a queue holding
+    at most `workers` chunks, so reading the actions pauses whenever the
+    cluster falls behind.
+
+    Usage:
+
+    ```python
+    async for report, errors in parallel_bulk(es, actions, workers=4):
+        print(report.elapsed_ms)
+    ```
+
+    Args:
+        client (AsyncElasticsearch): Elasticsearch client.
+        actions (AsyncIterator[Dict[str, Any]]): Bulk actions to index.
+        workers (int): Number of concurrent bulk requests.
+        chunk_size (int): Maximum number of documents per bulk request.
+        max_chunk_bytes (int): Maximum size in bytes of a bulk request body.
+        max_retries (int): Maximum number of retries for rejected documents.
+        initial_backoff (float): Seconds to wait before the first retry.
+        max_backoff (float): Maximum seconds to wait between retries.
+        new_index (bool): The actions are loaded into a new index, see `send_bulk_chunk`.
+
+    Yields:
+        Tuple[BulkChunkReport, List[Dict[str, Any]]]: Report and failed items of each chunk, in completion order.
+    """
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=workers)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            number = 0
+            async for chunk in chunk_actions(actions, chunk_size, max_chunk_bytes):
+                number += 1
+                await chunks.put((number, chunk))
+        except Exception as e:
+            await results.put(e)
+        finally:
+            for _ in range(workers):
+                await chunks.put(None)
+
+    async def work():
+        try:
+            while (item := await chunks.get()) is not None:
+                number, chunk = item
+                await results.put(
+                    await send_bulk_chunk(
+                        client,
+                        chunk,
+                        number,
+                        max_retries,
+                        initial_backoff,
+                        max_backoff,
+                        new_index,
+                    )
+                )
+        except Exception as e:
+            await results.put(e)
+        finally:
+            await results.put(_WORKER_DONE)
+
+    tasks = [asyncio.create_task(produce())]
+    tasks += [asyncio.create_task(work()) for _ in range(workers)]
+
+    try:
+        finished = 0
+        while finished < workers:
+            result = await results.get()
+            if result is _WORKER_DONE:
+                finished += 1
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
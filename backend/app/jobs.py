@@ -0,0 +1,246 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+# Maximum number of imports waiting to run, further submissions are rejected.
+IMPORT_QUEUE_SIZE = int(os.environ.get("IMPORT_QUEUE_SIZE", 4))
+# Number of imports running at the same time.
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", 1))
+# Number of finished imports whose status is kept.
+IMPORT_JOBS_HISTORY = int(os.environ.get("IMPORT_JOBS_HISTORY", 100))
+
+
+class ImportJob:
+    """
+    Progress of an import running in the background.
+    """
+
+    def __init__(self, upload: UploadFile, size: int):
+        """
+        Args:
+            upload (UploadFile): Copy of the uploaded file owned by the job.
+            size (int): Size in bytes of the file.
+        """
+        self.id = uuid4().hex
+        self.upload = upload
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.bytes_total = size
+        self.indexed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._rows = 0
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    @property
+    def rows_parsed(self) -> int:
+        # Rejected rows are dropped while parsing, before the actions are tracked
+        return self._rows + self.rejected
+
+    async def track(
+        self,
+        actions: AsyncIterator[Dict[str, Any]],
+        progress: Optional[Callable[[], None]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Passes bulk actions through, counting the parsed rows.
+
+        Args:
+            actions (AsyncIterator[Dict[str, Any]]): Bulk actions of the import, before any of them is skipped.
+            progress (Optional[Callable[[], None]]): Called after each row, e.g. to copy
+                the rejected and skipped rows counted elsewhere into the job.
+
+        Yields:
+            Dict[str, Any]: The same bulk actions.
+        """
+        async for action in actions:
+            self._rows += 1
+            if progress is not None:
+                progress()
+            yield action
+        if progress is not None:
+            progress()
+
+    def _bytes_read(self) -> int:
+        if self.finished:
+            return self.bytes_total
+        if self.status == "queued":
+            return 0
+        try:
+            return min(self.upload.file.tell(), self.bytes_total)
+        except (ValueError, OSError):
+            return 0
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Status of the job, with its throughput and the estimated
+            seconds left, extrapolated from the share of the file read so far.
+        """
+        elapsed = self._elapsed
+        if self.status == "running":
+            elapsed = time.perf_counter() - self._started
+
+        bytes_read = self._bytes_read()
+        eta = None
+        if self.status == "running" and bytes_read:
+            eta = round(elapsed * (self.bytes_total - bytes_read) / bytes_read, 1)
+
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "rows_parsed": self.rows_parsed,
+            "indexed": self.indexed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "skipped": self.skipped,
+            "bytes_read": bytes_read,
+            "bytes_total": self.bytes_total,
+            "elapsed_seconds": round(elapsed, 2),
+            "rows_per_second": round(self.rows_parsed / elapsed, 1) if elapsed else 0.0,
+            "eta_seconds": eta,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+class ImportJobQueue:
+    """
+    Bounded queue of imports run in the background by a fixed number of workers.
+
+    Usage:
+
+    ```python
+    jobs = ImportJobQueue(max_queued=4, workers=1)
+    job = await jobs.submit(upload, lambda job: run_import(job.upload, job=job))
+    jobs.get(job.id).report()
+    await jobs.close()
+    ```
+    """
+
+    def __init__(
+        self,
+        max_queued: int = IMPORT_QUEUE_SIZE,
+        workers: int = IMPORT_WORKERS,
+        history: int = IMPORT_JOBS_HISTORY,
+    ):
+        """
+        Args:
+            max_queued (int): Maximum number of jobs waiting to run.
+            workers (int): Number of jobs running at the same time.
+            history (int): Number of finished jobs kept.
+        """
+        self.max_queued = max_queued
+        self.workers = workers
+        self.history = history
+        self._jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self._jobs.get(job_id)
+
+    async def submit(
+        self, upload: UploadFile, run: Callable[[ImportJob], Awaitable[Dict[str, Any]]]
+    ) -> ImportJob:
+        """
+        Copies an uploaded file and queues its import.
+        The copy is needed because the upload is closed once the request ends.
+
+        Args:
+            upload (UploadFile): The uploaded file.
+            run (Callable[[ImportJob], Awaitable[Dict[str, Any]]]): Runs the import of a job and returns its result.
+
+        Returns:
+            ImportJob: The queued job.
+
+        Raises:
+            asyncio.QueueFull: If `max_queued` jobs are already waiting.
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+        if self._queue.full():
+            raise asyncio.QueueFull()
+
+        copy = tempfile.TemporaryFile()
+        try:
+            await run_in_threadpool(shutil.copyfileobj, upload.file, copy, 1024 * 1024)
+            size = copy.tell()
+            copy.seek(0)
+            job = ImportJob(UploadFile(file=copy, filename=upload.filename), size)
+            self._queue.put_nowait((job, run))
+        except BaseException:
+            copy.close()
+            raise
+
+        self._jobs[job.id] = job
+        self._forget_finished()
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._work()) for _ in range(self.workers)
+            ]
+        return job
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+
+    async def _work(self):
+        while True:
+            job, run = await self._queue.get()
+            job.status = "running"
+            job.started_at = datetime.now(timezone.utc)
+            job._started = time.perf_counter()
+            try:
+                job.result = await run(job)
+                job.status = "completed"
+            except Exception as e:
+                print("import job %s failed: %s" % (job.id, e))
+                job.error = getattr(e, "detail", None) or str(e) or type(e).__name__
+                job.status = "failed"
+            finally:
+                job._elapsed = time.perf_counter() - job._started
+                job.finished_at = datetime.now(timezone.utc)
+                await job.upload.close()
+
+    async def close(self):
+        """
+        Cancel running imports and drop the queued ones.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with suppress(asyncio.CancelledError):
+                await worker
+        self._workers = []
+        self._queue = None
+
+        for job in self._jobs.values():
+            if not job.finished:
+                job.status = "failed"
+                job.error = "Cancelled on shutdown"
+                await job.upload.close()
@@ -1,47 +1,257 @@
 from math import ceil
+import asyncio
+import hashlib
 import os
-from fastapi.concurrency import run_in_threadpool
-import pandas as pd
-import numpy as np
-from contextlib import asynccontextmanager
-from typing import List, Optional
-
-from elasticsearch import AsyncElasticsearch, NotFoundError
-from elasticsearch.helpers import async_streaming_bulk
-from fastapi import Depends, FastAPI, File, HTTPException, Query, UploadFile, status
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Dict, List, Optional, Union
+
+from elasticsearch import AsyncElasticsearch, BadRequestError, NotFoundError
+from fastapi import (
+    Depends,
+    FastAPI,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
 from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
+from app.cache import TTLCache
+from app.export import EXPORT_KEEP_ALIVE, csv_header, csv_rows, ndjson_rows, search_all
+from app.jobs import ImportJob, ImportJobQueue
+from app.metrics import (
+    BULK_DOCUMENTS,
+    BULK_IMPORT_DURATION,
+    BULK_RETRIES,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    REGISTRY,
+    CallbackMetric,
+    MetricsMiddleware,
+)
+from app.ingest import (
+    BULK_CHUNK_SIZE,
+    BULK_MAX_CHUNK_BYTES,
+    BULK_MAX_RETRIES,
+    BULK_WORKERS,
+    CONTENT_HASH_FIELD,
+    CONTENT_HASH_MAPPING,
+    CSV_CHUNK_SIZE,
+    RowValidator,
+    SkipUnchanged,
+    csv_row_generator,
+    parallel_bulk,
+)
+from app.responses import (
+    POLITICIAN_FIELDS,
+    FastJSONResponse,
+    dumps,
+    politician_from_hit,
+)
 from app.schemas import (
+    BulkResponse,
+    ClearMode,
     ErrorResponse,
+    ExportFormat,
+    ImportJobResponse,
+    ImportJobStatus,
+    BatchResponse,
     MessageResponse,
     Politician,
     PoliticianEntry,
+    PoliticianIds,
+    PoliticiansBatch,
+    PoliticiansBatchUpdate,
     PoliticianUpdate,
     PoliticiansPaginated,
+    RefreshPolicy,
+    RollupDimension,
+    RollupsResponse,
+    SlowQuery,
     StatisticsResponse,
+    TaskResponse,
+    TaskStatusResponse,
+)
+from app.rollups import (
+    ROLLUP_DIMENSIONS,
+    ROLLUP_METRIC,
+    ImportedGroups,
+    PendingRollups,
+    collect_groups,
+    get_rollups,
+    rebuild_rollups,
+    refresh_rollups,
+)
+from app.search import (
+    POLITICIANS_INDEX,
+    Search,
+    bulk_load_settings,
+    close_es,
+    create_es_mapping,
+    get_es,
+    swap_alias,
+    truncate_index,
+    versioned_index_name,
+)
+from app.slowlog import SlowQueryLog
+from app.utils import decode_cursor, encode_cursor, env_flag
+from app.writebehind import WriteBehindQueue
+
+# How long a cursor of GET /politicians stays valid between two pages.
+PIT_KEEP_ALIVE = os.environ.get("PIT_KEEP_ALIVE", "1m")
+
+# Hits counted accurately by GET /politicians unless an exact count is requested.
+TOTAL_HITS_THRESHOLD = int(os.environ.get("TOTAL_HITS_THRESHOLD", 1000))
+
+# Query parameters filtering GET /politicians and the field each one filters.
+FILTER_FIELDS = {
+    "party": "partido",
+    "gender": "genero",
+    "region": "ccaa",
+    "position": "cargo_para_filtro",
+}
+# Maximum number of values returned for each facet.
+FACET_SIZE = int(os.environ.get("FACET_SIZE", 100))
+
+# Serialize politicians straight from the search hits instead of validating them with Pydantic.
+FAST_RESPONSES_DEFAULT = env_flag("FAST_RESPONSES")
+FAST_RESPONSES_DESCRIPTION = (
+    "Fetch only the politician fields and serialize them straight from the search hits, "
+    "skipping response model validation."
+)
+
+# Number of name suggestions returned by default by GET /politicians/suggest.
+SUGGEST_SIZE = int(os.environ.get("SUGGEST_SIZE", 10))
+
+# Politician fields returned by default, `fields=*` returns all of them.
+POLITICIANS_DEFAULT_FIELDS = [
+    "nombre",
+    "genero",
+    "partido",
+    "cargo",
+    "ccaa",
+    "retribucionmensual",
+    "retribucionanual",
+    "observaciones",
+]
+STATISTICS_DEFAULT_FIELDS = ["nombre", "cargo", "sueldobase_sueldo", "retribucionanual"]
+FIELDS_DESCRIPTION = (
+    "Comma separated list of politician fields to return, or `*` to return all of them."
+)
+
+# Cache of /available_genders and /available_parties, invalidated on every write.
+metadata_cache = TTLCache(
+    ttl=float(os.environ.get("METADATA_CACHE_TTL", 300)),
+    maxsize=int(os.environ.get("METADATA_CACHE_SIZE", 128)),
 )
-from app.search import Search, create_es_mapping, get_es
+
+# Refresh policy of writes to politicians unless the request sets one.
+DEFAULT_REFRESH_POLICY = RefreshPolicy(os.environ.get("WRITE_REFRESH_POLICY", "wait_for"))
+
+# Writes through the write behind queue return right away and are coalesced per
+# politician and flushed with the bulk API every WRITE_BEHIND_FLUSH_INTERVAL seconds.
+WRITE_BEHIND_DEFAULT = env_flag("WRITE_BEHIND")
+WRITE_BEHIND_DESCRIPTION = (
+    "Queue the write and return right away. Queued writes to the same politician are "
+    "merged and applied in bulk shortly after, so a missing politician is not reported."
+)
+write_behind_queue = WriteBehindQueue(
+    POLITICIANS_INDEX,
+    flush_interval=float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", 1)),
+    max_pending=int(os.environ.get("WRITE_BEHIND_MAX_PENDING", 500)),
+    refresh=DEFAULT_REFRESH_POLICY.value,
+    max_retries=int(os.environ.get("WRITE_BEHIND_MAX_RETRIES", 5)),
+    on_flush=lambda: invalidate_caches(),
+    before_flush=lambda es, pending: mark_queued_rollups(es, pending),
+)
+
+# Seconds a /statistics snapshot may be served before it is rebuilt from the cluster.
+STATISTICS_MAX_AGE = float(os.environ.get("STATISTICS_MAX_AGE", 3600))
+# Seconds between scheduled rebuilds of the /statistics snapshot, 0 disables them.
+STATISTICS_REFRESH_INTERVAL = float(os.environ.get("STATISTICS_REFRESH_INTERVAL", 0))
+
+statistics_cache = TTLCache(ttl=STATISTICS_MAX_AGE, maxsize=16)
+# Last-Modified date of the latest /statistics snapshot.
+last_snapshot_date: Optional[datetime] = None
+
+CACHES = {"metadata": metadata_cache, "statistics": statistics_cache}
+REGISTRY.register(
+    CallbackMetric(
+        "cache_hits_total",
+        "Reads served by an in-process cache.",
+        ["cache"],
+        lambda: [((name,), cache.hits) for name, cache in CACHES.items()],
+        type="counter",
+    )
+)
+REGISTRY.register(
+    CallbackMetric(
+        "cache_misses_total",
+        "Reads of an in-process cache that loaded the value.",
+        ["cache"],
+        lambda: [((name,), cache.misses) for name, cache in CACHES.items()],
+        type="counter",
+    )
+)
+
+# Imports queued with POST /bulk?background=true.
+import_jobs = ImportJobQueue()
+
+# Groups whose salary rollups are outdated by writes.
+pending_rollups = PendingRollups()
+
+# Searches of /politicians and /statistics slower than SLOW_QUERY_THRESHOLD_MS.
+slow_queries = SlowQueryLog()
+
+# Keeps a reference to background tasks so they are not garbage collected while running.
+background_tasks = set()
+
+# Seconds between two checks of a clear index task running in the background.
+CLEAR_TASK_POLL_INTERVAL = float(os.environ.get("CLEAR_TASK_POLL_INTERVAL", 1))
+# Clear index tasks still deleting documents, nothing is cached meanwhile.
+clear_tasks = set()
+
 
 @asynccontextmanager
-async def lifespan(_: FastAPI, es: Optional[Search] = Depends(get_es)):
+async def lifespan(_: FastAPI):
     """
     Context manager to handle the lifespan of Elasticsearch connection.
-    It yields control to the caller and automatically closes the Elasticsearch connection when exiting the context.
+    It creates the Elasticsearch connection on startup, yields control to the caller and, when exiting the context,
+    flushes pending writes and closes the Elasticsearch connection.
 
     Args:
         _ (FastAPI): The FastAPI instance.
-        es (Optional[Search]): Optional Elasticsearch connection. Default is obtained from `get_es` dependency.
 
     Yields:
         None
     """
+    Search()
+
+    if STATISTICS_REFRESH_INTERVAL:
+        scheduler = asyncio.create_task(
+            refresh_statistics_periodically(STATISTICS_REFRESH_INTERVAL)
+        )
+
     yield
 
-    es.close()
+    if STATISTICS_REFRESH_INTERVAL:
+        scheduler.cancel()
+
+    await import_jobs.close()
+    await write_behind_queue.close()
+    await slow_queries.close()
+    await close_es()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 # Set all CORS enabled origins
 if os.environ["BACKEND_CORS_ORIGINS"]:
@@ -72,16 +282,64 @@ async def index(es: Optional[Search] = Depends(get_es)):
     return await es.cluster.health()
 
 
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    status_code=status.HTTP_200_OK,
+    description=(
+        "Route to scrape the metrics of the API in the Prometheus text format: latency of "
+        "each route and Elasticsearch operation, imported rows and cache hit ratios."
+    ),
+    tags=["cluster"],
+    summary="Get Prometheus metrics",
+    responses={
+        status.HTTP_200_OK: {
+            "description": "Metrics",
+        },
+    },
+)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get(
+    "/admin/slow_queries",
+    response_model=List[SlowQuery],
+    status_code=status.HTTP_200_OK,
+    description=(
+        "Route to list the latest searches of /politicians and /statistics slower than "
+        "`SLOW_QUERY_THRESHOLD_MS`, newest first, with their query body and request "
+        "parameters. With `SLOW_QUERY_PROFILE` enabled each one also has the breakdown "
+        "of the profile API."
+    ),
+    tags=["admin"],
+    summary="Get slow queries",
+    responses={
+        status.HTTP_200_OK: {
+            "model": List[SlowQuery],
+            "description": "Slow queries",
+        },
+    },
+)
+async def get_slow_queries(limit: Optional[int] = Query(None, ge=1)):
+    return slow_queries.recent(limit)
+
+
 @app.delete(
     "/clear_index/{index_name}",
-    response_model=MessageResponse,
+    response_model=Union[TaskResponse, MessageResponse],
     status_code=status.HTTP_200_OK,
-    description="Route to clear all documents in a specified index.",
+    description=(
+        "Route to clear all documents in a specified index. "
+        "`delete_by_query` deletes every document and waits for it, "
+        "`truncate` replaces the index with an empty copy of it, and "
+        "`task` starts a sliced delete by query in the background and returns its task id."
+    ),
     tags=["indices"],
     summary="Clear index from elasticsearch",
     responses={
         status.HTTP_200_OK: {
-            "model": MessageResponse,
+            "model": Union[TaskResponse, MessageResponse],
             "description": "Ok Response",
         },
         status.HTTP_400_BAD_REQUEST: {
@@ -91,76 +349,883 @@ async def index(es: Optional[Search] = Depends(get_es)):
     },
 )
 async def clear_index_endpoint(
-    index_name: str, es: AsyncElasticsearch = Depends(get_es)
+    index_name: str,
+    mode: ClearMode = ClearMode.delete_by_query,
+    es: AsyncElasticsearch = Depends(get_es),
 ):
     if not await es.indices.exists(index=index_name):
         raise HTTPException(status_code=404, detail="Index not found")
+    pending_rollups.rebuild = True
 
-    await es.delete_by_query(index=index_name, body={"query": {"match_all": {}}})
+    if mode == ClearMode.truncate:
+        await truncate_index(es, index_name)
+    elif mode == ClearMode.task:
+        response = await es.delete_by_query(
+            index=index_name,
+            body={"query": {"match_all": {}}},
+            conflicts="proceed",
+            slices="auto",
+            wait_for_completion=False,
+        )
+        clear_tasks.add(response["task"])
+        task = asyncio.create_task(watch_clear_task(es, response["task"]))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        invalidate_caches()
+        return {
+            "message": f"Clearing documents in index {index_name}",
+            "task_id": response["task"],
+        }
+    else:
+        await es.delete_by_query(index=index_name, body={"query": {"match_all": {}}})
+
+    invalidate_caches()
     return {
         "message": f"All documents in index {index_name} have been successfully cleared"
     }
-        
+
+
+@app.get(
+    "/clear_index/tasks/{task_id}",
+    response_model=TaskStatusResponse,
+    status_code=status.HTTP_200_OK,
+    description="Route to get the progress of a clear index task.",
+    tags=["indices"],
+    summary="Get clear index task status",
+    responses={
+        status.HTTP_200_OK: {
+            "model": TaskStatusResponse,
+            "description": "Ok Response",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": ErrorResponse,
+            "description": "Task not found",
+        },
+    },
+)
+async def clear_index_task_status(
+    task_id: str, es: AsyncElasticsearch = Depends(get_es)
+):
+    try:
+        response = await es.tasks.get(task_id=task_id)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if response["completed"]:
+        finish_clear_task(task_id)
+
+    task_status = response["task"]["status"]
+    return {
+        "task_id": task_id,
+        "completed": response["completed"],
+        "total": task_status.get("total", 0),
+        "deleted": task_status.get("deleted", 0),
+        "failures": response.get("response", {}).get("failures", []),
+    }
+
+
+async def watch_clear_task(es: AsyncElasticsearch, task_id: str):
+    """
+    Waits for a clear index task to complete and then drops what was computed
+    from the partially cleared index.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        task_id (str): Id of the delete by query task.
+    """
+    while task_id in clear_tasks:
+        await asyncio.sleep(CLEAR_TASK_POLL_INTERVAL)
+        try:
+            response = await es.tasks.get(task_id=task_id)
+        except NotFoundError:
+            break
+        except Exception as e:
+            print("failed to check clear index task %s: %s" % (task_id, e))
+            continue
+        if response["completed"]:
+            break
+    finish_clear_task(task_id)
+
+
+def finish_clear_task(task_id: str):
+    """
+    Marks a clear index task as completed, the first time it is seen completed.
+
+    Args:
+        task_id (str): Id of the delete by query task.
+    """
+    if task_id in clear_tasks:
+        clear_tasks.discard(task_id)
+        pending_rollups.rebuild = True
+        invalidate_caches()
+
+
+async def get_cached(cache: TTLCache, key: Any, loader) -> Any:
+    """
+    Gets a value from a cache, or loads it without caching it while a clear
+    index task is deleting documents.
+
+    Args:
+        cache (TTLCache): Cache of the value.
+        key (Any): Cache key.
+        loader (Callable[[], Awaitable[Any]]): Coroutine function returning the value.
+
+    Returns:
+        Any: The cached or loaded value.
+    """
+    if clear_tasks:
+        return await loader()
+    return await cache.get_or_load(key, loader)
+
 
 @app.post(
     "/bulk",
-    response_model=MessageResponse,
+    response_model=Union[BulkResponse, ImportJobResponse],
     status_code=status.HTTP_200_OK,
-    description="Route to bulk upload politicians' data from a CSV file to Elasticsearch.",
+    description=(
+        "Route to bulk upload politicians' data from a CSV file to Elasticsearch. "
+        "With `background` the import is queued and the id of its job is returned right away."
+    ),
     tags=["politicians"],
     summary="Bulk upload CSV politicians file to elasticsearch",
     responses={
         status.HTTP_200_OK: {
-            "model": MessageResponse,
+            "model": BulkResponse,
             "description": "Ok Response",
         },
+        status.HTTP_202_ACCEPTED: {
+            "model": ImportJobResponse,
+            "description": "Import queued",
+        },
         status.HTTP_422_UNPROCESSABLE_ENTITY: {
             "model": ErrorResponse,
             "description": "Unprocessable entity (bad file format)",
         },
-    },
-)
-async def bulk(file: UploadFile = File(...), es: Optional[Search] = Depends(get_es)):
-    if not file.filename.endswith(".csv"):
-        raise HTTPException(status_code=422, detail="Only CSV files are supported")
+        status.HTTP_409_CONFLICT: {
+            "model": ErrorResponse,
+            "description": "The current index must be replaced with reindex=true",
+        },
+        status.HTTP_429_TOO_MANY_REQUESTS: {
+            "model": ErrorResponse,
+            "description": "Too many imports queued",
+        },
+    },
+)
+async def bulk(
+    response: Response,
+    file: UploadFile = File(...),
+    chunk_size: int = Query(
+        CSV_CHUNK_SIZE, ge=1, le=100_000, description="CSV rows parsed at a time"
+    ),
+    workers: int = Query(BULK_WORKERS, ge=1, le=32),
+    bulk_chunk_size: int = Query(
+        BULK_CHUNK_SIZE, ge=1, le=10_000, description="Documents per bulk request"
+    ),
+    max_chunk_bytes: int = Query(BULK_MAX_CHUNK_BYTES, ge=1024, le=100 * 1024 * 1024),
+    max_retries: int = Query(BULK_MAX_RETRIES, ge=0, le=10),
+    fast_load: bool = Query(
+        False, description="Disable refreshes and replicas while loading"
+    ),
+    force_merge: bool = Query(
+        False, description="Force merge the index into a single segment after loading"
+    ),
+    reindex: bool = Query(
+        False,
+        description="Load into a new index and swap it in place of the current one",
+    ),
+    skip_unchanged: bool = Query(
+        True,
+        description=(
+            "When loading into the current index, skip the rows already indexed "
+            "with the same content"
+        ),
+    ),
+    background: bool = Query(
+        False,
+        description="Queue the import and follow its progress on GET /bulk/jobs/{job_id}",
+    ),
+    es: Optional[Search] = Depends(get_es),
+):
+    if not file.filename.endswith(".csv"):
+        raise HTTPException(status_code=422, detail="Only CSV files are supported")
+    if not reindex and not await has_content_hashes(es):
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                "The index was loaded before documents had stable ids, "
+                "import with reindex=true to replace it"
+            ),
+        )
+
+    options = {
+        "chunk_size": chunk_size,
+        "workers": workers,
+        "bulk_chunk_size": bulk_chunk_size,
+        "max_chunk_bytes": max_chunk_bytes,
+        "max_retries": max_retries,
+        "fast_load": fast_load,
+        "force_merge": force_merge,
+        "reindex": reindex,
+        "skip_unchanged": skip_unchanged,
+    }
+    if not background:
+        return await run_import(es, file, **options)
+
+    try:
+        job = await import_jobs.submit(
+            file, lambda job: run_import(es, job.upload, job=job, **options)
+        )
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many imports queued")
+
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {"message": f"Import {job.id} has been queued", "job_id": job.id}
+
+
+@app.get(
+    "/bulk/jobs/{job_id}",
+    response_model=ImportJobStatus,
+    status_code=status.HTTP_200_OK,
+    description="Route to get the progress of an import queued with `background`.",
+    tags=["politicians"],
+    summary="Get import job status",
+    responses={
+        status.HTTP_200_OK: {
+            "model": ImportJobStatus,
+            "description": "Ok Response",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": ErrorResponse,
+            "description": "Job not found",
+        },
+    },
+)
+async def get_import_job(job_id: str):
+    job = import_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.report()
+
+
+async def has_content_hashes(es: AsyncElasticsearch) -> bool:
+    """
+    Checks that the politicians can be imported into the current index.
+    Indices loaded without the content hash mapping have ids generated by
+    Elasticsearch, so importing rows with derived ids would duplicate them.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+
+    Returns:
+        bool: True if every index behind the alias maps the content hash, or there is no index yet.
+    """
+    try:
+        mappings = await es.indices.get_mapping(index=POLITICIANS_INDEX)
+    except NotFoundError:
+        return True
+    return all(
+        CONTENT_HASH_FIELD in mapping["mappings"].get("properties", {})
+        for mapping in mappings.values()
+    )
+
+
+async def run_import(
+    es: AsyncElasticsearch,
+    file: UploadFile,
+    chunk_size: int = CSV_CHUNK_SIZE,
+    workers: int = BULK_WORKERS,
+    bulk_chunk_size: int = BULK_CHUNK_SIZE,
+    max_chunk_bytes: int = BULK_MAX_CHUNK_BYTES,
+    max_retries: int = BULK_MAX_RETRIES,
+    fast_load: bool = False,
+    force_merge: bool = False,
+    reindex: bool = False,
+    skip_unchanged: bool = True,
+    job: Optional[ImportJob] = None,
+) -> Dict[str, Any]:
+    """
+    Imports a politicians CSV file, see POST /bulk for the options.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        file (UploadFile): The CSV file.
+        job (Optional[ImportJob]): Job reporting the progress of the import.
+
+    Returns:
+        Dict[str, Any]: Result of the import, as serialized by `BulkResponse`.
+    """
+    # Full imports build a new versioned index that replaces the current one
+    # behind the alias once loaded, so readers never see a partial index.
+    reindex = reindex or not await es.indices.exists(index=POLITICIANS_INDEX)
+    index = POLITICIANS_INDEX
+    if reindex:
+        index = versioned_index_name(POLITICIANS_INDEX)
+        properties = create_es_mapping(Politician)
+        properties[CONTENT_HASH_FIELD] = CONTENT_HASH_MAPPING
+        await es.indices.create(index=index, body={"mappings": {"properties": properties}})
+
+    started = time.perf_counter()
+    chunks = []
+    groups = ImportedGroups()
+    validator = RowValidator()
+    actions = csv_row_generator(
+        file, index=index, chunk_size=chunk_size, validator=validator
+    )
+    unchanged = None
+
+    def progress():
+        job.rejected = validator.rejected
+        job.skipped = unchanged.skipped if unchanged else 0
+
+    # Rows are counted before the unchanged ones are skipped
+    if job is not None:
+        actions = job.track(actions, progress)
+    # A new index is empty, there is nothing to compare the rows with
+    if skip_unchanged and not reindex:
+        unchanged = SkipUnchanged(
+            es,
+            index,
+            batch_size=bulk_chunk_size,
+            fields=list(ROLLUP_DIMENSIONS.values()),
+            on_replace=pending_rollups.mark,
+        )
+        actions = unchanged.filter(actions)
+    try:
+        async with bulk_load_settings(es, index) if fast_load or reindex else nullcontext():
+            async for report, errors in parallel_bulk(
+                client=es,
+                # A reindex rebuilds every rollup once loaded
+                actions=actions if reindex else collect_groups(actions, groups),
+                workers=workers,
+                chunk_size=bulk_chunk_size,
+                max_chunk_bytes=max_chunk_bytes,
+                max_retries=max_retries,
+                new_index=reindex,
+            ):
+                chunks.append(report)
+                for error in errors:
+                    action, result = error.popitem()
+                    if 200 <= result["status"] < 300:
+                        # Written over a row of another chunk with the same id
+                        validator.reject_duplicate(result.get("_id"))
+                        continue
+                    print("failed to %s document %s" % (action, result.get("_id")))
+                    if len(validator.errors) < validator.max_errors:
+                        reason = result.get("error")
+                        if isinstance(reason, dict):
+                            reason = reason.get("reason", reason.get("type"))
+                        validator.errors.append({"id": result.get("_id"), "error": str(reason)})
+                if job is not None:
+                    job.indexed += report.indexed
+                    job.failed += report.failed
+                    progress()
+        if job is not None:
+            # Rows skipped after the last chunk was sent, or every row when none changed
+            progress()
+
+        await es.indices.refresh(index=index)
+        if force_merge:
+            await es.indices.forcemerge(index=index, max_num_segments=1)
+    except BaseException:
+        if reindex:
+            await es.indices.delete(index=index, ignore_unavailable=True)
+        raise
+
+    if reindex:
+        previous_indices = await swap_alias(es, POLITICIANS_INDEX, index)
+        if previous_indices:
+            await es.indices.delete(index=previous_indices)
+
+    failed = sum(report.failed for report in chunks)
+    await store_import_rollups(es, groups, reindex=reindex)
+
+    invalidate_caches()
+    # Rebuild the statistics right away so the next dashboard load does not wait for them
+    task = asyncio.create_task(refresh_statistics(es))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+    chunks.sort(key=lambda report: report.chunk)
+    indexed = sum(report.indexed for report in chunks)
+    skipped = unchanged.skipped if unchanged else 0
+    elapsed = time.perf_counter() - started
+    BULK_DOCUMENTS.inc(indexed, "indexed")
+    BULK_DOCUMENTS.inc(failed, "failed")
+    BULK_DOCUMENTS.inc(skipped, "skipped")
+    BULK_DOCUMENTS.inc(validator.rejected, "rejected")
+    BULK_RETRIES.inc(sum(report.retries for report in chunks))
+    BULK_IMPORT_DURATION.observe(elapsed)
+    return {
+        "message": "success",
+        "index": index,
+        "indexed": indexed,
+        "failed": failed,
+        "skipped": skipped,
+        "rejected": validator.rejected,
+        "errors": sorted(validator.errors, key=lambda error: error.get("row") or 0),
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "chunks": chunks,
+    }
+
+
+async def store_import_rollups(es: AsyncElasticsearch, groups: ImportedGroups, reindex: bool):
+    """
+    Updates the salary rollups after an import.
+    A complete reindex rebuilds every rollup with an aggregation over the new
+    index, an import into the current index only marks the groups of its rows
+    to be recomputed.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        groups (ImportedGroups): Groups of the imported rows.
+        reindex (bool): The import replaced the whole index.
+    """
+    if not reindex:
+        pending_rollups.mark_groups(groups.groups())
+        return
+
+    try:
+        await rebuild_rollups(es)
+    except Exception as e:
+        print("failed to store salary rollups: %s" % e)
+        pending_rollups.rebuild = True
+
+
+@app.get(
+    "/politicians",
+    response_model=PoliticiansPaginated,
+    response_model_exclude_unset=True,
+    status_code=status.HTTP_200_OK,
+    description="Route to retrieve all politicians with optional filtering.",
+    tags=["politicians"],
+    summary="Get all politicians",
+    responses={
+        status.HTTP_200_OK: {
+            "model": PoliticiansPaginated,
+            "description": "List of politicians",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": ErrorResponse,
+            "description": "Index not found",
+        },
+    },
+)
+async def get_all_politicians(
+    request: Request,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(10, le=100),
+    name: str = None,
+    party: str = None,
+    gender: str = None,
+    region: str = None,
+    position: str = None,
+    cursor: Optional[str] = Query(
+        None,
+        description=(
+            "Paginate with a cursor instead of `page`. Send it empty to get the first page "
+            "and then the `next_cursor` of each response to get the following one."
+        ),
+    ),
+    exact_count: bool = Query(
+        False,
+        description=(
+            "Count every matching politician. By default counting stops at a threshold "
+            "and `total_pages_exact` is false when there are more results."
+        ),
+    ),
+    facets: bool = Query(
+        False,
+        description=(
+            "Also return the count of politicians per party, gender, region and position. "
+            "The counts of each facet ignore the filter on that same facet."
+        ),
+    ),
+    fast: bool = Query(FAST_RESPONSES_DEFAULT, description=FAST_RESPONSES_DESCRIPTION),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    es: Optional[Search] = Depends(get_es),
+):
+    fields = parse_fields(fields, POLITICIANS_DEFAULT_FIELDS)
+    filters = parse_filters(party=party, gender=gender, region=region, position=position)
+    if facets:
+        search = build_facets_search(name=name, filters=filters)
+    else:
+        search = {"query": build_politicians_query(name=name, filters=filters)}
+    search["_source"] = fields
+    track_total_hits = True if exact_count else TOTAL_HITS_THRESHOLD
+    params = dict(request.query_params)
+
+    if cursor is not None:
+        result = await search_politicians_after(
+            es, search, per_page, cursor, track_total_hits, fast, params
+        )
+        return FastJSONResponse(result) if fast else result
+
+    try:
+        response = await slow_queries.search(
+            es,
+            "/politicians",
+            params,
+            index=POLITICIANS_INDEX,
+            body={
+                **search,
+                "from": (page - 1) * per_page,
+                "size": per_page,
+                "track_total_hits": track_total_hits,
+            },
+        )
+
+        hits = response["hits"]["hits"]
+
+        result = {
+            "data": extract_politicians(hits, fast, fields),
+            **count_pages(response, per_page),
+            "next_cursor": None,
+            "facets": extract_facets(response),
+        }
+        return FastJSONResponse(result) if fast else result
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Index not found")
+
+
+def parse_filters(**params: Optional[str]) -> Dict[str, List[str]]:
+    """
+    Parses the comma separated filter query parameters of GET /politicians.
+
+    Args:
+        **params (Optional[str]): Value of each parameter in `FILTER_FIELDS`.
+
+    Returns:
+        Dict[str, List[str]]: Accepted values of each filtered field.
+    """
+    return {
+        FILTER_FIELDS[param]: value.split(",") for param, value in params.items() if value
+    }
+
+
+def build_terms_filters(filters: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """
+    Builds a terms query for each filtered field.
+
+    Args:
+        filters (Dict[str, List[str]]): Accepted values of each field.
+
+    Returns:
+        List[Dict[str, Any]]: Terms queries.
+    """
+    return [{"terms": {field: values}} for field, values in filters.items()]
+
+
+def build_politicians_query(
+    name: Optional[str] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Builds the query used to search politicians.
+
+    Args:
+        name (Optional[str]): Fuzzy match on the politician name.
+        filters (Optional[Dict[str, List[str]]]): Accepted values of each filtered field, see `parse_filters`.
+
+    Returns:
+        Dict[str, Any]: Elasticsearch bool query.
+    """
+    query = {"bool": {"must": []}}
+
+    if name:
+        query["bool"]["must"].append(
+            {"match": {"nombre": {"query": name, "fuzziness": "auto"}}}
+        )
+
+    if filters:
+        query["bool"]["filter"] = build_terms_filters(filters)
+
+    return query
+
+
+def build_facets_search(
+    name: Optional[str] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Builds a search of politicians that also counts them per value of each filter field.
+    The filters are applied as a post filter, so every facet is counted with the
+    filters on the other fields but not with its own one.
+
+    Args:
+        name (Optional[str]): Fuzzy match on the politician name.
+        filters (Optional[Dict[str, List[str]]]): Accepted values of each filtered field, see `parse_filters`.
+
+    Returns:
+        Dict[str, Any]: Search body with the query, post filter and facet aggregations.
+    """
+    filters = filters or {}
+    search = {"query": build_politicians_query(name=name), "aggs": {}}
+
+    if filters:
+        search["post_filter"] = {"bool": {"filter": build_terms_filters(filters)}}
+
+    for field in FILTER_FIELDS.values():
+        other_filters = {
+            other: values for other, values in filters.items() if other != field
+        }
+        search["aggs"][field] = {
+            "filter": {"bool": {"filter": build_terms_filters(other_filters)}},
+            "aggs": {"values": {"terms": {"field": field, "size": FACET_SIZE}}},
+        }
+
+    return search
+
+
+def extract_facets(response: Dict[str, Any]) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """
+    Extracts the facet counts of a search built with `build_facets_search`.
+
+    Args:
+        response (Dict[str, Any]): Search response.
+
+    Returns:
+        Optional[Dict[str, List[Dict[str, Any]]]]: Values and counts of each field, None if facets were not requested.
+    """
+    aggregations = response.get("aggregations")
+    if not aggregations:
+        return None
+
+    return {
+        field: [
+            {"value": bucket["key"], "count": bucket["doc_count"]}
+            for bucket in aggregations[field]["values"]["buckets"]
+        ]
+        for field in FILTER_FIELDS.values()
+    }
+
+
+def parse_fields(fields: Optional[str], default: List[str]) -> List[str]:
+    """
+    Parses the `fields` query parameter.
+
+    Args:
+        fields (Optional[str]): Comma separated list of politician fields, or `*` for all of them.
+        default (List[str]): Fields used when the parameter is not set.
+
+    Returns:
+        List[str]: Politician fields to return.
+    """
+    if fields is None:
+        return default
+    if fields.strip() == "*":
+        return POLITICIAN_FIELDS
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in POLITICIAN_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return requested
+
+
+def extract_politicians(
+    hits: List[Dict[str, Any]],
+    fast: bool = False,
+    fields: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Extracts the politicians of search hits.
+
+    Args:
+        hits (List[Dict[str, Any]]): Search hits.
+        fast (bool): Build politicians ready to be serialized, see `politician_from_hit`.
+        fields (Optional[List[str]]): Fields fetched for each politician, all of them by default.
+
+    Returns:
+        List[Dict[str, Any]]: Politicians with their `_id`.
+    """
+    if fast:
+        return [politician_from_hit(hit, fields) for hit in hits]
+    return [{"_id": hit["_id"], **hit["_source"]} for hit in hits]
+
+
+def count_pages(response: Dict[str, Any], per_page: int) -> Dict[str, Any]:
+    """
+    Calculates the total count of pages of a search response.
+    When the hits were not counted exactly the count is a lower bound.
+
+    Args:
+        response (Dict[str, Any]): Search response.
+        per_page (int): Number of politicians per page.
+
+    Returns:
+        Dict[str, Any]: `total_pages` and whether it is exact in `total_pages_exact`.
+    """
+    total = response["hits"]["total"]
+    return {
+        "total_pages": ceil(total["value"] / per_page),
+        "total_pages_exact": total.get("relation", "eq") == "eq",
+    }
+
+
+async def search_politicians_after(
+    es: AsyncElasticsearch,
+    search: Dict[str, Any],
+    per_page: int,
+    cursor: str,
+    track_total_hits: Union[bool, int] = TOTAL_HITS_THRESHOLD,
+    fast: bool = False,
+    params: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Gets a page of politicians with a point in time and `search_after`.
+    Every page costs the same regardless of its depth, and all the pages of a
+    cursor see the index as it was when the first page was requested.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        search (Dict[str, Any]): Search body with the query, and optionally facets.
+        per_page (int): Number of politicians per page.
+        cursor (str): Cursor of the page, empty for the first one.
+        track_total_hits (Union[bool, int]): Number of hits to count accurately, True to count them all.
+        fast (bool): Build the politicians with `politician_from_hit`.
+        params (Optional[Dict[str, Any]]): Parameters of the request, logged with slow searches.
+
+    Returns:
+        Dict[str, Any]: Page of politicians with the cursor of the next page.
+    """
+    search_after = None
+    if cursor:
+        try:
+            state = decode_cursor(cursor)
+            pit_id, search_after = state["pit"], state["after"]
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not isinstance(pit_id, str) or not isinstance(search_after, list):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    else:
+        try:
+            response = await es.open_point_in_time(
+                index=POLITICIANS_INDEX, keep_alive=PIT_KEEP_ALIVE
+            )
+        except NotFoundError:
+            raise HTTPException(status_code=404, detail="Index not found")
+        pit_id = response["id"]
+
+    body = {
+        **search,
+        "size": per_page,
+        "track_total_hits": track_total_hits,
+        "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+        # _shard_doc is a unique tiebreaker so pages never overlap or skip documents
+        "sort": [{"_score": {"order": "desc"}}, {"_shard_doc": {"order": "asc"}}],
+    }
+    if search_after:
+        body["search_after"] = search_after
+
+    try:
+        response = await slow_queries.search(es, "/politicians", params or {}, body=body)
+    except NotFoundError:
+        raise HTTPException(status_code=410, detail="Cursor expired")
+    except BadRequestError:
+        # A cursor that decodes but holds an invalid point in time or sort values
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    hits = response["hits"]["hits"]
+
+    next_cursor = None
+    if len(hits) == per_page:
+        next_cursor = encode_cursor(
+            {"pit": response.get("pit_id", pit_id), "after": hits[-1]["sort"]}
+        )
+    else:
+        await es.close_point_in_time(id=response.get("pit_id", pit_id))
+
+    return {
+        "data": extract_politicians(hits, fast, search.get("_source")),
+        **count_pages(response, per_page),
+        "next_cursor": next_cursor,
+        "facets": extract_facets(response),
+    }
+
+
+@app.get(
+    "/politicians/suggest",
+    response_model=List[str],
+    status_code=status.HTTP_200_OK,
+    description="Route to autocomplete politician names while typing.",
+    tags=["politicians"],
+    summary="Suggest politician names",
+    responses={
+        status.HTTP_200_OK: {
+            "description": "Names starting with the typed words",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": ErrorResponse,
+            "description": "Index not found",
+        },
+    },
+)
+async def suggest_politicians(
+    q: str = Query(..., min_length=1, description="Text typed so far."),
+    size: int = Query(SUGGEST_SIZE, ge=1, le=50),
+    es: Optional[Search] = Depends(get_es),
+):
+    try:
+        response = await es.search(
+            index=POLITICIANS_INDEX,
+            body=build_suggest_search(q, size),
+        )
+        return [hit["_source"]["nombre"] for hit in response["hits"]["hits"]]
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Index not found")
+
+
+def build_suggest_search(text: str, size: int) -> Dict[str, Any]:
+    """
+    Builds the search of names starting with a text.
+
+    The last typed word is matched as a prefix against the `search_as_you_type`
+    subfield of `nombre`, which indexes the edge n-grams at import time, so the
+    search is a cheap term lookup instead of a fuzzy query.
+
+    Args:
+        text (str): Text typed so far.
+        size (int): Maximum number of names.
+
+    Returns:
+        Dict[str, Any]: Elasticsearch search body.
+    """
+    return {
+        "query": {
+            "multi_match": {
+                "query": text,
+                "type": "bool_prefix",
+                "fields": [
+                    "nombre.suggest",
+                    "nombre.suggest._2gram",
+                    "nombre.suggest._3gram",
+                ],
+            }
+        },
+        # One suggestion per distinct name
+        "collapse": {"field": "nombre.raw"},
+        "_source": ["nombre"],
+        "size": size,
+        "track_total_hits": False,
+    }
 
-    if not await es.indices.exists(index="politicians"):
-        mapping = {"mappings": {"properties": create_es_mapping(Politician)}}
-        await es.indices.create(index="politicians", body=mapping)
 
-    async for ok, result in async_streaming_bulk(
-        client=es,
-        index="politicians",
-        actions=csv_row_generator(file),
-        raise_on_error=True,
-    ):
-        action, result = result.popitem()
-        if not ok:
-            print("failed to %s document %s" % (action, result["_id"]))
-
-    await es.indices.refresh(index="politicians")
-
-    return {"message": "success"}
-
-async def csv_row_generator(upload_file):
-    df = await run_in_threadpool(pd.read_csv, upload_file.file, delimiter=";", decimal=",", engine="c", encoding="utf-8-sig")
-    df = df.replace(np.nan, None)
-    df = df.rename(lambda x: x.lower(), axis='columns')
-    
-    for data in df.to_dict(orient="records"):
-        yield {"_index": "politicians", **data}
-        
 @app.get(
-    "/politicians",
-    response_model=PoliticiansPaginated,
+    "/politicians/export",
     status_code=status.HTTP_200_OK,
-    description="Route to retrieve all politicians with optional filtering.",
+    description=(
+        "Route to download every politician, or the ones matching the same filters as "
+        "GET /politicians, as CSV in the import format or as NDJSON."
+    ),
     tags=["politicians"],
-    summary="Get all politicians",
+    summary="Export politicians",
+    response_class=StreamingResponse,
     responses={
         status.HTTP_200_OK: {
-            "model": PoliticiansPaginated,
-            "description": "List of politicians",
+            "content": {"text/csv": {}, "application/x-ndjson": {}},
+            "description": "Politicians streamed in the requested format",
         },
         status.HTTP_404_NOT_FOUND: {
             "model": ErrorResponse,
@@ -168,56 +1233,44 @@ async def csv_row_generator(upload_file):
         },
     },
 )
-async def get_all_politicians(
-    page: int = Query(1, ge=1),
-    per_page: int = Query(10, le=100),
+async def export_politicians(
+    format: ExportFormat = ExportFormat.csv,
     name: str = None,
     party: str = None,
     gender: str = None,
+    region: str = None,
+    position: str = None,
     es: Optional[Search] = Depends(get_es),
 ):
-    query = {"bool": {"must": []}}
-
-    if name:
-        query["bool"]["must"].append(
-            {"match": {"nombre": {"query": name, "fuzziness": "auto"}}}
-        )
-
-    if party or gender:
-        query["bool"]["filter"] = {}
-
-        terms_filter = {}
-        if party:
-            party_list = party.split(",")
-            terms_filter["partido"] = party_list
-        if gender:
-            gender_list = gender.split(",")
-            terms_filter["genero"] = gender_list
-
-        query["bool"]["filter"]["terms"] = terms_filter
+    filters = parse_filters(party=party, gender=gender, region=region, position=position)
+    query = build_politicians_query(name=name, filters=filters)
 
+    # Opened before streaming so a missing index is still reported with a 404
     try:
-        response = await es.search(
-            index="politicians",
-            body={
-                "query": query,
-                "from": (page - 1) * per_page,
-                "size": per_page,
-            },
+        response = await es.open_point_in_time(
+            index=POLITICIANS_INDEX, keep_alive=EXPORT_KEEP_ALIVE
         )
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Index not found")
 
-        hits = response["hits"]["hits"]
-
-        total_hits = response["hits"]["total"]["value"]
-
-        # Calculate total count of pages
-        total_pages = ceil(total_hits / per_page)
+    if format == ExportFormat.csv:
+        header, serialize, media_type = csv_header(), csv_rows, "text/csv"
+    else:
+        header, serialize, media_type = b"", ndjson_rows, "application/x-ndjson"
 
-        extracted_hits = [{"_id": hit["_id"], **hit["_source"]} for hit in hits]
+    async def stream():
+        if header:
+            yield header
+        async for hits in search_all(es, response["id"], query):
+            yield serialize(hits)
 
-        return {"data": extracted_hits, "total_pages": total_pages}
-    except NotFoundError:
-        raise HTTPException(status_code=404, detail="Index not found")
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="politicians.{format.value}"'
+        },
+    )
 
 
 @app.get(
@@ -240,7 +1293,7 @@ async def get_all_politicians(
 )
 async def get_politician_by_id(id: str, es: Optional[Search] = Depends(get_es)):
     try:
-        result = await es.get(index="politicians", id=id)
+        result = await es.get(index=POLITICIANS_INDEX, id=id)
         return {"_id": result["_id"], **result["_source"]}
 
     except NotFoundError:
@@ -268,13 +1321,28 @@ async def get_politician_by_id(id: str, es: Optional[Search] = Depends(get_es)):
 async def update_politician(
     id: str,
     politician_update: PoliticianUpdate,
+    response: Response,
+    refresh: RefreshPolicy = DEFAULT_REFRESH_POLICY,
+    write_behind: bool = Query(WRITE_BEHIND_DEFAULT, description=WRITE_BEHIND_DESCRIPTION),
     es: Optional[Search] = Depends(get_es),
 ):
+    if write_behind:
+        # The groups the politician leaves are looked up when the queue is flushed
+        doc = edited_doc(politician_update, exclude_unset=True)
+        write_behind_queue.update(es, id, doc)
+        mark_rollups([doc])
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": f"Update of politician {id} has been queued"}
+
     try:
-        update_item_encoded = jsonable_encoder(politician_update)
+        await write_behind_queue.flush_ids([id])
+        update_item_encoded = edited_doc(politician_update, exclude_unset=True)
+        previous = await previous_rollup_groups(es, [id], [update_item_encoded])
         await es.update(
-            index="politicians", id=id, doc=update_item_encoded, refresh="wait_for"
+            index=POLITICIANS_INDEX, id=id, doc=update_item_encoded, refresh=refresh.value
         )
+        mark_rollups(previous + [update_item_encoded])
+        invalidate_caches()
         return {"message": f"Politician {id} has been updated successfully"}
 
     except NotFoundError:
@@ -299,15 +1367,252 @@ async def update_politician(
         },
     },
 )
-async def delete_politician(id: str, es: Optional[Search] = Depends(get_es)):
+async def delete_politician(
+    id: str,
+    response: Response,
+    refresh: RefreshPolicy = DEFAULT_REFRESH_POLICY,
+    write_behind: bool = Query(WRITE_BEHIND_DEFAULT, description=WRITE_BEHIND_DESCRIPTION),
+    es: Optional[Search] = Depends(get_es),
+):
+    if write_behind:
+        write_behind_queue.delete(es, id)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": f"Deletion of politician {id} has been queued"}
+
     try:
-        await es.delete(index="politicians", id=id, refresh="wait_for")
+        await write_behind_queue.discard([id])
+        previous = await previous_rollup_groups(es, [id])
+        await es.delete(index=POLITICIANS_INDEX, id=id, refresh=refresh.value)
+        mark_rollups(previous)
+        invalidate_caches()
         return {"message": f"Politician {id} has been deleted successfully"}
 
     except NotFoundError:
         raise HTTPException(status_code=404, detail="Politician not found")
 
 
+@app.post(
+    "/politicians/batch/get",
+    response_model=PoliticiansBatch,
+    status_code=status.HTTP_200_OK,
+    description="Route to retrieve several politicians by ID in a single request.",
+    tags=["politicians"],
+    summary="Get politicians by ids",
+    responses={
+        status.HTTP_200_OK: {
+            "model": PoliticiansBatch,
+            "description": "Politicians found and ids not found",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": ErrorResponse,
+            "description": "Index not found",
+        },
+    },
+)
+async def get_politicians_by_ids(
+    politician_ids: PoliticianIds, es: Optional[Search] = Depends(get_es)
+):
+    try:
+        response = await es.mget(index=POLITICIANS_INDEX, ids=politician_ids.ids)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Index not found")
+
+    docs = response["docs"]
+    return {
+        "data": [{"_id": doc["_id"], **doc["_source"]} for doc in docs if doc.get("found")],
+        "not_found": [doc["_id"] for doc in docs if not doc.get("found")],
+    }
+
+
+@app.post(
+    "/politicians/batch/update",
+    response_model=BatchResponse,
+    status_code=status.HTTP_200_OK,
+    description=(
+        "Route to update several politicians in a single bulk request. "
+        "Only the fields sent for each politician are updated."
+    ),
+    tags=["politicians"],
+    summary="update politicians",
+    responses={
+        status.HTTP_200_OK: {
+            "model": BatchResponse,
+            "description": "Result of each update",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": ErrorResponse,
+            "description": "Index not found",
+        },
+    },
+)
+async def update_politicians(
+    politicians_update: PoliticiansBatchUpdate,
+    refresh: RefreshPolicy = DEFAULT_REFRESH_POLICY,
+    es: Optional[Search] = Depends(get_es),
+):
+    operations, docs = [], []
+    for update in politicians_update.updates:
+        docs.append(edited_doc(update.doc, exclude_unset=True))
+        operations.append({"update": {"_index": POLITICIANS_INDEX, "_id": update.id}})
+        operations.append({"doc": docs[-1]})
+
+    ids = [update.id for update in politicians_update.updates]
+    await write_behind_queue.flush_ids(ids)
+    try:
+        previous = await previous_rollup_groups(es, ids, docs)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Index not found")
+    result = await run_batch(es, operations, refresh)
+    mark_rollups(previous + docs)
+    return result
+
+
+@app.post(
+    "/politicians/batch/delete",
+    response_model=BatchResponse,
+    status_code=status.HTTP_200_OK,
+    description="Route to delete several politicians by ID in a single bulk request.",
+    tags=["politicians"],
+    summary="delete politicians",
+    responses={
+        status.HTTP_200_OK: {
+            "model": BatchResponse,
+            "description": "Result of each deletion",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": ErrorResponse,
+            "description": "Index not found",
+        },
+    },
+)
+async def delete_politicians(
+    politician_ids: PoliticianIds,
+    refresh: RefreshPolicy = DEFAULT_REFRESH_POLICY,
+    es: Optional[Search] = Depends(get_es),
+):
+    operations = [
+        {"delete": {"_index": POLITICIANS_INDEX, "_id": id}} for id in politician_ids.ids
+    ]
+
+    await write_behind_queue.discard(politician_ids.ids)
+    try:
+        previous = await previous_rollup_groups(es, politician_ids.ids)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Index not found")
+    result = await run_batch(es, operations, refresh)
+    mark_rollups(previous)
+    return result
+
+
+def edited_doc(politician_update: PoliticianUpdate, exclude_unset: bool = False) -> Dict[str, Any]:
+    """
+    Encodes the fields of a politician update. The content hash of the last import
+    is cleared, so the next import rewrites the politician from its CSV row.
+
+    Args:
+        politician_update (PoliticianUpdate): Fields to update.
+        exclude_unset (bool): Only encode the fields sent by the client.
+
+    Returns:
+        Dict[str, Any]: Partial document of the update.
+    """
+    return {
+        **jsonable_encoder(politician_update, exclude_unset=exclude_unset),
+        CONTENT_HASH_FIELD: None,
+    }
+
+
+async def previous_rollup_groups(
+    es: AsyncElasticsearch, ids: List[str], docs: Optional[List[Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Gets the dimensions of politicians before writing them, so the rollups of the
+    groups they leave are recomputed too. Skipped when updates change no dimension
+    nor salary.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        ids (List[str]): Ids of the politicians about to be written.
+        docs (Optional[List[Dict[str, Any]]]): Fields about to be updated, None for deletions.
+
+    Returns:
+        List[Dict[str, Any]]: Dimensions of the politicians found.
+    """
+    fields = list(ROLLUP_DIMENSIONS.values())
+    if docs is not None and not any(
+        field in doc for doc in docs for field in fields + [ROLLUP_METRIC]
+    ):
+        return []
+
+    response = await es.mget(index=POLITICIANS_INDEX, ids=ids, source_includes=fields)
+    return [doc["_source"] for doc in response["docs"] if doc.get("found")]
+
+
+async def mark_queued_rollups(
+    es: AsyncElasticsearch, pending: Dict[str, Optional[Dict[str, Any]]]
+):
+    """
+    Marks the rollups of the groups politicians leave with the writes of the
+    write behind queue, right before they are flushed.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        pending (Dict[str, Optional[Dict[str, Any]]]): Queued writes by id, None for deletions.
+    """
+    docs = list(pending.values())
+    previous = await previous_rollup_groups(
+        es, list(pending), None if None in docs else docs
+    )
+    mark_rollups(previous + [doc for doc in docs if doc is not None])
+
+
+def mark_rollups(docs: List[Dict[str, Any]]):
+    """
+    Marks the rollups of the groups of written politicians as outdated.
+
+    Args:
+        docs (List[Dict[str, Any]]): Previous dimensions and written fields of the politicians.
+    """
+    for doc in docs:
+        pending_rollups.mark(doc)
+
+
+async def run_batch(
+    es: AsyncElasticsearch, operations: List[Dict[str, Any]], refresh: RefreshPolicy
+) -> Dict[str, Any]:
+    """
+    Runs write operations in a single bulk request and reports the result of each one.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        operations (List[Dict[str, Any]]): Bulk API action and document lines.
+        refresh (RefreshPolicy): Refresh policy applied once to the whole batch.
+
+    Returns:
+        Dict[str, Any]: Count of succeeded and failed operations and the result of each one.
+    """
+    response = await es.bulk(operations=operations, refresh=refresh.value)
+
+    items = []
+    for item in response["items"]:
+        _, result = next(iter(item.items()))
+        error = result.get("error")
+        items.append(
+            {
+                "id": result["_id"],
+                "status": result["status"],
+                "result": result.get("result"),
+                "error": error.get("reason") if isinstance(error, dict) else error,
+            }
+        )
+
+    succeeded = sum(1 for item in items if 200 <= item["status"] < 300)
+    if succeeded:
+        invalidate_caches()
+
+    return {"succeeded": succeeded, "failed": len(items) - succeeded, "items": items}
+
+
 @app.get(
     "/statistics",
     response_model=StatisticsResponse,
@@ -326,9 +1631,51 @@ async def delete_politician(id: str, es: Optional[Search] = Depends(get_es)):
         },
     },
 )
-async def get_statistics(es: Optional[Search] = Depends(get_es)):
+async def get_statistics(
+    request: Request,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    es: Optional[Search] = Depends(get_es),
+):
+    fields = parse_fields(fields, STATISTICS_DEFAULT_FIELDS)
+    try:
+        snapshot = await get_cached(
+            statistics_cache,
+            ("statistics", tuple(fields)),
+            lambda: build_statistics_snapshot(es, fields),
+        )
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Index not found")
+
+    headers = {
+        "ETag": snapshot["etag"],
+        "Last-Modified": format_datetime(snapshot["last_modified"], usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if is_not_modified(request, snapshot):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(
+        content=snapshot["body"], media_type="application/json", headers=headers
+    )
+
+
+async def build_statistics_snapshot(
+    es: AsyncElasticsearch, fields: List[str] = STATISTICS_DEFAULT_FIELDS
+) -> Dict[str, Any]:
+    """
+    Computes the salary statistics served by GET /statistics.
+    They are validated and serialized once here, so serving the snapshot only copies bytes.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        fields (List[str]): Fields of the politicians with the top salaries.
+
+    Returns:
+        Dict[str, Any]: The serialized statistics in `body` with their `etag` and `last_modified` date.
+    """
     es_query = {
         "query": {"match_all": {}},
+        "_source": fields,
         "size": 10,
         "sort": [{"sueldobase_sueldo": {"order": "desc"}}],
         "aggs": {
@@ -339,24 +1686,176 @@ async def get_statistics(es: Optional[Search] = Depends(get_es)):
         },
     }
 
-    try:
-        response = await es.search(index="politicians", body=es_query)
-        hits = response["hits"]["hits"]
-        mean_salary = round(response["aggregations"]["mean_salary"]["value"], 2)
-        median_salary = round(
-            response["aggregations"]["median_salary"]["values"]["50.0"], 2
-        )
+    response = await slow_queries.search(
+        es, "/statistics", {"fields": ",".join(fields)}, index=POLITICIANS_INDEX, body=es_query
+    )
+    hits = response["hits"]["hits"]
+    mean_salary = round(response["aggregations"]["mean_salary"]["value"], 2)
+    median_salary = round(response["aggregations"]["median_salary"]["values"]["50.0"], 2)
 
-        extracted_hits = [{"_id": hit["_id"], **hit["_source"]} for hit in hits]
+    extracted_hits = [{"_id": hit["_id"], **hit["_source"]} for hit in hits]
 
-        return {
+    statistics = StatisticsResponse.model_validate(
+        {
             "mean_salary": mean_salary,
             "median_salary": median_salary,
             "top_salaries": extracted_hits,
         }
+    )
+    body = dumps(statistics.model_dump(mode="json", by_alias=True, exclude_unset=True))
+
+    return {
+        "body": body,
+        "etag": f'"{hashlib.sha1(body).hexdigest()}"',
+        "last_modified": next_snapshot_date(),
+    }
+
+
+def next_snapshot_date() -> datetime:
+    """
+    HTTP dates have a resolution of seconds, so a snapshot rebuilt within the
+    second of the previous one would have the same `Last-Modified` date and
+    clients revalidating the previous one would get a 304 for it.
+
+    Returns:
+        datetime: Current date truncated to the second, at least one second after the previous snapshot.
+    """
+    global last_snapshot_date
+    date = datetime.now(timezone.utc).replace(microsecond=0)
+    if last_snapshot_date is not None and date <= last_snapshot_date:
+        date = last_snapshot_date + timedelta(seconds=1)
+    last_snapshot_date = date
+    return date
+
+
+def is_not_modified(request: Request, snapshot: Dict[str, Any]) -> bool:
+    """
+    Checks the conditional headers of a request against a snapshot.
+
+    Args:
+        request (Request): The incoming request.
+        snapshot (Dict[str, Any]): Snapshot built with `build_statistics_snapshot`.
+
+    Returns:
+        bool: True if the client already has the snapshot.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]
+        return "*" in etags or snapshot["etag"] in etags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return snapshot["last_modified"] <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+async def refresh_statistics(es: AsyncElasticsearch):
+    """
+    Rebuilds the /statistics snapshot.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+    """
+    statistics_cache.invalidate()
+    if clear_tasks:
+        return
+    fields = STATISTICS_DEFAULT_FIELDS
+    try:
+        await statistics_cache.get_or_load(
+            ("statistics", tuple(fields)), lambda: build_statistics_snapshot(es, fields)
+        )
+    except Exception as e:
+        print("failed to refresh statistics: %s" % e)
+
+
+async def refresh_statistics_periodically(interval: float):
+    """
+    Rebuilds the /statistics snapshot every `interval` seconds.
+
+    Args:
+        interval (float): Seconds between rebuilds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await refresh_statistics(await get_es())
+
+
+@app.get(
+    "/statistics/by/{dimension}",
+    response_model=RollupsResponse,
+    status_code=status.HTTP_200_OK,
+    description=(
+        "Route to retrieve the count, mean, median, minimum and maximum salary of "
+        "politicians grouped by party, region, position or institution."
+    ),
+    tags=["politicians"],
+    summary="get salary statistics by group",
+    responses={
+        status.HTTP_200_OK: {
+            "model": RollupsResponse,
+            "description": "Salary statistics of each group, largest groups first",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": ErrorResponse,
+            "description": "Index not found",
+        },
+    },
+)
+async def get_statistics_by(
+    dimension: RollupDimension, es: Optional[Search] = Depends(get_es)
+):
+    try:
+        groups = await get_cached(
+            statistics_cache,
+            ("rollups", dimension.value),
+            lambda: load_rollups(es, ROLLUP_DIMENSIONS[dimension.value]),
+        )
     except NotFoundError:
         raise HTTPException(status_code=404, detail="Index not found")
 
+    return {"dimension": dimension, "groups": groups}
+
+
+async def load_rollups(es: AsyncElasticsearch, field: str) -> List[Dict[str, Any]]:
+    """
+    Reads the salary rollups of a dimension, first recomputing the groups changed by writes.
+    They are rebuilt from the politicians index when they were never stored.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        field (str): Field of the dimension.
+
+    Returns:
+        List[Dict[str, Any]]: Rollup of each group.
+    """
+    if pending_rollups.rebuild:
+        pending_rollups.rebuild = False
+        try:
+            await rebuild_rollups(es)
+        except BaseException:
+            pending_rollups.rebuild = True
+            raise
+
+    # Queued writes are not applied yet, their groups are recomputed again once flushed
+    values = pending_rollups.take(field, keep=len(write_behind_queue) > 0)
+    if values:
+        try:
+            await refresh_rollups(es, field, values)
+        except BaseException:
+            pending_rollups.mark_groups({field: values})
+            raise
+
+    try:
+        return await get_rollups(es, field)
+    except NotFoundError:
+        await rebuild_rollups(es)
+        return await get_rollups(es, field)
+
 
 @app.get(
     "/available_genders",
@@ -377,16 +1876,10 @@ async def get_statistics(es: Optional[Search] = Depends(get_es)):
 )
 async def get_available_genders(es: Optional[Search] = Depends(get_es)):
     try:
-        response = await es.search(
-            index="politicians",
-            body={
-                "size": 0,
-                "aggs": {"available_genders": {"terms": {"field": "genero"}}},
-            },
+        return await get_cached(
+            metadata_cache,
+            "available_genders", lambda: get_available_values(es, "genero")
         )
-        buckets = response["aggregations"]["available_genders"]["buckets"]
-        available_genders = [bucket["key"] for bucket in buckets]
-        return available_genders
     except NotFoundError:
         raise HTTPException(status_code=404, detail="Index not found")
 
@@ -410,15 +1903,39 @@ async def get_available_genders(es: Optional[Search] = Depends(get_es)):
 )
 async def get_available_parties(es: Optional[Search] = Depends(get_es)):
     try:
-        response = await es.search(
-            index="politicians",
-            body={
-                "size": 0,
-                "aggs": {"available_parties": {"terms": {"field": "partido"}}},
-            },
+        return await get_cached(
+            metadata_cache,
+            "available_parties", lambda: get_available_values(es, "partido")
         )
-        buckets = response["aggregations"]["available_parties"]["buckets"]
-        available_parties = [bucket["key"] for bucket in buckets]
-        return available_parties
     except NotFoundError:
         raise HTTPException(status_code=404, detail="Index not found")
+
+
+async def get_available_values(es: AsyncElasticsearch, field: str) -> List[str]:
+    """
+    Gets the distinct values of a keyword field with a terms aggregation.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        field (str): Name of the field.
+
+    Returns:
+        List[str]: Values of the field, most frequent first.
+    """
+    response = await es.search(
+        index=POLITICIANS_INDEX,
+        body={
+            "size": 0,
+            "aggs": {"available_values": {"terms": {"field": field}}},
+        },
+    )
+    buckets = response["aggregations"]["available_values"]["buckets"]
+    return [bucket["key"] for bucket in buckets]
+
+
+def invalidate_caches():
+    """
+    Drops every cached response derived from the politicians index. Called after each write.
+    """
+    metadata_cache.invalidate()
+    statistics_cache.invalidate()
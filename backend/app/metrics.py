@@ -0,0 +1,400 @@
+import functools
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+# Content type of the Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    labels = ",".join(
+        '%s="%s"'
+        % (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{%s}" % labels
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base class of the metrics, holding one value per combination of label values.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        """
+        Args:
+            name (str): Name of the metric.
+            help (str): Description of the metric.
+            labelnames (Sequence[str]): Names of the labels of the metric.
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        """
+        Yields:
+            Tuple[str, Tuple[str, ...], Tuple[str, ...], float]: Name suffix, label names, label values and value of each sample.
+        """
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """
+    Value that only goes up, e.g. the number of indexed documents.
+
+    Usage:
+
+    ```python
+    documents = Counter("documents_total", "Indexed documents", ["result"])
+    documents.inc(500, "indexed")
+    ```
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str):
+        """
+        Args:
+            amount (float): Amount to add.
+            *labels (str): Value of each label, in the order of `labelnames`.
+        """
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "", self.labelnames, labels, value
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values, e.g. request latencies, counted in cumulative buckets.
+
+    Usage:
+
+    ```python
+    latency = Histogram("request_seconds", "Request latency", ["route"])
+    latency.observe(0.012, "/politicians")
+    ```
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        """
+        Args:
+            name (str): Name of the metric.
+            help (str): Description of the metric.
+            labelnames (Sequence[str]): Names of the labels of the metric.
+            buckets (Sequence[float]): Sorted upper bounds of the buckets.
+        """
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: count of each bucket (not cumulative), then the +Inf bucket, sum and count
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        """
+        Args:
+            value (float): Observed value.
+            *labels (str): Value of each label, in the order of `labelnames`.
+        """
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 3)
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return state[-1] if state else 0
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        for labels, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                yield "_bucket", names, labels + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, labels, state[-2]
+            yield "_count", self.labelnames, labels, state[-1]
+
+
+class CallbackMetric(Metric):
+    """
+    Metric whose values are read when the metrics are rendered, e.g. counters
+    already kept by another object.
+
+    Usage:
+
+    ```python
+    CallbackMetric("cache_hits_total", "Cache hits", ["cache"], lambda: [(("statistics",), cache.hits)], "counter")
+    ```
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]],
+        type: str = "gauge",
+    ):
+        """
+        Args:
+            name (str): Name of the metric.
+            help (str): Description of the metric.
+            labelnames (Sequence[str]): Names of the labels of the metric.
+            callback (Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]): Returns the label values and value of each sample.
+            type (str): Prometheus type of the metric.
+        """
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+        self.type = type
+
+    def samples(self):
+        for labels, value in self.callback():
+            yield "", self.labelnames, labels, value
+
+
+class Registry:
+    """
+    Collection of the metrics exposed by GET /metrics.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Args:
+            metric (Metric): Metric to expose.
+
+        Returns:
+            Metric: The registered metric, so registration can be chained with its creation.
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to handle a request, from receiving it to sending the last byte of the response.",
+        ["method", "route", "status"],
+    )
+)
+ES_REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "elasticsearch_request_duration_seconds",
+        "Round trip time of Elasticsearch requests, as seen by the client.",
+        ["operation"],
+    )
+)
+ES_TOOK = REGISTRY.register(
+    Histogram(
+        "elasticsearch_took_seconds",
+        "Time Elasticsearch reported spending on requests (`took`).",
+        ["operation"],
+    )
+)
+ES_REQUEST_ERRORS = REGISTRY.register(
+    Counter(
+        "elasticsearch_request_errors_total",
+        "Elasticsearch requests that raised an error.",
+        ["operation", "error"],
+    )
+)
+SLOW_QUERIES = REGISTRY.register(
+    Counter(
+        "slow_queries_total",
+        "Searches slower than the slow query threshold, by route.",
+        ["endpoint"],
+    )
+)
+BULK_DOCUMENTS = REGISTRY.register(
+    Counter(
+        "bulk_documents_total",
+        "Rows of CSV imports by result: indexed, failed, skipped or rejected.",
+        ["result"],
+    )
+)
+BULK_RETRIES = REGISTRY.register(
+    Counter(
+        "bulk_retries_total",
+        "Bulk requests retried because the cluster rejected documents.",
+    )
+)
+BULK_IMPORT_DURATION = REGISTRY.register(
+    Histogram(
+        "bulk_import_duration_seconds",
+        "Duration of CSV imports.",
+        buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+    )
+)
+
+
+# Namespaces of the Elasticsearch client whose operations are instrumented too.
+CLIENT_NAMESPACES = frozenset(("cluster", "indices", "tasks"))
+
+
+def _took_seconds(response: Any) -> Any:
+    body = getattr(response, "body", response)
+    if isinstance(body, dict) and isinstance(body.get("took"), (int, float)):
+        return body["took"] / 1000
+    return None
+
+
+class InstrumentedClient:
+    """
+    Proxy of an Elasticsearch client recording the latency of each operation,
+    and the server side `took` time of the responses reporting it.
+
+    Usage:
+
+    ```python
+    es = InstrumentedClient(AsyncElasticsearch(hosts))
+    await es.search(index="politicians")  # recorded as operation="search"
+    await es.indices.refresh(index="politicians")  # recorded as operation="indices.refresh"
+    ```
+    """
+
+    def __init__(self, client: Any, prefix: str = ""):
+        """
+        Args:
+            client (Any): Elasticsearch client or namespace of the client.
+            prefix (str): Prefix of the operations of a namespace.
+        """
+        self._client = client
+        self._prefix = prefix
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        operation = self._prefix + name
+        if name in CLIENT_NAMESPACES:
+            return InstrumentedClient(attr, operation + ".")
+        if name == "options":
+            # Clients with other options are instrumented as well
+            return lambda *args, **kwargs: InstrumentedClient(
+                attr(*args, **kwargs), self._prefix
+            )
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                response = await attr(*args, **kwargs)
+            except Exception as e:
+                ES_REQUEST_ERRORS.inc(1, operation, type(e).__name__)
+                raise
+            finally:
+                ES_REQUEST_DURATION.observe(time.perf_counter() - started, operation)
+
+            took = _took_seconds(response)
+            if took is not None:
+                ES_TOOK.observe(took, operation)
+            return response
+
+        return call
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of each request by route template,
+    so `/politicians/{id}` is a single series whatever the id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code),
+            )
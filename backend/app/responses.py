@@ -0,0 +1,72 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+from app.schemas import Politician
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fields of a politician, used to filter the `_source` of search hits.
+POLITICIAN_FIELDS: List[str] = list(Politician.model_fields)
+
+# Fields coerced to float by `Politician.string_to_float`.
+FLOAT_FIELDS = frozenset(
+    field
+    for field, field_info in Politician.model_fields.items()
+    if field_info.annotation is float
+)
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize content to JSON, with orjson when it is installed.
+
+    Args:
+        content (Any): JSON serializable content.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response serialized with orjson when available.
+    Content is rendered as is, so it must already match the response model of the route.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def politician_from_hit(
+    hit: Dict[str, Any], fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Build the output of a politician from an Elasticsearch hit without going through Pydantic.
+    Salary fields get the same coercion as `Politician.string_to_float`.
+
+    Args:
+        hit (Dict[str, Any]): Search hit or get response of a politician.
+        fields (Optional[List[str]]): Fields to include, all of them by default.
+
+    Returns:
+        Dict[str, Any]: The politician as serialized by `PartialPoliticianEntry`.
+    """
+    source = hit["_source"]
+    politician = {"_id": hit["_id"]}
+    for field in fields or POLITICIAN_FIELDS:
+        value = source.get(field)
+        if field in FLOAT_FIELDS:
+            value = 0.0 if value is None else float(value)
+        politician[field] = value
+    return politician
@@ -0,0 +1,346 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from elasticsearch import AsyncElasticsearch, BadRequestError
+
+from app.search import POLITICIANS_INDEX
+
+# Index holding one salary summary per group of each dimension.
+ROLLUPS_INDEX = os.environ.get("ROLLUPS_INDEX", "politicians_rollups")
+# Maximum number of groups of a dimension.
+ROLLUPS_MAX_GROUPS = int(os.environ.get("ROLLUPS_MAX_GROUPS", 10000))
+
+# Dimensions salaries are grouped by, by the name used in the API.
+ROLLUP_DIMENSIONS = {
+    "party": "partido",
+    "region": "ccaa",
+    "position": "cargo_para_filtro",
+    "institution": "institucion",
+}
+ROLLUP_METRIC = "sueldobase_sueldo"
+
+ROLLUPS_MAPPING = {
+    "properties": {
+        "dimension": {"type": "keyword"},
+        "value": {"type": "keyword"},
+        "count": {"type": "long"},
+        "mean_salary": {"type": "double", "index": False},
+        "median_salary": {"type": "double", "index": False},
+        "min_salary": {"type": "double", "index": False},
+        "max_salary": {"type": "double", "index": False},
+        "updated_at": {"type": "date"},
+    }
+}
+
+
+def group_value(value: Any) -> str:
+    # Missing values are indexed as the `null_value` of keyword fields
+    return "" if value is None else str(value)
+
+
+def rollup_id(field: str, value: str) -> str:
+    return f"{field}:{hashlib.sha1(value.encode('utf-8')).hexdigest()}"
+
+
+def rollup_doc(
+    field: str,
+    value: str,
+    count: int,
+    mean: float,
+    median: float,
+    min: float,
+    max: float,
+) -> Dict[str, Any]:
+    return {
+        "dimension": field,
+        "value": value,
+        "count": count,
+        "mean_salary": round(mean, 2),
+        "median_salary": round(median, 2),
+        "min_salary": min,
+        "max_salary": max,
+    }
+
+
+class ImportedGroups:
+    """
+    Collects the groups of the documents of an import, so only their rollups
+    are recomputed afterwards. Memory grows with the number of groups, not of rows.
+
+    Usage:
+
+    ```python
+    groups = ImportedGroups()
+    async for action in collect_groups(actions, groups):
+        ...
+    pending_rollups.mark_groups(groups.groups())
+    ```
+    """
+
+    def __init__(self):
+        self._groups: Dict[str, Set[str]] = {
+            field: set() for field in ROLLUP_DIMENSIONS.values()
+        }
+
+    def add(self, doc: Dict[str, Any]):
+        """
+        Adds the groups of a document in each dimension.
+
+        Args:
+            doc (Dict[str, Any]): Politician document.
+        """
+        for field, values in self._groups.items():
+            values.add(group_value(doc.get(field)))
+
+    def groups(self) -> Dict[str, Set[str]]:
+        """
+        Returns:
+            Dict[str, Set[str]]: Groups of each dimension with at least one document.
+        """
+        return {field: set(values) for field, values in self._groups.items()}
+
+
+async def collect_groups(
+    actions: AsyncIterator[Dict[str, Any]], groups: ImportedGroups
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Passes bulk actions through, adding the groups of each one.
+
+    Args:
+        actions (AsyncIterator[Dict[str, Any]]): Bulk actions to index.
+        groups (ImportedGroups): Groups of the import.
+
+    Yields:
+        Dict[str, Any]: The same bulk actions.
+    """
+    async for action in actions:
+        groups.add(action)
+        yield action
+
+
+class PendingRollups:
+    """
+    Groups whose rollups are outdated by writes made since they were computed.
+    They are recomputed the next time their dimension is read.
+    """
+
+    def __init__(self):
+        self.rebuild = False
+        self._groups: Dict[str, Set[str]] = {
+            field: set() for field in ROLLUP_DIMENSIONS.values()
+        }
+
+    def mark(self, doc: Dict[str, Any]):
+        """
+        Marks the groups of the dimensions present in a document.
+
+        Args:
+            doc (Dict[str, Any]): Politician document, or the fields written to it.
+        """
+        for field, values in self._groups.items():
+            if field in doc:
+                values.add(group_value(doc[field]))
+
+    def mark_groups(self, groups: Dict[str, Set[str]]):
+        """
+        Args:
+            groups (Dict[str, Set[str]]): Groups of each dimension to mark.
+        """
+        for field, values in groups.items():
+            self._groups[field].update(values)
+
+    def take(self, field: str, keep: bool = False) -> Set[str]:
+        """
+        Returns the marked groups of a dimension.
+
+        Args:
+            field (str): Field of the dimension.
+            keep (bool): Keep the groups marked, for writes that are not applied yet.
+
+        Returns:
+            Set[str]: Marked groups.
+        """
+        values = set(self._groups[field])
+        if not keep:
+            self._groups[field].clear()
+        return values
+
+
+async def ensure_rollups_index(es: AsyncElasticsearch):
+    """
+    Creates the rollups index when it does not exist.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+    """
+    if await es.indices.exists(index=ROLLUPS_INDEX):
+        return
+    try:
+        await es.indices.create(index=ROLLUPS_INDEX, mappings=ROLLUPS_MAPPING)
+    except BadRequestError as e:
+        if e.error != "resource_already_exists_exception":
+            raise
+
+
+async def compute_rollups(
+    es: AsyncElasticsearch, field: str, values: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Computes the rollups of a dimension with an aggregation over the politicians index.
+    Medians are approximated by the percentiles aggregation.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        field (str): Field of the dimension.
+        values (Optional[List[str]]): Groups to compute, all of them by default.
+
+    Returns:
+        List[Dict[str, Any]]: Rollup document of each group with documents.
+    """
+    query = {"terms": {field: values}} if values else {"match_all": {}}
+    response = await es.search(
+        index=POLITICIANS_INDEX,
+        body={
+            "size": 0,
+            "query": query,
+            "aggs": {
+                "groups": {
+                    "terms": {
+                        "field": field,
+                        "size": len(values) if values else ROLLUPS_MAX_GROUPS,
+                    },
+                    "aggs": {
+                        "salary": {"stats": {"field": ROLLUP_METRIC}},
+                        "median": {
+                            "percentiles": {"field": ROLLUP_METRIC, "percents": [50]}
+                        },
+                    },
+                }
+            },
+        },
+    )
+
+    docs = []
+    for bucket in response["aggregations"]["groups"]["buckets"]:
+        stats = bucket["salary"]
+        docs.append(
+            rollup_doc(
+                field,
+                bucket["key"],
+                count=bucket["doc_count"],
+                mean=stats["avg"] or 0.0,
+                median=bucket["median"]["values"]["50.0"] or 0.0,
+                min=stats["min"] or 0.0,
+                max=stats["max"] or 0.0,
+            )
+        )
+    return docs
+
+
+async def write_rollups(
+    es: AsyncElasticsearch,
+    docs: List[Dict[str, Any]],
+    deleted: Optional[Dict[str, Set[str]]] = None,
+) -> str:
+    """
+    Stores rollup documents, replacing the previous rollups of their groups.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        docs (List[Dict[str, Any]]): Rollup documents to store.
+        deleted (Optional[Dict[str, Set[str]]]): Groups of each dimension left without documents.
+
+    Returns:
+        str: Timestamp stored in the documents.
+    """
+    await ensure_rollups_index(es)
+    updated_at = datetime.now(timezone.utc).isoformat()
+
+    operations = []
+    for doc in docs:
+        operations.append(
+            {
+                "index": {
+                    "_index": ROLLUPS_INDEX,
+                    "_id": rollup_id(doc["dimension"], doc["value"]),
+                }
+            }
+        )
+        operations.append({**doc, "updated_at": updated_at})
+    for field, values in (deleted or {}).items():
+        operations += [
+            {"delete": {"_index": ROLLUPS_INDEX, "_id": rollup_id(field, value)}}
+            for value in values
+        ]
+
+    if operations:
+        await es.bulk(operations=operations, refresh="wait_for")
+    return updated_at
+
+
+async def replace_rollups(es: AsyncElasticsearch, docs: List[Dict[str, Any]]):
+    """
+    Replaces every stored rollup, e.g. after a full import.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        docs (List[Dict[str, Any]]): Rollup documents of every group.
+    """
+    updated_at = await write_rollups(es, docs)
+    # Groups that no longer exist keep their older timestamp
+    await es.delete_by_query(
+        index=ROLLUPS_INDEX,
+        body={"query": {"range": {"updated_at": {"lt": updated_at}}}},
+        refresh=True,
+    )
+
+
+async def rebuild_rollups(es: AsyncElasticsearch):
+    """
+    Recomputes the rollups of every group from the politicians index.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+    """
+    docs = []
+    for field in ROLLUP_DIMENSIONS.values():
+        docs += await compute_rollups(es, field)
+    await replace_rollups(es, docs)
+
+
+async def refresh_rollups(es: AsyncElasticsearch, field: str, values: Set[str]):
+    """
+    Recomputes the rollups of some groups of a dimension.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        field (str): Field of the dimension.
+        values (Set[str]): Groups to recompute.
+    """
+    docs = await compute_rollups(es, field, sorted(values))
+    deleted = values - {doc["value"] for doc in docs}
+    await write_rollups(es, docs, {field: deleted})
+
+
+async def get_rollups(es: AsyncElasticsearch, field: str) -> List[Dict[str, Any]]:
+    """
+    Reads the stored rollups of a dimension, largest groups first.
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        field (str): Field of the dimension.
+
+    Returns:
+        List[Dict[str, Any]]: Rollup document of each group.
+    """
+    response = await es.search(
+        index=ROLLUPS_INDEX,
+        body={
+            "query": {"term": {"dimension": field}},
+            "sort": [{"count": "desc"}, {"value": "asc"}],
+            "size": ROLLUPS_MAX_GROUPS,
+        },
+    )
+    return [hit["_source"] for hit in response["hits"]["hits"]]
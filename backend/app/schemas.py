@@ -1,27 +1,42 @@
-from typing import List
+import os
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, field_validator, Field
 
 from app.utils import partial_model
 
+# Maximum number of politicians read or written by a single batch request.
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 1000))
+
+
+# Salaries are stored as cents: scaled floats are longs on disk, smaller and
+# faster to aggregate than floats. Fields that are only displayed are not
+# indexed, and the ones never sorted or aggregated have no doc values either.
+SALARY = {"es_type": "scaled_float", "scaling_factor": 100}
+NOT_INDEXED = {"index": False}
+SOURCE_ONLY = {"index": False, "doc_values": False}
+
 
 class Politician(BaseModel):
     # Comment for clarification, text_field defines a field that will be of type keyword AND text in elasticsearch
-    nombre: str = Field(..., text_field=True)
+    # and suggest adds a search_as_you_type subfield used for autocompletion
+    nombre: str = Field(..., text_field=True, suggest=True)
     partido: str
-    partido_para_filtro: str
+    partido_para_filtro: str = Field(..., **SOURCE_ONLY)
     genero: str
     cargo_para_filtro: str
-    cargo: str
-    institucion: str
+    cargo: str = Field(..., **SOURCE_ONLY)
+    institucion: str = Field(..., **NOT_INDEXED)
     ccaa: str
-    sueldobase_sueldo: float
-    complementos_sueldo: float
-    pagasextra_sueldo: float
-    otrasdietaseindemnizaciones_sueldo: float
-    trienios_sueldo: float
-    retribucionmensual: float
-    retribucionanual: float
-    observaciones: str = Field(..., text_field=True)
+    sueldobase_sueldo: float = Field(..., **SALARY)
+    complementos_sueldo: float = Field(..., **SALARY, **SOURCE_ONLY)
+    pagasextra_sueldo: float = Field(..., **SALARY, **SOURCE_ONLY)
+    otrasdietaseindemnizaciones_sueldo: float = Field(..., **SALARY, **SOURCE_ONLY)
+    trienios_sueldo: float = Field(..., **SALARY, **SOURCE_ONLY)
+    retribucionmensual: float = Field(..., **SALARY, **NOT_INDEXED)
+    retribucionanual: float = Field(..., **SALARY, **NOT_INDEXED)
+    observaciones: str = Field(..., text_field=True, norms=False)
 
     @field_validator(
         "sueldobase_sueldo",
@@ -52,19 +67,181 @@ class PoliticianEntry(Politician):
     id: str = Field(None, alias="_id")
 
 
+class FacetBucket(BaseModel):
+    value: str
+    count: int
+
+
+# Politician with only the fields requested through `fields`.
+PartialPoliticianEntry = partial_model(PoliticianEntry)
+
+
 class PoliticiansPaginated(BaseModel):
-    data: List[PoliticianEntry]
+    data: List[PartialPoliticianEntry]
     total_pages: int
+    total_pages_exact: bool = True
+    next_cursor: Optional[str] = None
+    facets: Optional[Dict[str, List[FacetBucket]]] = None
+
+
+class RefreshPolicy(str, Enum):
+    wait_for = "wait_for"
+    true = "true"
+    false = "false"
+
+
+class PoliticianIds(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_SIZE)
+
+
+class PoliticianBatchUpdate(BaseModel):
+    id: str
+    doc: PoliticianUpdate
+
+
+class PoliticiansBatchUpdate(BaseModel):
+    updates: List[PoliticianBatchUpdate] = Field(
+        ..., min_length=1, max_length=BATCH_MAX_SIZE
+    )
+
+
+class PoliticiansBatch(BaseModel):
+    data: List[PoliticianEntry]
+    not_found: List[str]
+
+
+class BatchItemResult(BaseModel):
+    id: str
+    status: int
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    items: List[BatchItemResult]
 
 
 class MessageResponse(BaseModel):
     message: str
 
 
+class ClearMode(str, Enum):
+    delete_by_query = "delete_by_query"
+    truncate = "truncate"
+    task = "task"
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class TaskResponse(MessageResponse):
+    task_id: str
+
+
+class TaskStatusResponse(BaseModel):
+    task_id: str
+    completed: bool
+    total: int
+    deleted: int
+    failures: List[dict]
+
+
+class BulkChunkReport(BaseModel):
+    chunk: int
+    docs: int
+    bytes: int
+    indexed: int
+    failed: int
+    retries: int
+    took_ms: int
+    elapsed_ms: float
+
+
+class RowError(BaseModel):
+    row: Optional[int] = None
+    id: Optional[str] = None
+    column: Optional[str] = None
+    value: Optional[str] = None
+    error: str
+
+
+class BulkResponse(MessageResponse):
+    index: str
+    indexed: int
+    failed: int
+    skipped: int = 0
+    rejected: int = 0
+    errors: List[RowError] = []
+    elapsed_ms: float
+    chunks: List[BulkChunkReport]
+
+
+class ImportJobResponse(MessageResponse):
+    job_id: str
+
+
+class ImportJobStatus(BaseModel):
+    job_id: str
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    rows_parsed: int
+    indexed: int
+    failed: int
+    rejected: int
+    skipped: int
+    bytes_read: int
+    bytes_total: int
+    elapsed_seconds: float
+    rows_per_second: float
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[BulkResponse] = None
+
+
 class StatisticsResponse(BaseModel):
     mean_salary: float
     median_salary: float
-    top_salaries: List[PoliticianEntry]
+    top_salaries: List[PartialPoliticianEntry]
+
+
+class RollupDimension(str, Enum):
+    party = "party"
+    region = "region"
+    position = "position"
+    institution = "institution"
+
+
+class SalaryRollup(BaseModel):
+    value: str
+    count: int
+    mean_salary: float
+    median_salary: float
+    min_salary: float
+    max_salary: float
+
+
+class RollupsResponse(BaseModel):
+    dimension: RollupDimension
+    groups: List[SalaryRollup]
+
+
+class SlowQuery(BaseModel):
+    id: int
+    timestamp: datetime
+    endpoint: str
+    params: Dict[str, Any]
+    index: Optional[str] = None
+    body: Dict[str, Any]
+    took_ms: Optional[int] = None
+    wall_ms: float
+    profile: Optional[Dict[str, Any]] = None
+    profile_error: Optional[str] = None
 
 
 class ErrorResponse(BaseModel):
@@ -1,14 +1,50 @@
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from dotenv import load_dotenv
 from elasticsearch import AsyncElasticsearch
 from pydantic import BaseModel
 
+from app.metrics import InstrumentedClient
+from app.utils import env_flag
+
 load_dotenv()
 
 
+def client_options() -> Dict[str, Any]:
+    """
+    Builds the options of the Elasticsearch client from environment variables.
+    `ELASTIC_ENDPOINT` accepts a comma separated list of nodes, requests are
+    spread across all of them and the connections to each node are pooled.
+    Returns:
+        dict: Keyword arguments for `AsyncElasticsearch`.
+    """
+    return {
+        "hosts": [host.strip() for host in os.environ["ELASTIC_ENDPOINT"].split(",")],
+        "ca_certs": os.environ.get(
+            "ELASTIC_CA_CERTS", "/usr/share/backend/config/certs/ca/ca.crt"
+        )
+        or None,
+        "basic_auth": (
+            os.environ.get("ELASTIC_USERNAME", "elastic"),
+            os.environ["ELASTIC_PASSWORD"],
+        ),
+        "connections_per_node": int(os.environ.get("ELASTIC_CONNECTIONS_PER_NODE", 10)),
+        "http_compress": env_flag("ELASTIC_HTTP_COMPRESS"),
+        "request_timeout": float(os.environ.get("ELASTIC_REQUEST_TIMEOUT", 10)),
+        "max_retries": int(os.environ.get("ELASTIC_MAX_RETRIES", 3)),
+        "retry_on_timeout": env_flag("ELASTIC_RETRY_ON_TIMEOUT"),
+        "sniff_on_start": env_flag("ELASTIC_SNIFF_ON_START"),
+        "sniff_on_node_failure": env_flag("ELASTIC_SNIFF_ON_NODE_FAILURE"),
+        "sniff_timeout": float(os.environ.get("ELASTIC_SNIFF_TIMEOUT", 1)),
+        "min_delay_between_sniffing": float(
+            os.environ.get("ELASTIC_MIN_DELAY_BETWEEN_SNIFFING", 60)
+        ),
+    }
+
+
 class Search(AsyncElasticsearch):
     """
     Singleton class to handle Elasticsearch connection.
@@ -24,11 +60,7 @@ class Search(AsyncElasticsearch):
         """
         if cls.instance is None:
             cls.instance = super().__new__(cls)
-            cls.instance.client = AsyncElasticsearch(
-                os.environ["ELASTIC_ENDPOINT"],
-                ca_certs="/usr/share/backend/config/certs/ca/ca.crt",
-                basic_auth=("elastic", os.environ["ELASTIC_PASSWORD"]),
-            )
+            cls.instance.client = InstrumentedClient(AsyncElasticsearch(**client_options()))
         return cls.instance.client
 
 
@@ -41,6 +73,148 @@ async def get_es() -> Optional[Search]:
     return Search()
 
 
+async def close_es() -> None:
+    """
+    Closes the Elasticsearch instance, draining its connections.
+    The next call to `get_es` creates a new instance.
+    """
+    if Search.instance is not None:
+        client, Search.instance = Search.instance.client, None
+        await client.close()
+
+
+# Alias every endpoint reads from and writes to. It points at a single
+# versioned index built by a full import, see `versioned_index_name`.
+POLITICIANS_INDEX = "politicians"
+
+# Index settings applied while bulk loading: no periodic refreshes and no
+# replicas to keep in sync, both are restored once the load finishes.
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+
+
+@asynccontextmanager
+async def bulk_load_settings(es: AsyncElasticsearch, index: str) -> AsyncIterator[None]:
+    """
+    Context manager to tune an index for bulk loading.
+    It disables refreshes and replicas on enter and restores the original settings on exit,
+    even if the load fails. Documents indexed meanwhile are not visible to searches until the next refresh.
+
+    Usage:
+
+    ```python
+    async with bulk_load_settings(es, "politicians"):
+        await load_documents()
+    await es.indices.refresh(index="politicians")
+    ```
+
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        index (str): Name of the index or alias to tune.
+
+    Yields:
+        None
+    """
+    response = await es.indices.get_settings(
+        index=index, name=[f"index.{name}" for name in BULK_LOAD_SETTINGS], flat_settings=True
+    )
+    # A missing setting is restored as None, which resets it to the cluster default
+    original_settings = {
+        name: {
+            setting: body["settings"].get(f"index.{setting}")
+            for setting in BULK_LOAD_SETTINGS
+        }
+        for name, body in response.items()
+    }
+
+    await es.indices.put_settings(index=index, settings={"index": BULK_LOAD_SETTINGS})
+    try:
+        yield
+    finally:
+        for name, settings in original_settings.items():
+            await es.indices.put_settings(index=name, settings={"index": settings})
+
+
+def versioned_index_name(alias: str) -> str:
+    """
+    Builds the name of a new version of the index behind an alias.
+    Args:
+        alias (str): Name of the alias.
+    Returns:
+        str: Index name in the form `<alias>-<timestamp>`.
+    """
+    return f"{alias}-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')}"
+
+
+async def swap_alias(es: AsyncElasticsearch, alias: str, index: str) -> List[str]:
+    """
+    Atomically points an alias at an index, detaching it from any other index.
+    A legacy index named like the alias is deleted in the same atomic operation.
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        alias (str): Name of the alias.
+        index (str): Name of the index the alias should point at.
+    Returns:
+        List[str]: Indices the alias pointed at before the swap.
+    """
+    actions = [{"add": {"index": index, "alias": alias}}]
+    previous_indices = []
+
+    if await es.indices.exists_alias(name=alias):
+        response = await es.indices.get_alias(name=alias)
+        previous_indices = [name for name in response if name != index]
+        actions = [
+            {"remove": {"index": name, "alias": alias}} for name in previous_indices
+        ] + actions
+    elif await es.indices.exists(index=alias):
+        actions.insert(0, {"remove_index": {"index": alias}})
+
+    await es.indices.update_aliases(actions=actions)
+    return previous_indices
+
+
+# Settings generated by Elasticsearch for an index that cannot be set when creating a new one.
+INTERNAL_SETTINGS = (
+    "index.uuid",
+    "index.creation_date",
+    "index.provided_name",
+    "index.version.",
+    "index.routing.allocation.initial_recovery",
+    "index.resize.",
+)
+
+
+async def truncate_index(es: AsyncElasticsearch, name: str) -> None:
+    """
+    Removes every document of an index by replacing it with an empty copy.
+    For an alias, the copy is a new versioned index swapped in behind the alias,
+    otherwise the index is deleted and recreated with the same mappings and settings.
+    Args:
+        es (AsyncElasticsearch): Elasticsearch client.
+        name (str): Name of the index or alias to truncate.
+    """
+    is_alias = await es.indices.exists_alias(name=name)
+    source = next(iter(await es.indices.get_alias(name=name))) if is_alias else name
+
+    mappings = (await es.indices.get_mapping(index=source))[source]["mappings"]
+    settings = (await es.indices.get_settings(index=source, flat_settings=True))[
+        source
+    ]["settings"]
+    settings = {
+        setting: value
+        for setting, value in settings.items()
+        if not setting.startswith(INTERNAL_SETTINGS)
+    }
+
+    if is_alias:
+        index = versioned_index_name(name)
+        await es.indices.create(index=index, mappings=mappings, settings=settings)
+        previous_indices = await swap_alias(es, name, index)
+        await es.indices.delete(index=previous_indices)
+    else:
+        await es.indices.delete(index=name)
+        await es.indices.create(index=name, mappings=mappings, settings=settings)
+
+
 type_map: Dict[type, Dict[str, str]] = {
     str: {"type": "keyword", "null_value": ""},
     datetime: {"type": "date", "null_value": ""},
@@ -52,9 +226,37 @@ type_map: Dict[type, Dict[str, str]] = {
 }
 
 
-def create_es_mapping(pydantic_model: BaseModel) -> Dict[str, str]:
+# Mapping parameters that can be set through `Field(...)` extras, e.g.
+# `Field(..., es_type="scaled_float", scaling_factor=100, index=False)`.
+MAPPING_PARAMS = ("index", "doc_values", "norms", "scaling_factor")
+
+
+def create_es_field_mapping(annotation: Any) -> Dict[str, Any]:
+    """
+    Creates the Elasticsearch mapping of a type annotation.
+    Args:
+        annotation (Any): Type of the field.
+    Returns:
+        dict: Elasticsearch mapping of the field.
+    """
+    es_field_type = type_map.get(annotation)
+    if es_field_type:
+        return dict(es_field_type)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {"type": "object", "properties": create_es_mapping(annotation)}
+
+    # Lists map to their item type, lists of models are nested documents
+    item = annotation.__args__[0]
+    if isinstance(item, type) and issubclass(item, BaseModel):
+        return {"type": "nested", "properties": create_es_mapping(item)}
+    return create_es_field_mapping(item)
+
+
+def create_es_mapping(pydantic_model: BaseModel) -> Dict[str, Any]:
     """
     Creates Elasticsearch mapping from Pydantic model.
+    Fields are tuned with the `Field(...)` extras `text_field`, `suggest`,
+    `es_type` and the parameters in `MAPPING_PARAMS`.
     Args:
         pydantic_model (BaseModel): Pydantic model for which mapping needs to be created.
     Returns:
@@ -63,21 +265,19 @@ def create_es_mapping(pydantic_model: BaseModel) -> Dict[str, str]:
     mapping = {}
 
     for field, field_info in pydantic_model.model_fields.items():
-        es_field_type = type_map.get(field_info.annotation)
-        if not es_field_type:
-            if issubclass(field_info.annotation, BaseModel):
-                es_field_type = create_es_mapping(field_info.annotation)
-            else:
-                es_field_type = {
-                    "type": "nested",
-                    "properties": create_es_mapping(field_info.annotation.__args__[0]),
-                }
-
-        if (
-            field_info.json_schema_extra is not None
-            and field_info.json_schema_extra.get("text_field")
-        ):
-            mapping[field] = {"type": "text", "fields": {"raw": {"type": "keyword"}}}
+        extra = field_info.json_schema_extra or {}
+        if extra.get("text_field"):
+            es_field = {"type": "text", "fields": {"raw": {"type": "keyword"}}}
+            if extra.get("suggest"):
+                es_field["fields"]["suggest"] = {"type": "search_as_you_type"}
         else:
-            mapping[field] = {"type": es_field_type.get('type'), "null_value": es_field_type.get('null_value')}
+            es_field = create_es_field_mapping(field_info.annotation)
+            if "es_type" in extra:
+                es_field["type"] = extra["es_type"]
+
+        es_field.update({param: extra[param] for param in MAPPING_PARAMS if param in extra})
+        # A field neither indexed nor with doc values only lives in _source
+        if es_field.get("index") is False and es_field.get("doc_values") is False:
+            es_field.pop("null_value", None)
+        mapping[field] = es_field
     return mapping
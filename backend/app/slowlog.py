@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from contextlib import suppress
+from datetime import datetime, timezone
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from app.metrics import SLOW_QUERIES
+from app.search import POLITICIANS_INDEX
+from app.utils import env_flag
+
+# Searches taking longer than this many milliseconds are logged, 0 disables the log.
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", 500))
+# Number of slow queries kept for GET /admin/slow_queries.
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", 50))
+# Re-run slow queries with the profile API and keep the breakdown with them.
+SLOW_QUERY_PROFILE = env_flag("SLOW_QUERY_PROFILE")
+
+# Parts of a search that only apply to the point in time it ran in.
+PIT_PARAMS = ("pit", "search_after")
+
+
+def profile_body(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the profiled version of a search.
+    Points in time expire, so the search runs against the index instead, and
+    the `_shard_doc` tiebreaker, which requires a point in time, is dropped.
+
+    Args:
+        body (Dict[str, Any]): Body of the slow search.
+
+    Returns:
+        Dict[str, Any]: Body of the same search with profiling enabled.
+    """
+    body = {key: value for key, value in body.items() if key not in PIT_PARAMS}
+    if "sort" in body:
+        body["sort"] = [
+            sort
+            for sort in body["sort"]
+            if not (isinstance(sort, dict) and "_shard_doc" in sort)
+        ]
+    return {**body, "profile": True}
+
+
+class SlowQueryLog:
+    """
+    Logs the searches slower than a threshold with their body and request
+    parameters, and keeps the latest ones in a ring buffer.
+
+    When profiling is enabled each slow search is run again in the background
+    with the profile API and the breakdown is stored with it. Only one profile
+    runs at a time so a burst of slow queries, e.g. from an overloaded
+    cluster, does not add to the load.
+
+    Usage:
+
+    ```python
+    slow_queries = SlowQueryLog(threshold_ms=500, size=50, profile=True)
+    response = await slow_queries.search(es, "/politicians", {"name": "ana"}, index="politicians", body=body)
+    slow_queries.recent(10)
+    ```
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+        size: int = SLOW_QUERY_LOG_SIZE,
+        profile: bool = SLOW_QUERY_PROFILE,
+    ):
+        """
+        Args:
+            threshold_ms (float): Searches taking longer are logged, 0 disables the log.
+            size (int): Number of slow queries kept.
+            profile (bool): Re-run slow queries with the profile API.
+        """
+        self.threshold_ms = threshold_ms
+        self.profile = profile
+        self.entries: deque = deque(maxlen=size)
+        self._ids = count(1)
+        self._profiling: Optional[asyncio.Task] = None
+
+    async def search(
+        self,
+        es: AsyncElasticsearch,
+        endpoint: str,
+        params: Dict[str, Any],
+        **search: Any,
+    ) -> Any:
+        """
+        Runs a search, logging it when it is slow.
+
+        Args:
+            es (AsyncElasticsearch): Elasticsearch client.
+            endpoint (str): Route the search is made for.
+            params (Dict[str, Any]): Parameters of the request.
+            **search (Any): Arguments of `es.search`.
+
+        Returns:
+            Any: The search response.
+        """
+        started = time.perf_counter()
+        response = await es.search(**search)
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        if self.threshold_ms and wall_ms >= self.threshold_ms:
+            self.record(es, endpoint, params, search, response.get("took"), wall_ms)
+        return response
+
+    def record(
+        self,
+        es: AsyncElasticsearch,
+        endpoint: str,
+        params: Dict[str, Any],
+        search: Dict[str, Any],
+        took_ms: Optional[int],
+        wall_ms: float,
+    ) -> Dict[str, Any]:
+        """
+        Logs a slow search and keeps it in the ring buffer.
+
+        Args:
+            es (AsyncElasticsearch): Elasticsearch client, used to profile the search.
+            endpoint (str): Route the search is made for.
+            params (Dict[str, Any]): Parameters of the request.
+            search (Dict[str, Any]): Arguments of `es.search`.
+            took_ms (Optional[int]): Time reported by Elasticsearch.
+            wall_ms (float): Time measured by the client.
+
+        Returns:
+            Dict[str, Any]: The stored entry.
+        """
+        body = search.get("body") or {}
+        entry = {
+            "id": next(self._ids),
+            "timestamp": datetime.now(timezone.utc),
+            "endpoint": endpoint,
+            "params": params,
+            "index": search.get("index"),
+            "body": body,
+            "took_ms": took_ms,
+            "wall_ms": round(wall_ms, 2),
+            "profile": None,
+            "profile_error": None,
+        }
+        print(
+            "slow query on %s: took=%sms wall=%.1fms params=%s body=%s"
+            % (
+                endpoint,
+                took_ms,
+                wall_ms,
+                json.dumps(params, ensure_ascii=False, default=str),
+                json.dumps(body, ensure_ascii=False, default=str),
+            )
+        )
+        SLOW_QUERIES.inc(1, endpoint)
+        self.entries.append(entry)
+
+        if self.profile:
+            if self._profiling is None or self._profiling.done():
+                self._profiling = asyncio.create_task(self._profile(es, entry))
+            else:
+                entry["profile_error"] = (
+                    "Skipped, another slow query was being profiled"
+                )
+        return entry
+
+    async def _profile(self, es: AsyncElasticsearch, entry: Dict[str, Any]):
+        try:
+            response = await es.search(
+                index=entry["index"] or POLITICIANS_INDEX,
+                body=profile_body(entry["body"]),
+            )
+            entry["profile"] = response.get("profile")
+        except Exception as e:
+            print("failed to profile slow query %s: %s" % (entry["id"], e))
+            entry["profile_error"] = str(e) or type(e).__name__
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Args:
+            limit (Optional[int]): Maximum number of entries, all of them by default.
+
+        Returns:
+            List[Dict[str, Any]]: The latest slow queries, newest first.
+        """
+        entries = list(reversed(self.entries))
+        return entries[:limit] if limit is not None else entries
+
+    async def close(self):
+        """
+        Cancel a running profile.
+        """
+        if self._profiling is not None:
+            self._profiling.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._profiling
+            self._profiling = None
@@ -1,6 +1,10 @@
+import base64
+import json
+import os
 from copy import deepcopy
-from typing import Any, Optional, Tuple, Type
+from typing import Any, Dict, Optional, Tuple, Type
 
+import pandas as pd
 from pydantic import BaseModel, create_model
 from pydantic.fields import FieldInfo
 
@@ -78,3 +82,102 @@ def is_float(num):
         return True
     except ValueError:
         return False
+
+
+def to_float_series(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Vectorized version of `is_float` and the conversion, for a whole column at once.
+    Accepts both `.` and `,` as decimal separator, `.` is a thousands separator
+    when there is a `,` (`1.234,5`).
+
+    Usage:
+
+    ```python
+    numbers, invalid = to_float_series(pd.Series(["0,3", None, "s0.3"]))
+    numbers.tolist() # [0.3, nan, nan]
+    invalid.tolist() # [False, False, True]
+    ```
+    Args:
+        values (pd.Series): Column to convert.
+
+    Returns:
+        Tuple[pd.Series, pd.Series]: The float column, with NaN for blank and invalid values, and the mask of invalid values.
+    """
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.astype(float), pd.Series(False, index=values.index)
+
+    text = values.astype("string").str.strip()
+    decimal_comma = text.str.contains(",", regex=False).fillna(False)
+    text = text.mask(
+        decimal_comma,
+        text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+    )
+    blank = (text.fillna("") == "").astype(bool)
+    numbers = pd.to_numeric(text.mask(blank), errors="coerce").astype(float)
+    return numbers, numbers.isna() & ~blank
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """
+    Encode pagination state into an opaque, URL safe cursor.
+
+    Usage:
+
+    ```python
+    cursor = encode_cursor({"pit": "46ToAwMDaWR5BXV1aWQy", "after": [1.0, 42]})
+    decode_cursor(cursor) # {"pit": "46ToAwMDaWR5BXV1aWQy", "after": [1.0, 42]}
+    ```
+    Args:
+        data (Dict[str, Any]): JSON serializable pagination state.
+
+    Returns:
+        str: The encoded cursor.
+    """
+    encoded = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(encoded).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor created with `encode_cursor`.
+
+    Args:
+        cursor (str): The encoded cursor.
+
+    Returns:
+        Dict[str, Any]: The pagination state.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Malformed cursor") from e
+
+    if not isinstance(data, dict):
+        raise ValueError("Malformed cursor")
+    return data
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """
+    Read a boolean flag from an environment variable.
+
+    Usage:
+
+    ```python
+    os.environ["WRITE_BEHIND"] = "true"
+    env_flag("WRITE_BEHIND") # true
+    ```
+    Args:
+        name (str): Name of the environment variable.
+        default (bool): Value when the variable is not set.
+
+    Returns:
+        bool: True if the variable is set to `true`, `1` or `yes`.
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("true", "1", "yes")
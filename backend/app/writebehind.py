@@ -0,0 +1,246 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from elasticsearch import ApiError, AsyncElasticsearch, ConnectionTimeout
+from elasticsearch import ConnectionError as ESConnectionError
+
+# Marks a pending deletion in the queue.
+DELETE = None
+
+# Statuses returned by a cluster that is temporarily overloaded or unavailable.
+RETRYABLE_STATUSES = (429, 503)
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Args:
+        error (Exception): Error raised by a flush.
+
+    Returns:
+        bool: True if the flush may succeed when retried later.
+    """
+    if isinstance(error, (ESConnectionError, ConnectionTimeout)):
+        return True
+    return isinstance(error, ApiError) and error.meta.status in RETRYABLE_STATUSES
+
+
+class WriteBehindQueue:
+    """
+    Queue of pending writes flushed in the background with the bulk API.
+
+    Writes to the same document made before a flush are coalesced: updates are
+    merged into a single partial update and a deletion replaces any pending update.
+    The queue is flushed every `flush_interval` seconds, or as soon as
+    `max_pending` documents have pending writes. Synchronous writes call
+    `flush_ids` or `discard` first, so a queued write never lands after them.
+
+    Usage:
+
+    ```python
+    queue = WriteBehindQueue("politicians", flush_interval=1, max_pending=500)
+    queue.update(es, "id", {"partido": "PP"})
+    queue.delete(es, "other_id")
+    await queue.close()
+    ```
+    """
+
+    def __init__(
+        self,
+        index: str,
+        flush_interval: float = 1,
+        max_pending: int = 500,
+        refresh: str = "false",
+        max_retries: int = 5,
+        on_flush: Optional[Callable[[], None]] = None,
+        before_flush: Optional[
+            Callable[
+                [AsyncElasticsearch, Dict[str, Optional[Dict[str, Any]]]],
+                Awaitable[None],
+            ]
+        ] = None,
+    ):
+        """
+        Args:
+            index (str): Index the writes are applied to.
+            flush_interval (float): Seconds between flushes.
+            max_pending (int): Number of documents with pending writes that triggers a flush.
+            refresh (str): Refresh policy of the bulk requests.
+            max_retries (int): Consecutive flushes failing with a transient error before the writes are dropped.
+            on_flush (Optional[Callable[[], None]]): Called after each flush that wrote documents.
+            before_flush (Optional[Callable[[AsyncElasticsearch, Dict[str, Optional[Dict[str, Any]]]], Awaitable[None]]]):
+                Awaited with the client and the writes about to be flushed, by id,
+                `DELETE` for deletions. The flush fails if it raises.
+        """
+        self.index = index
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.refresh = refresh
+        self.max_retries = max_retries
+        self.on_flush = on_flush
+        self.before_flush = before_flush
+        self._pending: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._client: Optional[AsyncElasticsearch] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._closing = False
+        self._failed_flushes = 0
+        # Held while a bulk request is in flight, so writes of the same documents wait for it
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def update(self, client: AsyncElasticsearch, id: str, doc: Dict[str, Any]):
+        """
+        Queue a partial update of a document.
+
+        Args:
+            client (AsyncElasticsearch): Elasticsearch client used to flush the queue.
+            id (str): Id of the document.
+            doc (Dict[str, Any]): Fields to update.
+        """
+        self._enqueue(client, id, doc)
+
+    def delete(self, client: AsyncElasticsearch, id: str):
+        """
+        Queue the deletion of a document.
+
+        Args:
+            client (AsyncElasticsearch): Elasticsearch client used to flush the queue.
+            id (str): Id of the document.
+        """
+        self._enqueue(client, id, DELETE)
+
+    def _enqueue(
+        self, client: AsyncElasticsearch, id: str, doc: Optional[Dict[str, Any]]
+    ):
+        self._client = client
+        if id in self._pending:
+            doc = self._merge(self._pending[id], doc)
+        self._pending[id] = doc
+
+        if self._flusher is None or self._flusher.done():
+            self._closing = False
+            self._flush_requested = asyncio.Event()
+            self._flusher = asyncio.create_task(self._run())
+        if len(self._pending) >= self.max_pending:
+            self._flush_requested.set()
+
+    @staticmethod
+    def _merge(
+        older: Optional[Dict[str, Any]], newer: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        # Updates to a document pending deletion would fail with a missing document anyway
+        if older is DELETE or newer is DELETE:
+            return DELETE
+        return {**older, **newer}
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        Write every pending document with a single bulk request.
+        If the request fails with a transient error the writes are queued again,
+        behind any newer write to the same documents, up to `max_retries`
+        consecutive times. Writes failing otherwise are dropped.
+        """
+        async with self._lock:
+            if not self._pending:
+                return
+
+            pending, self._pending = self._pending, {}
+            try:
+                await self._write(pending)
+            except Exception as e:
+                self._failed_flushes += 1
+                if not is_transient(e) or self._failed_flushes > self.max_retries:
+                    print("dropped %d pending writes: %s" % (len(pending), e))
+                    self._failed_flushes = 0
+                    return
+
+                print(
+                    "failed to flush %d pending writes, retrying: %s"
+                    % (len(pending), e)
+                )
+                for id, doc in pending.items():
+                    if id in self._pending:
+                        doc = self._merge(doc, self._pending[id])
+                    self._pending[id] = doc
+                return
+            self._failed_flushes = 0
+
+    async def flush_ids(self, ids: Iterable[str]):
+        """
+        Write the pending writes of some documents now, before they are written synchronously.
+        Waits for a flush in flight, which may hold writes of the same documents.
+        If the request fails the writes are dropped: queued again they would
+        overwrite the newer synchronous write.
+
+        Args:
+            ids (Iterable[str]): Ids of the documents.
+        """
+        async with self._lock:
+            pending = {id: self._pending.pop(id) for id in ids if id in self._pending}
+            if not pending:
+                return
+            try:
+                await self._write(pending)
+            except Exception as e:
+                print(
+                    "dropped %d pending writes overridden by a newer write: %s"
+                    % (len(pending), e)
+                )
+
+    async def discard(self, ids: Iterable[str]):
+        """
+        Drop the pending writes of some documents, before they are deleted synchronously.
+        Waits for a flush in flight, which may hold writes of the same documents.
+
+        Args:
+            ids (Iterable[str]): Ids of the documents.
+        """
+        async with self._lock:
+            for id in ids:
+                self._pending.pop(id, None)
+
+    async def _write(self, pending: Dict[str, Optional[Dict[str, Any]]]):
+        operations = []
+        for id, doc in pending.items():
+            if doc is DELETE:
+                operations.append({"delete": {"_index": self.index, "_id": id}})
+            else:
+                operations.append({"update": {"_index": self.index, "_id": id}})
+                operations.append({"doc": doc})
+
+        if self.before_flush is not None:
+            await self.before_flush(self._client, pending)
+        response = await self._client.bulk(operations=operations, refresh=self.refresh)
+
+        for item in response["items"]:
+            action, result = next(iter(item.items()))
+            if result["status"] >= 300:
+                print("failed to %s document %s" % (action, result["_id"]))
+
+        if self.on_flush is not None:
+            self.on_flush()
+
+    async def close(self):
+        """
+        Stop flushing in the background and write every pending document.
+        """
+        if self._flusher is not None:
+            # Let an ongoing flush finish instead of cancelling it halfway
+            self._closing = True
+            self._flush_requested.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
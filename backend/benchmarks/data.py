@@ -0,0 +1,36 @@
+import csv
+from pathlib import Path
+
+# Sample of the politicians CSV the synthetic imports are scaled up from.
+SOURCE_CSV = Path(__file__).resolve().parents[2] / "data" / "import.csv"
+
+
+def synthetic_csv(path: Path, rows: int, source: Path = SOURCE_CSV) -> Path:
+    """
+    Writes a politicians CSV of any size by repeating the rows of a sample file.
+    Repeated rows get a numbered name, so every row is a distinct politician
+    with its own document id.
+
+    Args:
+        path (Path): File to write.
+        rows (int): Number of rows of the file.
+        source (Path): Sample CSV in the import format.
+
+    Returns:
+        Path: The written file.
+    """
+    with open(source, encoding="utf-8-sig", newline="") as file:
+        reader = csv.reader(file, delimiter=";")
+        header = next(reader)
+        sample = [row for row in reader if any(value.strip() for value in row)]
+
+    with open(path, "w", encoding="utf-8-sig", newline="") as file:
+        writer = csv.writer(file, delimiter=";", lineterminator="\n")
+        writer.writerow(header)
+        for number in range(rows):
+            copy, position = divmod(number, len(sample))
+            row = sample[position]
+            if copy:
+                row = [f"{row[0]} {copy}", *row[1:]]
+            writer.writerow(row)
+    return path
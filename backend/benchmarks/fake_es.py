@@ -0,0 +1,757 @@
+import asyncio
+import json
+import random
+import re
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import BadRequestError, NotFoundError
+
+Doc = Dict[str, Any]
+
+
+def _error(cls, status: int, type: str, reason: str):
+    meta = ApiResponseMeta(
+        status=status,
+        http_version="1.1",
+        headers=HttpHeaders(),
+        duration=0.0,
+        node=NodeConfig("http", "localhost", 9200),
+    )
+    return cls(
+        message=type,
+        meta=meta,
+        body={
+            "error": {
+                "type": type,
+                "reason": reason,
+                "root_cause": [{"type": type, "reason": reason}],
+            }
+        },
+    )
+
+
+def _not_found(index: str) -> NotFoundError:
+    return _error(
+        NotFoundError, 404, "index_not_found_exception", f"no such index [{index}]"
+    )
+
+
+def _tokens(value: Any) -> List[str]:
+    return re.findall(r"\w+", str(value).lower())
+
+
+def _field_value(doc: Doc, field: str) -> Any:
+    # Multi-fields such as `nombre.raw` or `nombre.suggest._2gram` index the parent value
+    if field in doc:
+        return doc[field]
+    return doc.get(field.split(".", 1)[0])
+
+
+def _values(doc: Doc, field: str) -> List[Any]:
+    value = _field_value(doc, field)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+class FakeIndex:
+    def __init__(self, mappings: Optional[Doc] = None, settings: Optional[Doc] = None):
+        self.docs: Dict[str, Doc] = {}
+        self.mappings = mappings or {"properties": {}}
+        self.settings = settings or {}
+        # Order of insertion, used as `_shard_doc` tiebreaker
+        self.seq: Dict[str, int] = {}
+
+
+class FakeNamespace:
+    def __init__(self, es: "FakeElasticsearch"):
+        self.es = es
+
+
+class FakeIndices(FakeNamespace):
+    async def exists(self, index: str) -> bool:
+        await self.es.wait()
+        return self.es.resolve(index, missing_ok=True) != []
+
+    async def exists_alias(self, name: str) -> bool:
+        await self.es.wait()
+        return name in self.es.aliases
+
+    async def get_alias(self, name: str) -> Doc:
+        await self.es.wait()
+        if name not in self.es.aliases:
+            raise _error(NotFoundError, 404, "aliases_not_found_exception", name)
+        return {index: {"aliases": {name: {}}} for index in self.es.aliases[name]}
+
+    async def create(
+        self,
+        index: str,
+        body: Optional[Doc] = None,
+        mappings: Optional[Doc] = None,
+        settings: Optional[Doc] = None,
+    ) -> Doc:
+        await self.es.wait()
+        self.es.changed()
+        if index in self.es._indices or index in self.es.aliases:
+            raise _error(
+                BadRequestError,
+                400,
+                "resource_already_exists_exception",
+                f"index [{index}] already exists",
+            )
+        body = body or {}
+        self.es._indices[index] = FakeIndex(
+            mappings or body.get("mappings"), settings or body.get("settings")
+        )
+        return {"acknowledged": True, "index": index}
+
+    async def delete(self, index, ignore_unavailable: bool = False) -> Doc:
+        await self.es.wait()
+        self.es.changed()
+        for name in [index] if isinstance(index, str) else index:
+            if name not in self.es._indices:
+                if ignore_unavailable:
+                    continue
+                raise _not_found(name)
+            del self.es._indices[name]
+            for indices in self.es.aliases.values():
+                indices.discard(name)
+        return {"acknowledged": True}
+
+    async def put_mapping(self, index: str, properties: Doc) -> Doc:
+        await self.es.wait()
+        for name in self.es.resolve(index):
+            self.es._indices[name].mappings["properties"].update(properties)
+        return {"acknowledged": True}
+
+    async def get_mapping(self, index: str) -> Doc:
+        await self.es.wait()
+        return {
+            name: {"mappings": self.es._indices[name].mappings}
+            for name in self.es.resolve(index)
+        }
+
+    async def get_settings(
+        self, index: str, name=None, flat_settings: bool = False
+    ) -> Doc:
+        await self.es.wait()
+        return {
+            index_name: {"settings": dict(self.es._indices[index_name].settings)}
+            for index_name in self.es.resolve(index)
+        }
+
+    async def put_settings(self, index: str, settings: Doc) -> Doc:
+        await self.es.wait()
+        for name in self.es.resolve(index):
+            for setting, value in settings.get("index", settings).items():
+                self.es._indices[name].settings[f"index.{setting}"] = value
+        return {"acknowledged": True}
+
+    async def update_aliases(self, actions: List[Doc]) -> Doc:
+        await self.es.wait()
+        self.es.changed()
+        for action in actions:
+            ((kind, params),) = action.items()
+            if kind == "add":
+                self.es.aliases.setdefault(params["alias"], set()).add(params["index"])
+            elif kind == "remove":
+                self.es.aliases.get(params["alias"], set()).discard(params["index"])
+            elif kind == "remove_index":
+                self.es._indices.pop(params["index"], None)
+        return {"acknowledged": True}
+
+    async def refresh(self, index: Optional[str] = None) -> Doc:
+        await self.es.wait()
+        return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+    async def forcemerge(self, index: Optional[str] = None, **kwargs) -> Doc:
+        await self.es.wait()
+        return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+
+class FakeCluster(FakeNamespace):
+    async def health(self, **kwargs) -> Doc:
+        await self.es.wait()
+        return {
+            "cluster_name": "fake",
+            "status": "green",
+            "number_of_nodes": 1,
+            "number_of_data_nodes": 1,
+            "active_shards": len(self.es._indices),
+        }
+
+
+class FakeElasticsearch:
+    """
+    In-process stand-in for the subset of the Elasticsearch API used by the
+    backend, to benchmark it without a cluster.
+
+    Documents are kept in memory and queries are evaluated by scanning them, so
+    only the query types and aggregations built by the backend are supported.
+    Each request waits `latency` seconds plus `per_doc_latency` for each
+    document it writes, with random `jitter`, to mimic the round trip and
+    indexing cost of a small cluster. Search responses are memoized until the
+    next write, so the time spent evaluating queries in Python is only paid by
+    the first of identical searches and does not distort the measured latency.
+
+    Usage:
+
+    ```python
+    es = FakeElasticsearch(latency=0.002)
+    app.dependency_overrides[get_es] = lambda: es
+    ```
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.002,
+        per_doc_latency: float = 0.00002,
+        jitter: float = 0.25,
+        keep_documents: bool = True,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            latency (float): Seconds each request waits.
+            per_doc_latency (float): Seconds added for each document written by a bulk request.
+            jitter (float): Maximum random variation of the latency, as a fraction of it.
+            keep_documents (bool): Store bulk documents. Disable it to measure the memory of an import alone.
+            seed (int): Seed of the latency jitter, for reproducible runs.
+        """
+        self.latency = latency
+        self.per_doc_latency = per_doc_latency
+        self.jitter = jitter
+        self.keep_documents = keep_documents
+        self._indices: Dict[str, FakeIndex] = {}
+        self.aliases: Dict[str, set] = {}
+        self.pits: Dict[str, List[Tuple[str, Doc, int]]] = {}
+        self.requests = 0
+        self._responses: Dict[str, Doc] = {}
+        self._random = random.Random(seed)
+        self._seq = count()
+        self._pit_ids = count()
+        self.cluster = FakeCluster(self)
+        self.indices = FakeIndices(self)
+
+    def options(self, **kwargs) -> "FakeElasticsearch":
+        return self
+
+    async def close(self):
+        pass
+
+    async def wait(self, docs: int = 0) -> float:
+        """
+        Simulates the latency of a request.
+
+        Args:
+            docs (int): Number of documents written by the request.
+
+        Returns:
+            float: Seconds waited, reported as `took`.
+        """
+        self.requests += 1
+        delay = (self.latency + docs * self.per_doc_latency) * (
+            1 + self._random.uniform(-self.jitter, self.jitter)
+        )
+        await asyncio.sleep(max(delay, 0))
+        return delay
+
+    def changed(self):
+        """
+        Forgets the memoized search responses, called by every write.
+        """
+        self._responses.clear()
+
+    def resolve(self, index: Optional[str], missing_ok: bool = False) -> List[str]:
+        """
+        Args:
+            index (Optional[str]): Name of an index or alias.
+            missing_ok (bool): Return an empty list instead of raising for a missing index.
+
+        Returns:
+            List[str]: Names of the indices.
+        """
+        if index in self.aliases:
+            return sorted(self.aliases[index])
+        if index in self._indices:
+            return [index]
+        if missing_ok:
+            return []
+        raise _not_found(index)
+
+    def _write_index(self, index: str) -> FakeIndex:
+        names = self.resolve(index, missing_ok=True)
+        if not names:
+            # Indexing into a missing index creates it with dynamic mappings
+            self._indices[index] = FakeIndex()
+            names = [index]
+        return self._indices[names[0]]
+
+    def _store(self, index: FakeIndex, id: str, source: Doc):
+        self.changed()
+        if id not in index.seq:
+            index.seq[id] = next(self._seq)
+        if self.keep_documents:
+            index.docs[id] = source
+        else:
+            index.docs[id] = None
+
+    async def bulk(self, operations: List[Any], refresh: Any = None, **kwargs) -> Doc:
+        lines = [
+            json.loads(line) if isinstance(line, (bytes, str)) else line
+            for line in operations
+        ]
+        items = []
+        position = 0
+        while position < len(lines):
+            ((action, meta),) = lines[position].items()
+            position += 1
+            index = self._write_index(meta["_index"])
+            id = meta.get("_id") or f"auto-{next(self._seq)}"
+            status = 200
+            if action in ("index", "create"):
+                status = 201 if id not in index.seq else 200
+                self._store(index, id, lines[position])
+                position += 1
+            elif action == "update":
+                doc = lines[position]["doc"]
+                position += 1
+                if id in index.docs:
+                    current = index.docs[id] or {}
+                    self._store(index, id, {**current, **doc})
+                else:
+                    status = 404
+            elif action == "delete":
+                status = 200 if index.docs.pop(id, False) is not False else 404
+                index.seq.pop(id, None)
+                self.changed()
+            items.append(
+                {action: {"_index": meta["_index"], "_id": id, "status": status}}
+            )
+
+        took = await self.wait(docs=len(items))
+        return {
+            "took": int(took * 1000),
+            "errors": any(item[next(iter(item))]["status"] >= 300 for item in items),
+            "items": items,
+        }
+
+    async def get(self, index: str, id: str, **kwargs) -> Doc:
+        await self.wait()
+        for name in self.resolve(index):
+            source = self._indices[name].docs.get(id)
+            if source is not None:
+                return {"_index": name, "_id": id, "found": True, "_source": source}
+        raise _error(NotFoundError, 404, "not_found", f"document [{id}] not found")
+
+    async def mget(
+        self,
+        index: str,
+        ids: List[str],
+        source_includes: Optional[List[str]] = None,
+        **kwargs,
+    ) -> Doc:
+        await self.wait()
+        names = self.resolve(index, missing_ok=True)
+        docs = []
+        for id in ids:
+            source = next(
+                (
+                    self._indices[name].docs[id]
+                    for name in names
+                    if self._indices[name].docs.get(id)
+                ),
+                None,
+            )
+            if source is None:
+                docs.append({"_index": index, "_id": id, "found": False})
+                continue
+            if source_includes:
+                source = {
+                    field: source[field] for field in source_includes if field in source
+                }
+            docs.append({"_index": index, "_id": id, "found": True, "_source": source})
+        return {"docs": docs}
+
+    async def update(self, index: str, id: str, doc: Doc, **kwargs) -> Doc:
+        await self.wait(docs=1)
+        for name in self.resolve(index):
+            if id in self._indices[name].docs:
+                self._store(
+                    self._indices[name],
+                    id,
+                    {**(self._indices[name].docs[id] or {}), **doc},
+                )
+                return {"_index": name, "_id": id, "result": "updated"}
+        raise _error(
+            NotFoundError, 404, "document_missing_exception", f"document [{id}] missing"
+        )
+
+    async def delete(self, index: str, id: str, **kwargs) -> Doc:
+        await self.wait(docs=1)
+        for name in self.resolve(index):
+            if self._indices[name].docs.pop(id, False) is not False:
+                self._indices[name].seq.pop(id, None)
+                self.changed()
+                return {"_index": name, "_id": id, "result": "deleted"}
+        raise _error(NotFoundError, 404, "not_found", f"document [{id}] not found")
+
+    async def delete_by_query(self, index: str, body: Doc, **kwargs) -> Doc:
+        await self.wait()
+        matches = self._compile(body.get("query"))
+        deleted = 0
+        for name in self.resolve(index):
+            fake_index = self._indices[name]
+            for id in [
+                id
+                for id, doc in fake_index.docs.items()
+                if doc is not None and matches(doc)[0]
+            ]:
+                del fake_index.docs[id]
+                fake_index.seq.pop(id, None)
+                deleted += 1
+        self.changed()
+        return {"deleted": deleted, "failures": []}
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> Doc:
+        await self.wait()
+        pit_id = f"pit-{next(self._pit_ids)}"
+        self.pits[pit_id] = self._snapshot(index)
+        return {"id": pit_id}
+
+    async def close_point_in_time(self, id: str, **kwargs) -> Doc:
+        await self.wait()
+        return {"succeeded": self.pits.pop(id, None) is not None, "num_freed": 1}
+
+    def _snapshot(self, index: str) -> List[Tuple[str, Doc, int]]:
+        return [
+            (id, doc, self._indices[name].seq[id])
+            for name in self.resolve(index)
+            for id, doc in self._indices[name].docs.items()
+            if doc is not None
+        ]
+
+    async def search(
+        self, index: Optional[str] = None, body: Optional[Doc] = None, **kwargs
+    ) -> Doc:
+        body = {**(body or {}), **kwargs}
+        key = json.dumps([index, body], sort_keys=True, default=str)
+        response = self._responses.get(key)
+        if response is None:
+            response = self._responses[key] = self._search(index, body)
+
+        took = await self.wait()
+        return {**response, "took": int(took * 1000)}
+
+    def _search(self, index: Optional[str], body: Doc) -> Doc:
+        pit = body.get("pit")
+        if pit is not None:
+            if pit["id"] not in self.pits:
+                raise _error(
+                    NotFoundError, 404, "search_context_missing_exception", pit["id"]
+                )
+            docs = self.pits[pit["id"]]
+        else:
+            docs = self._snapshot(index)
+
+        query = self._compile(body.get("query"))
+        matched = []
+        for id, doc, seq in docs:
+            ok, score = query(doc)
+            if ok:
+                matched.append((id, doc, seq, score))
+
+        aggregations = None
+        if body.get("aggs"):
+            aggregations = {
+                name: self._aggregate(agg, [doc for _, doc, _, _ in matched])
+                for name, agg in body["aggs"].items()
+            }
+
+        if body.get("post_filter"):
+            post_filter = self._compile(body["post_filter"])
+            matched = [hit for hit in matched if post_filter(hit[1])[0]]
+
+        if body.get("collapse"):
+            field, seen, collapsed = body["collapse"]["field"], set(), []
+            for hit in matched:
+                key = _field_value(hit[1], field)
+                if key not in seen:
+                    seen.add(key)
+                    collapsed.append(hit)
+            matched = collapsed
+
+        sort_values = self._sorter(body.get("sort"))
+        matched.sort(key=lambda hit: sort_values(hit)[0])
+        if body.get("search_after"):
+            after = tuple(body["search_after"])
+            matched = [
+                hit
+                for hit in matched
+                if sort_values(hit)[0] > sort_values.key_of(after)
+            ]
+
+        start = 0 if body.get("search_after") else body.get("from", 0)
+        page = matched[start : start + body.get("size", 10)]
+        hits = []
+        for id, doc, seq, score in page:
+            hit = {
+                "_index": index,
+                "_id": id,
+                "_score": score,
+                "_source": self._source(doc, body.get("_source")),
+            }
+            if body.get("sort"):
+                hit["sort"] = sort_values((id, doc, seq, score))[1]
+            hits.append(hit)
+
+        response = {"timed_out": False, "hits": {"hits": hits}}
+        track_total_hits = body.get("track_total_hits", 10000)
+        if track_total_hits is not False:
+            total = len(matched)
+            if track_total_hits is not True and total > track_total_hits:
+                response["hits"]["total"] = {
+                    "value": track_total_hits,
+                    "relation": "gte",
+                }
+            else:
+                response["hits"]["total"] = {"value": total, "relation": "eq"}
+        if aggregations is not None:
+            response["aggregations"] = aggregations
+        if pit is not None:
+            response["pit_id"] = pit["id"]
+        return response
+
+    @staticmethod
+    def _source(doc: Doc, includes: Any) -> Doc:
+        if includes is None or includes is True:
+            return doc
+        if includes is False:
+            return {}
+        return {field: doc[field] for field in includes if field in doc}
+
+    def _sorter(self, sort: Optional[List[Any]]) -> Callable:
+        fields = []
+        for item in sort or ["_score", "_shard_doc"]:
+            if isinstance(item, str):
+                field, order = item, "desc" if item == "_score" else "asc"
+            else:
+                ((field, order),) = item.items()
+                order = order.get("order", "asc") if isinstance(order, dict) else order
+            fields.append((field, order == "desc"))
+
+        def value_of(hit, field):
+            id, doc, seq, score = hit
+            if field == "_score":
+                return score
+            if field == "_shard_doc":
+                return seq
+            return _field_value(doc, field)
+
+        def key_of(values):
+            key = []
+            for (_, desc), value in zip(fields, values):
+                if isinstance(value, (int, float)):
+                    key.append((0, -value if desc else value))
+                else:
+                    # Descending order is only supported on numbers
+                    key.append((1, "" if value is None else str(value)))
+            return tuple(key)
+
+        def sorter(hit):
+            values = [value_of(hit, field) for field, _ in fields]
+            return key_of(values), values
+
+        sorter.key_of = key_of
+        return sorter
+
+    def _compile(self, query: Optional[Doc]) -> Callable[[Doc], Tuple[bool, float]]:
+        """
+        Builds a function evaluating a query against a document.
+
+        Args:
+            query (Optional[Doc]): Query DSL, `match_all` when None.
+
+        Returns:
+            Callable[[Doc], Tuple[bool, float]]: Whether a document matches, and its score.
+        """
+        if not query:
+            return lambda doc: (True, 1.0)
+        ((kind, params),) = query.items()
+
+        if kind == "match_all":
+            return lambda doc: (True, 1.0)
+
+        if kind == "bool":
+            must = [self._compile(clause) for clause in params.get("must", [])]
+            filters = [self._compile(clause) for clause in params.get("filter", [])]
+            must_not = [self._compile(clause) for clause in params.get("must_not", [])]
+            should = [self._compile(clause) for clause in params.get("should", [])]
+
+            def matches(doc):
+                score = 0.0
+                for clause in must:
+                    ok, clause_score = clause(doc)
+                    if not ok:
+                        return False, 0.0
+                    score += clause_score
+                if any(not clause(doc)[0] for clause in filters):
+                    return False, 0.0
+                if any(clause(doc)[0] for clause in must_not):
+                    return False, 0.0
+                if should:
+                    scores = [clause(doc) for clause in should]
+                    if not any(ok for ok, _ in scores) and not (must or filters):
+                        return False, 0.0
+                    score += sum(clause_score for ok, clause_score in scores if ok)
+                return True, score or 1.0
+
+            return matches
+
+        if kind == "term":
+            ((field, value),) = params.items()
+            value = value["value"] if isinstance(value, dict) else value
+            return lambda doc: (value in _values(doc, field), 1.0)
+
+        if kind == "terms":
+            ((field, values),) = params.items()
+            values = set(values)
+            return lambda doc: (
+                any(value in values for value in _values(doc, field)),
+                1.0,
+            )
+
+        if kind == "range":
+            ((field, bounds),) = params.items()
+            operators = {
+                "gt": lambda a, b: a > b,
+                "gte": lambda a, b: a >= b,
+                "lt": lambda a, b: a < b,
+                "lte": lambda a, b: a <= b,
+            }
+            checks = [
+                (operators[op], bound)
+                for op, bound in bounds.items()
+                if op in operators
+            ]
+            return lambda doc: (
+                any(
+                    all(check(value, bound) for check, bound in checks)
+                    for value in _values(doc, field)
+                ),
+                1.0,
+            )
+
+        if kind == "match":
+            ((field, value),) = params.items()
+            text = value["query"] if isinstance(value, dict) else value
+            fuzzy = isinstance(value, dict) and value.get("fuzziness") is not None
+            return self._text_matcher([field], _tokens(text), fuzzy=fuzzy, prefix=False)
+
+        if kind == "multi_match":
+            # Fields of a `search_as_you_type` field share the parent value
+            fields = sorted({field.split(".", 1)[0] for field in params["fields"]})
+            return self._text_matcher(
+                fields,
+                _tokens(params["query"]),
+                fuzzy=False,
+                prefix=params.get("type") == "bool_prefix",
+            )
+
+        raise ValueError(f"Unsupported query: {kind}")
+
+    @staticmethod
+    def _text_matcher(
+        fields: List[str], terms: List[str], fuzzy: bool, prefix: bool
+    ) -> Callable:
+        def close(term, token):
+            if term == token:
+                return True
+            if fuzzy and len(term) > 2 and abs(len(term) - len(token)) <= 1:
+                # Cheap stand-in for an edit distance of one
+                return sum(a != b for a, b in zip(term, token)) <= 1
+            return False
+
+        def matches(doc):
+            tokens = [
+                token
+                for field in fields
+                for token in _tokens(_field_value(doc, field) or "")
+            ]
+            if prefix:
+                *complete, last = terms or [""]
+                found = [term in tokens for term in complete]
+                found.append(any(token.startswith(last) for token in tokens))
+            else:
+                found = [any(close(term, token) for token in tokens) for term in terms]
+            score = float(sum(found))
+            # `match` is an OR of its terms, `bool_prefix` requires each of them
+            ok = all(found) if prefix else score > 0
+            return ok, score
+
+        return matches
+
+    def _aggregate(self, agg: Doc, docs: List[Doc]) -> Doc:
+        sub_aggs = agg.get("aggs", {})
+        kind = next(key for key in agg if key != "aggs")
+        params = agg[kind]
+
+        def bucket(docs: List[Doc], **extra) -> Doc:
+            return {
+                **extra,
+                "doc_count": len(docs),
+                **{name: self._aggregate(sub, docs) for name, sub in sub_aggs.items()},
+            }
+
+        if kind == "filter":
+            matches = self._compile(params)
+            return bucket([doc for doc in docs if matches(doc)[0]])
+
+        if kind == "terms":
+            groups: Dict[Any, List[Doc]] = {}
+            for doc in docs:
+                for value in _values(doc, params["field"]):
+                    groups.setdefault(value, []).append(doc)
+            ordered = sorted(
+                groups.items(), key=lambda item: (-len(item[1]), str(item[0]))
+            )
+            size = params.get("size", 10)
+            return {
+                "doc_count_error_upper_bound": 0,
+                "sum_other_doc_count": sum(len(group) for _, group in ordered[size:]),
+                "buckets": [bucket(group, key=key) for key, group in ordered[:size]],
+            }
+
+        values = sorted(
+            float(value)
+            for doc in docs
+            for value in _values(doc, params["field"])
+            if isinstance(value, (int, float))
+        )
+        if kind == "avg":
+            return {"value": sum(values) / len(values) if values else None}
+        if kind == "stats":
+            return {
+                "count": len(values),
+                "min": values[0] if values else None,
+                "max": values[-1] if values else None,
+                "avg": sum(values) / len(values) if values else None,
+                "sum": sum(values),
+            }
+        if kind == "percentiles":
+            result = {}
+            for percent in params.get("percents", [1, 5, 25, 50, 75, 95, 99]):
+                result[str(float(percent))] = _percentile(values, percent)
+            return {"values": result}
+        raise ValueError(f"Unsupported aggregation: {kind}")
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
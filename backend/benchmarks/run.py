@@ -0,0 +1,395 @@
+"""
+Benchmarks of the backend against an in-process Elasticsearch stand-in.
+
+Usage:
+
+```bash
+python -m benchmarks.run bulk --rows 10000 100000 1000000
+python -m benchmarks.run endpoints --rows 10000 --concurrency 32 --requests 2000
+python -m benchmarks.run all --json results.json
+```
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app, invalidate_caches
+from app.metrics import InstrumentedClient
+from app.search import get_es
+from benchmarks.data import SOURCE_CSV, synthetic_csv
+from benchmarks.fake_es import FakeElasticsearch
+
+# Requests of the endpoints benchmark, by name.
+ENDPOINTS = {
+    "politicians": "/politicians",
+    "politicians_deep_page": "/politicians?page=50&per_page=20",
+    "politicians_name": "/politicians?name=garcia&party=PSOE,Partido Popular",
+    "politicians_facets": "/politicians?facets=true&gender=Mujer",
+    "statistics": "/statistics",
+    "available_parties": "/available_parties",
+    "available_genders": "/available_genders",
+}
+
+
+def rss_bytes() -> int:
+    """
+    Returns:
+        int: Resident memory of the process, or its peak where the current value is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class PeakMemory:
+    """
+    Samples the resident memory of the process in a thread to find its peak
+    while a block runs.
+
+    Usage:
+
+    ```python
+    with PeakMemory() as memory:
+        run()
+    print(memory.peak, memory.peak - memory.start)
+    ```
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval (float): Seconds between samples.
+        """
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self) -> "PeakMemory":
+        self.start = self.peak = rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """
+    Args:
+        values (Sequence[float]): Sorted values.
+        percent (float): Percentile between 0 and 100.
+
+    Returns:
+        float: Nearest-rank percentile of the values.
+    """
+    if not values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[rank]
+
+
+def client_for(es: FakeElasticsearch) -> AsyncClient:
+    # The real client is instrumented, so is the fake one for comparable overhead
+    instrumented = InstrumentedClient(es)
+    app.dependency_overrides[get_es] = lambda: instrumented
+    return AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://benchmark", timeout=None
+    )
+
+
+async def import_csv(
+    client: AsyncClient, path: Path, params: Dict[str, Any]
+) -> Dict[str, Any]:
+    with open(path, "rb") as file:
+        response = await client.post(
+            "/bulk", params=params, files={"file": (path.name, file, "text/csv")}
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+async def benchmark_bulk(
+    rows: Sequence[int],
+    source: Path = SOURCE_CSV,
+    latency: float = 0.002,
+    per_doc_latency: float = 0.00002,
+    params: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Imports synthetic CSV files of each size through POST /bulk.
+
+    Documents are not kept by the stand-in, so the peak memory is the one of the
+    import pipeline. Sizes run one after the other in the same process, run a
+    single size per invocation for isolated memory figures.
+
+    Args:
+        rows (Sequence[int]): Number of rows of each import.
+        source (Path): Sample CSV the imports are scaled up from.
+        latency (float): Seconds each Elasticsearch request waits.
+        per_doc_latency (float): Seconds added for each indexed document.
+        params (Optional[Dict[str, Any]]): Query parameters of POST /bulk.
+
+    Returns:
+        List[Dict[str, Any]]: Throughput and memory of each import.
+    """
+    previous = app.dependency_overrides.get(get_es)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for count in rows:
+                path = synthetic_csv(
+                    Path(directory) / f"import-{count}.csv", count, source
+                )
+                es = FakeElasticsearch(
+                    latency=latency,
+                    per_doc_latency=per_doc_latency,
+                    keep_documents=False,
+                )
+                async with client_for(es) as client:
+                    with PeakMemory() as memory:
+                        started = time.perf_counter()
+                        result = await import_csv(client, path, params or {})
+                        elapsed = time.perf_counter() - started
+
+                results.append(
+                    {
+                        "rows": count,
+                        "file_mb": round(path.stat().st_size / 2**20, 1),
+                        "indexed": result["indexed"],
+                        "failed": result["failed"],
+                        "rejected": result["rejected"],
+                        "seconds": round(elapsed, 2),
+                        "rows_per_second": round(count / elapsed, 1),
+                        "peak_rss_mb": round(memory.peak / 2**20, 1),
+                        "rss_growth_mb": round((memory.peak - memory.start) / 2**20, 1),
+                    }
+                )
+                path.unlink()
+    finally:
+        restore_override(previous)
+    return results
+
+
+async def benchmark_endpoints(
+    rows: int = 10000,
+    concurrency: int = 16,
+    requests: int = 1000,
+    source: Path = SOURCE_CSV,
+    latency: float = 0.002,
+    endpoints: Optional[Dict[str, str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Load tests the read endpoints over an index of `rows` politicians.
+    A first request to each endpoint warms up the caches of the backend and of
+    the stand-in, so cached endpoints are measured as served in production.
+
+    Args:
+        rows (int): Number of politicians imported before the load test.
+        concurrency (int): Number of requests in flight.
+        requests (int): Number of requests sent to each endpoint.
+        source (Path): Sample CSV the index is loaded from.
+        latency (float): Seconds each Elasticsearch request waits.
+        endpoints (Optional[Dict[str, str]]): Paths to load test by name, `ENDPOINTS` by default.
+
+    Returns:
+        List[Dict[str, Any]]: Latency percentiles and throughput of each endpoint.
+    """
+    previous = app.dependency_overrides.get(get_es)
+    es = FakeElasticsearch(latency=latency)
+    results = []
+    try:
+        async with client_for(es) as client:
+            with tempfile.TemporaryDirectory() as directory:
+                path = synthetic_csv(Path(directory) / "import.csv", rows, source)
+                await import_csv(client, path, {})
+            # Let the statistics rebuilt after the import finish before measuring
+            await asyncio.sleep(latency * 10)
+            invalidate_caches()
+
+            for name, url in (endpoints or ENDPOINTS).items():
+                await client.get(url)
+                results.append(
+                    {
+                        "endpoint": name,
+                        **await load_test(client, url, concurrency, requests),
+                    }
+                )
+    finally:
+        restore_override(previous)
+    return results
+
+
+async def load_test(
+    client: AsyncClient, url: str, concurrency: int, requests: int
+) -> Dict[str, Any]:
+    """
+    Sends `requests` GET requests to a URL keeping `concurrency` of them in flight.
+
+    Returns:
+        Dict[str, Any]: Latency percentiles in milliseconds, throughput and error count.
+    """
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+def restore_override(previous):
+    if previous is None:
+        app.dependency_overrides.pop(get_es, None)
+    else:
+        app.dependency_overrides[get_es] = previous
+
+
+def print_table(title: str, results: List[Dict[str, Any]]):
+    if not results:
+        return
+    columns = list(results[0])
+    widths = {
+        column: max(len(column), *(len(str(result[column])) for result in results))
+        for column in columns
+    }
+    print(f"\n{title}")
+    print("  ".join(column.rjust(widths[column]) for column in columns))
+    for result in results:
+        print(
+            "  ".join(str(result[column]).rjust(widths[column]) for column in columns)
+        )
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the backend against an in-process Elasticsearch stand-in."
+    )
+    parser.add_argument(
+        "suite", choices=["bulk", "endpoints", "all"], nargs="?", default="all"
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Rows of each import (bulk, default 10000 100000) or of the index (endpoints, default 10000).",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Requests in flight."
+    )
+    parser.add_argument(
+        "--requests", type=int, default=1000, help="Requests per endpoint."
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.002,
+        help="Seconds per Elasticsearch request.",
+    )
+    parser.add_argument(
+        "--per-doc-latency",
+        type=float,
+        default=0.00002,
+        help="Seconds per indexed document.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="`workers` of POST /bulk."
+    )
+    parser.add_argument(
+        "--bulk-chunk-size",
+        type=int,
+        default=None,
+        help="`bulk_chunk_size` of POST /bulk.",
+    )
+    parser.add_argument(
+        "--source", type=Path, default=SOURCE_CSV, help="Sample CSV to scale up."
+    )
+    parser.add_argument(
+        "--json", type=Path, default=None, help="Also write the results to a file."
+    )
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    results = {}
+
+    if args.suite in ("bulk", "all"):
+        params = {
+            name: value
+            for name, value in (
+                ("workers", args.workers),
+                ("bulk_chunk_size", args.bulk_chunk_size),
+            )
+            if value is not None
+        }
+        results["bulk"] = await benchmark_bulk(
+            args.rows or [10000, 100000],
+            source=args.source,
+            latency=args.latency,
+            per_doc_latency=args.per_doc_latency,
+            params=params,
+        )
+        print_table("POST /bulk", results["bulk"])
+
+    if args.suite in ("endpoints", "all"):
+        results["endpoints"] = await benchmark_endpoints(
+            rows=(args.rows or [10000])[0],
+            concurrency=args.concurrency,
+            requests=args.requests,
+            source=args.source,
+            latency=args.latency,
+        )
+        print_table(
+            f"Read endpoints ({args.concurrency} concurrent requests)",
+            results["endpoints"],
+        )
+
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+import csv
+
+import pytest
+
+from benchmarks.data import synthetic_csv
+from benchmarks.run import benchmark_bulk, benchmark_endpoints, percentile
+
+SAMPLE = [
+    [
+        "NOMBRE",
+        "PARTIDO",
+        "GENERO",
+        "CARGO",
+        "INSTITUCION",
+        "CCAA",
+        "SUELDOBASE_SUELDO",
+    ],
+    [
+        "Ana García",
+        "PSOE",
+        "Mujer",
+        "Alcaldesa",
+        "Ayuntamiento de A",
+        "Galicia",
+        "30000,00",
+    ],
+    [
+        'Juan "Juanito" Pérez',
+        "Partido Popular",
+        "Hombre",
+        "Alcalde",
+        "Ayuntamiento de B",
+        "Aragón",
+        "42000,50",
+    ],
+    [
+        "Marta López",
+        "Otros partidos",
+        "Mujer",
+        "Concejala",
+        "Ayuntamiento de\nC",
+        "Murcia",
+        "",
+    ],
+]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "sample.csv"
+    with open(path, "w", encoding="utf-8-sig", newline="") as file:
+        csv.writer(file, delimiter=";").writerows(SAMPLE)
+    return path
+
+
+def test_synthetic_csv_repeats_rows_with_distinct_names(tmp_path, source):
+    path = synthetic_csv(tmp_path / "import.csv", 7, source)
+
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        rows = list(csv.reader(file, delimiter=";"))
+
+    assert rows[0] == SAMPLE[0]
+    assert len(rows) == 8
+    assert [row[0] for row in rows[1:]] == [
+        "Ana García",
+        'Juan "Juanito" Pérez',
+        "Marta López",
+        "Ana García 1",
+        'Juan "Juanito" Pérez 1',
+        "Marta López 1",
+        "Ana García 2",
+    ]
+    assert rows[6][4] == "Ayuntamiento de\nC"
+
+
+def test_percentile():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_benchmarks_run_against_the_stand_in(source):
+    bulk = await benchmark_bulk([50], source=source, latency=0, per_doc_latency=0)
+    assert bulk[0]["indexed"] == 50
+    assert bulk[0]["failed"] == 0
+    assert bulk[0]["peak_rss_mb"] > 0
+
+    endpoints = await benchmark_endpoints(
+        rows=50, concurrency=4, requests=8, source=source, latency=0
+    )
+    assert {result["endpoint"] for result in endpoints} >= {"politicians", "statistics"}
+    assert all(result["errors"] == 0 for result in endpoints)
+    assert all(result["p99_ms"] >= result["p50_ms"] for result in endpoints)
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.cache import TTLCache
+
+
+class Loader:
+    def __init__(self, value="value", delay=0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+@pytest.mark.asyncio
+async def test_cache_serves_stored_value():
+    cache = TTLCache(ttl=60)
+    loader = Loader()
+
+    assert await cache.get_or_load("key", loader) == "value"
+    assert await cache.get_or_load("key", loader) == "value"
+    assert loader.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_cache_collapses_concurrent_misses():
+    cache = TTLCache(ttl=60)
+    loader = Loader(delay=0.01)
+
+    values = await asyncio.gather(
+        *(cache.get_or_load("key", loader) for _ in range(10))
+    )
+
+    assert values == ["value"] * 10
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_expires_entries():
+    cache = TTLCache(ttl=0)
+    loader = Loader()
+
+    await cache.get_or_load("key", loader)
+    await cache.get_or_load("key", loader)
+    assert loader.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl=60, maxsize=2)
+    loaders = {key: Loader(key) for key in "abc"}
+
+    await cache.get_or_load("a", loaders["a"])
+    await cache.get_or_load("b", loaders["b"])
+    await cache.get_or_load("a", loaders["a"])
+    await cache.get_or_load("c", loaders["c"])
+    await cache.get_or_load("b", loaders["b"])
+
+    assert loaders["a"].calls == 1
+    assert loaders["b"].calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidate_discards_in_flight_load():
+    cache = TTLCache(ttl=60)
+    loader = Loader(delay=0.01)
+
+    pending = asyncio.create_task(cache.get_or_load("key", loader))
+    await asyncio.sleep(0)
+    cache.invalidate()
+    await pending
+    await cache.get_or_load("key", loader)
+
+    assert loader.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_does_not_store_errors():
+    cache = TTLCache(ttl=60)
+
+    async def failing_loader():
+        raise RuntimeError("cluster unavailable")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_load("key", failing_loader)
+    assert await cache.get_or_load("key", Loader()) == "value"
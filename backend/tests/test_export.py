@@ -0,0 +1,46 @@
+import io
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.export import csv_header, csv_rows, search_all
+from app.ingest import open_csv_reader, read_csv_chunk
+
+
+def hit(id: str, sort: int):
+    return {"_id": id, "_source": {"nombre": f"Politician {id}"}, "sort": [sort]}
+
+
+@pytest.mark.asyncio
+async def test_search_all_pages_with_search_after():
+    client = AsyncMock()
+    client.search.side_effect = [
+        {"pit_id": "pit", "hits": {"hits": [hit("1", 1), hit("2", 2)]}},
+        {"pit_id": "pit", "hits": {"hits": [hit("3", 3)]}},
+    ]
+
+    batches = [batch async for batch in search_all(client, "pit", {"match_all": {}}, 2)]
+
+    assert [[hit["_id"] for hit in batch] for batch in batches] == [["1", "2"], ["3"]]
+    assert client.search.await_args.kwargs["body"]["search_after"] == [2]
+    client.close_point_in_time.assert_awaited_once_with(id="pit")
+
+
+def test_csv_export_matches_import_format():
+    source = {
+        "nombre": "Ana; García",
+        "partido": "PSOE",
+        "sueldobase_sueldo": 37260.0,
+        "complementos_sueldo": None,
+        "observaciones": "Dedicación Exclusiva",
+    }
+    content = csv_header() + csv_rows([{"_id": "1", "_source": source}])
+
+    [row] = read_csv_chunk(open_csv_reader(io.BytesIO(content)))
+
+    assert content.startswith(b"\xef\xbb\xbfNOMBRE;")
+    assert b";37260,00;;" in content
+    assert row["nombre"] == "Ana; García"
+    assert row["sueldobase_sueldo"] == 37260.0
+    assert row["complementos_sueldo"] is None
+    assert row["observaciones"] == "Dedicación Exclusiva"
@@ -0,0 +1,252 @@
+import io
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import UploadFile
+
+from app.ingest import RowValidator, SkipUnchanged, csv_row_generator, parallel_bulk
+
+CSV_CONTENT = (
+    "NOMBRE;PARTIDO;SUELDOBASE_SUELDO;OBSERVACIONES\n"
+    "Ana;PSOE;37260,00;Dedicación Exclusiva\n"
+    "Luis;PP;;\n"
+    "Marta;Vox;8467,36;Dedicación Parcial\n"
+).encode("utf-8-sig")
+
+
+def make_upload(content: bytes = CSV_CONTENT) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename="import.csv")
+
+
+@pytest.mark.asyncio
+async def test_csv_row_generator_streams_in_chunks():
+    actions = [
+        action
+        async for action in csv_row_generator(
+            make_upload(), index="politicians", chunk_size=1, prefetch=1
+        )
+    ]
+
+    assert [action["nombre"] for action in actions] == ["Ana", "Luis", "Marta"]
+    assert all(action["_index"] == "politicians" for action in actions)
+    assert actions[0]["sueldobase_sueldo"] == 37260.0
+    assert actions[1]["sueldobase_sueldo"] is None
+    assert actions[1]["observaciones"] is None
+
+
+@pytest.mark.asyncio
+async def test_csv_row_generator_validates_rows():
+    content = (
+        "NOMBRE;PARTIDO;SUELDOBASE_SUELDO;OBSERVACIONES\n"
+        "Ana;PSOE;37.260,50;Dedicación Exclusiva\n"
+        ";PP;1000;\n"
+        "Luis;PP;mil;\n"
+        "Marta;;;\n"
+    ).encode("utf-8")
+    validator = RowValidator()
+
+    actions = [
+        action
+        async for action in csv_row_generator(make_upload(content), validator=validator)
+    ]
+
+    assert [action["nombre"] for action in actions] == ["Ana", "Marta"]
+    assert actions[0]["sueldobase_sueldo"] == 37260.5
+    assert actions[1]["sueldobase_sueldo"] == 0.0
+    assert actions[1]["partido"] == ""
+    assert actions[1]["retribucionanual"] == 0.0
+    assert validator.rejected == 2
+    assert validator.errors == [
+        {"row": 3, "column": "nombre", "value": None, "error": "Missing value"},
+        {
+            "row": 4,
+            "column": "sueldobase_sueldo",
+            "value": "mil",
+            "error": "Could not convert string to float",
+        },
+    ]
+
+
+@pytest.mark.asyncio
+async def test_csv_row_generator_rejects_duplicate_ids():
+    content = CSV_CONTENT + "Ana;PP;1000,00;\n".encode("utf-8")
+    validator = RowValidator()
+
+    actions = [
+        action
+        async for action in csv_row_generator(
+            make_upload(content),
+            chunk_size=4,
+            id_fields=["nombre"],
+            validator=validator,
+        )
+    ]
+
+    assert [action["partido"] for action in actions] == ["PSOE", "PP", "Vox"]
+    assert validator.rejected == 1
+    assert validator.errors == [
+        {"row": 5, "id": actions[0]["_id"], "error": "Duplicate id of row 2"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_csv_row_generator_derives_stable_ids():
+    async def ids(content: bytes, id_fields):
+        return [
+            (action["_id"], action["content_hash"])
+            async for action in csv_row_generator(
+                make_upload(content), id_fields=id_fields
+            )
+        ]
+
+    changed = CSV_CONTENT.replace(b"37260,00", b"40000,00")
+    first, second = await ids(CSV_CONTENT, ["nombre"]), await ids(changed, ["nombre"])
+
+    assert first == await ids(CSV_CONTENT, ["nombre"])
+    assert [id for id, _ in first] == [id for id, _ in second]
+    assert [hash for _, hash in first] != [hash for _, hash in second]
+    assert [id for id, _ in await ids(CSV_CONTENT, [])] == [hash for _, hash in first]
+
+
+@pytest.mark.asyncio
+async def test_skip_unchanged():
+    client = AsyncMock()
+    client.mget.return_value = {
+        "docs": [
+            {
+                "_id": "1",
+                "found": True,
+                "_source": {"content_hash": "a", "partido": "PP"},
+            },
+            {
+                "_id": "2",
+                "found": True,
+                "_source": {"content_hash": "old", "partido": "PP"},
+            },
+            {"_id": "3", "found": False},
+        ]
+    }
+    replaced = []
+
+    async def actions():
+        for id, content_hash in [("1", "a"), ("2", "b"), ("3", "c")]:
+            yield {"_id": id, "content_hash": content_hash}
+
+    unchanged = SkipUnchanged(
+        client, "politicians", fields=["partido"], on_replace=replaced.append
+    )
+    changed = [action["_id"] async for action in unchanged.filter(actions())]
+
+    assert changed == ["2", "3"]
+    assert unchanged.skipped == 1
+    assert replaced == [{"content_hash": "old", "partido": "PP"}]
+    assert client.mget.await_args.kwargs["source_includes"] == [
+        "content_hash",
+        "partido",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_csv_row_generator_stops_early():
+    generator = csv_row_generator(make_upload(), chunk_size=1, prefetch=1)
+
+    first = await generator.__anext__()
+    await generator.aclose()
+
+    assert first["nombre"] == "Ana"
+
+
+async def actions(count: int):
+    for i in range(count):
+        yield {"_index": "politicians", "nombre": f"politician {i}"}
+
+
+@pytest.mark.asyncio
+async def test_parallel_bulk_chunks_by_count():
+    client = AsyncMock()
+    client.bulk.side_effect = lambda operations: {
+        "took": 1,
+        "items": [{"index": {"status": 201}}] * (len(operations) // 2),
+    }
+
+    reports = [
+        report
+        async for report, _ in parallel_bulk(
+            client, actions(5), workers=2, chunk_size=2
+        )
+    ]
+
+    assert sorted(report.docs for report in reports) == [1, 2, 2]
+    assert sum(report.indexed for report in reports) == 5
+    assert client.bulk.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_parallel_bulk_retries_rejected_documents():
+    client = AsyncMock()
+    client.bulk.side_effect = [
+        {
+            "took": 1,
+            "items": [
+                {"index": {"status": 201}},
+                {
+                    "index": {
+                        "status": 429,
+                        "error": {"type": "es_rejected_execution_exception"},
+                    }
+                },
+            ],
+        },
+        {"took": 1, "items": [{"index": {"status": 201}}]},
+    ]
+
+    results = [
+        result async for result in parallel_bulk(client, actions(2), initial_backoff=0)
+    ]
+
+    [(report, errors)] = results
+    assert report.indexed == 2
+    assert report.retries == 1
+    assert errors == []
+    retried = client.bulk.await_args_list[1].kwargs["operations"]
+    assert b"politician 1" in retried[1]
+
+
+@pytest.mark.asyncio
+async def test_parallel_bulk_reports_failed_documents():
+    client = AsyncMock()
+    failure = {
+        "index": {
+            "_id": "1",
+            "status": 400,
+            "error": {"type": "mapper_parsing_exception"},
+        }
+    }
+    client.bulk.return_value = {"took": 1, "items": [failure]}
+
+    results = [result async for result in parallel_bulk(client, actions(1))]
+
+    [(report, errors)] = results
+    assert report.failed == 1
+    assert errors == [failure]
+
+
+@pytest.mark.asyncio
+async def test_parallel_bulk_reports_duplicates_of_new_index():
+    client = AsyncMock()
+    duplicate = {"index": {"_id": "1", "status": 200, "result": "updated"}}
+    client.bulk.return_value = {
+        "took": 1,
+        "items": [
+            {"index": {"_id": "0", "status": 201, "result": "created"}},
+            duplicate,
+        ],
+    }
+
+    [(report, errors)] = [
+        result async for result in parallel_bulk(client, actions(2), new_index=True)
+    ]
+
+    assert report.indexed == 1
+    assert report.failed == 0
+    assert errors == [duplicate]
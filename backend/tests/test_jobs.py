@@ -0,0 +1,50 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import UploadFile
+
+from app.jobs import ImportJobQueue
+
+
+def make_upload() -> UploadFile:
+    return UploadFile(file=io.BytesIO(b"NOMBRE\nAna\n"), filename="import.csv")
+
+
+@pytest.mark.asyncio
+async def test_import_job_queue_is_bounded():
+    release = asyncio.Event()
+
+    async def run(job):
+        await release.wait()
+        return {"message": "success"}
+
+    jobs = ImportJobQueue(max_queued=1, workers=1)
+    running = await jobs.submit(make_upload(), run)
+    await asyncio.sleep(0)
+    queued = await jobs.submit(make_upload(), run)
+
+    with pytest.raises(asyncio.QueueFull):
+        await jobs.submit(make_upload(), run)
+
+    assert jobs.get(running.id).status == "running"
+    assert jobs.get(queued.id).report()["status"] == "queued"
+    release.set()
+    await jobs.close()
+
+
+@pytest.mark.asyncio
+async def test_import_job_reports_failures():
+    async def run(job):
+        raise ValueError("bad file")
+
+    jobs = ImportJobQueue()
+    job = await jobs.submit(make_upload(), run)
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    report = job.report()
+    assert report["status"] == "failed"
+    assert report["error"] == "bad file"
+    assert report["eta_seconds"] is None
+    await jobs.close()
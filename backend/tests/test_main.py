@@ -1,10 +1,22 @@
-from unittest.mock import AsyncMock
+import asyncio
+import io
+import json
+from email.utils import parsedate_to_datetime
+from unittest.mock import ANY, AsyncMock
 
 import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ApiError, BadRequestError, NotFoundError
+from fastapi import UploadFile
 from httpx import ASGITransport, AsyncClient
 
-from app.main import app
+from app import main
+from app.ingest import RowValidator, csv_row_generator
+from app.main import app, invalidate_caches, watch_clear_task, write_behind_queue
+from app.rollups import PendingRollups
 from app.search import get_es
+from app.utils import encode_cursor
+from app.writebehind import WriteBehindQueue
 
 
 class MockES:
@@ -16,7 +28,12 @@ class MockES:
         self.patch = AsyncMock()
         self.indices = IndicesMock()
         self.cluster = ClusterMock()
+        self.tasks = TasksMock()
         self.delete_by_query = AsyncMock()
+        self.bulk = AsyncMock()
+        self.mget = AsyncMock()
+        self.open_point_in_time = AsyncMock()
+        self.close_point_in_time = AsyncMock()
 
 
 class ClusterMock:
@@ -24,15 +41,37 @@ class ClusterMock:
         self.health = AsyncMock()
 
 
+class TasksMock:
+    def __init__(self):
+        self.get = AsyncMock()
+
+
 class IndicesMock:
     def __init__(self):
         self.exists = AsyncMock()
         self.create = AsyncMock()
+        self.refresh = AsyncMock()
+        self.get_settings = AsyncMock()
+        self.put_settings = AsyncMock()
+        self.forcemerge = AsyncMock()
+        self.delete = AsyncMock()
+        self.exists_alias = AsyncMock()
+        self.get_alias = AsyncMock()
+        self.update_aliases = AsyncMock()
+        self.get_mapping = AsyncMock(return_value={})
+        self.put_mapping = AsyncMock()
 
 
 mock_es = MockES()
 
 
+def not_found_error() -> NotFoundError:
+    meta = ApiResponseMeta(
+        404, "1.1", HttpHeaders(), 0.0, NodeConfig("http", "localhost", 9200)
+    )
+    return NotFoundError("index_not_found_exception", meta, {})
+
+
 async def mock_get_es():
     return mock_es
 
@@ -40,6 +79,14 @@ async def mock_get_es():
 app.dependency_overrides[get_es] = mock_get_es
 
 
+@pytest.fixture(autouse=True)
+def clear_caches(monkeypatch):
+    invalidate_caches()
+    monkeypatch.setattr(main, "pending_rollups", PendingRollups())
+    monkeypatch.setattr(main, "clear_tasks", set())
+    monkeypatch.setattr(main, "watch_clear_task", AsyncMock())
+
+
 @pytest.fixture
 def client():
     return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
@@ -74,6 +121,949 @@ async def test_clear_index_endpoint_not_existent(client, mock_es):
     assert response.status_code == 404
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.bulk.side_effect = lambda operations: {
+        "took": 3,
+        "items": [
+            {"index": {"_id": str(i), "status": 201}}
+            for i in range(len(operations) // 2)
+        ],
+    }
+    file_content = "NOMBRE;PARTIDO\nAna;PSOE\nLuis;PP\nMarta;Vox\n".encode()
+    files = {"file": ("import.csv", io.BytesIO(file_content), "text/csv")}
+
+    response = await client.post("/bulk?bulk_chunk_size=2&workers=2", files=files)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["indexed"] == 3
+    assert body["failed"] == 0
+    assert [chunk["docs"] for chunk in body["chunks"]] == [2, 1]
+    mock_es.indices.refresh.assert_awaited_with(index="politicians")
+    mock_es.bulk.side_effect = None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload_reports_invalid_rows(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.bulk.reset_mock()
+    mock_es.bulk.return_value = {"took": 1, "items": [{"index": {"status": 201}}]}
+    file_content = "NOMBRE;SUELDOBASE_SUELDO\nAna;1000,5\nLuis;mil\n".encode()
+    files = {"file": ("import.csv", io.BytesIO(file_content), "text/csv")}
+
+    response = await client.post("/bulk?skip_unchanged=false", files=files)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["indexed"] == 1
+    assert body["rejected"] == 1
+    assert body["errors"] == [
+        {
+            "row": 3,
+            "id": None,
+            "column": "sueldobase_sueldo",
+            "value": "mil",
+            "error": "Could not convert string to float",
+        }
+    ]
+    assert b"Luis" not in b"".join(mock_es.bulk.await_args.kwargs["operations"])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload_requires_reindex_of_index_without_hashes(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.indices.get_mapping.return_value = {
+        "politicians-1": {"mappings": {"properties": {"nombre": {"type": "text"}}}}
+    }
+    files = {"file": ("import.csv", io.BytesIO(b"NOMBRE\nAna\n"), "text/csv")}
+
+    response = await client.post("/bulk", files=files)
+    mock_es.indices.get_mapping.return_value = {}
+
+    assert response.status_code == 409
+    assert "reindex=true" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload_background_job(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.bulk.return_value = {"took": 1, "items": [{"index": {"status": 201}}]}
+    files = {"file": ("import.csv", io.BytesIO(b"NOMBRE\nAna\n"), "text/csv")}
+
+    response = await client.post(
+        "/bulk?background=true&skip_unchanged=false", files=files
+    )
+
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(100):
+        job = (await client.get(f"/bulk/jobs/{job_id}")).json()
+        if job["status"] != "queued" and job["status"] != "running":
+            break
+        await asyncio.sleep(0.01)
+
+    assert job["status"] == "completed"
+    assert job["rows_parsed"] == 1
+    assert job["indexed"] == 1
+    assert job["bytes_read"] == job["bytes_total"] == len(b"NOMBRE\nAna\n")
+    assert job["result"]["indexed"] == 1
+    assert (await client.get("/bulk/jobs/unknown")).status_code == 404
+    await main.import_jobs.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload_background_job_skipping_every_row(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.bulk.reset_mock()
+    content = b"NOMBRE;SUELDOBASE_SUELDO\nAna;1000\nLuis;mil\n"
+    [row] = [
+        action
+        async for action in csv_row_generator(
+            UploadFile(file=io.BytesIO(content), filename="import.csv"),
+            validator=RowValidator(),
+        )
+    ]
+    mock_es.mget.return_value = {
+        "docs": [
+            {
+                "_id": row["_id"],
+                "found": True,
+                "_source": {"content_hash": row["content_hash"]},
+            }
+        ]
+    }
+    files = {"file": ("import.csv", io.BytesIO(content), "text/csv")}
+
+    response = await client.post("/bulk?background=true", files=files)
+
+    job_id = response.json()["job_id"]
+    for _ in range(100):
+        job = (await client.get(f"/bulk/jobs/{job_id}")).json()
+        if job["status"] != "queued" and job["status"] != "running":
+            break
+        await asyncio.sleep(0.01)
+
+    assert job["status"] == "completed"
+    assert job["rows_parsed"] == 2
+    assert job["skipped"] == 1
+    assert job["rejected"] == 1
+    assert job["indexed"] == 0
+    mock_es.bulk.assert_not_awaited()
+    await main.import_jobs.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload_fast_load(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.indices.get_settings.return_value = {
+        "politicians": {"settings": {"index.number_of_replicas": "1"}}
+    }
+    mock_es.indices.put_settings.reset_mock()
+    mock_es.bulk.return_value = {"took": 1, "items": [{"index": {"status": 201}}]}
+    files = {"file": ("import.csv", io.BytesIO(b"NOMBRE\nAna\n"), "text/csv")}
+
+    response = await client.post("/bulk?fast_load=true&force_merge=true", files=files)
+
+    assert response.status_code == 200
+    applied, restored = mock_es.indices.put_settings.await_args_list
+    assert applied.kwargs["settings"] == {
+        "index": {"refresh_interval": "-1", "number_of_replicas": 0}
+    }
+    assert restored.kwargs == {
+        "index": "politicians",
+        "settings": {"index": {"refresh_interval": None, "number_of_replicas": "1"}},
+    }
+    mock_es.indices.forcemerge.assert_awaited_with(
+        index="politicians", max_num_segments=1
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload_reindex_swaps_alias(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.indices.get_settings.return_value = {}
+    mock_es.indices.exists_alias.return_value = True
+    mock_es.indices.get_alias.return_value = {
+        "politicians-20240101000000000000": {"aliases": {"politicians": {}}}
+    }
+    mock_es.bulk.return_value = {"took": 1, "items": [{"index": {"status": 201}}]}
+    mock_es.search.reset_mock()
+    mock_es.search.return_value = {"aggregations": {"groups": {"buckets": []}}}
+    files = {"file": ("import.csv", io.BytesIO(b"NOMBRE\nAna\n"), "text/csv")}
+
+    response = await client.post("/bulk?reindex=true", files=files)
+
+    assert response.status_code == 200
+    new_index = response.json()["index"]
+    assert new_index.startswith("politicians-")
+    mock_es.indices.create.assert_awaited_with(index=new_index, body=ANY)
+    mock_es.indices.update_aliases.assert_awaited_with(
+        actions=[
+            {
+                "remove": {
+                    "index": "politicians-20240101000000000000",
+                    "alias": "politicians",
+                }
+            },
+            {"add": {"index": new_index, "alias": "politicians"}},
+        ]
+    )
+    mock_es.indices.delete.assert_awaited_with(
+        index=["politicians-20240101000000000000"]
+    )
+    # The rollups are rebuilt from the new index by one aggregation per dimension
+    aggregations = [
+        call
+        for call in mock_es.search.await_args_list
+        if "groups" in call.kwargs["body"].get("aggs", {})
+    ]
+    assert len(aggregations) == 4
+    assert not main.pending_rollups.rebuild
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload_reindex_rejects_duplicates_across_chunks(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.indices.get_settings.return_value = {}
+    mock_es.indices.exists_alias.return_value = False
+    results = iter(["created", "created", "updated"])
+
+    def bulk(operations, **kwargs):
+        items = []
+        for line in operations[::2]:
+            if isinstance(line, bytes):
+                id = json.loads(line)["index"]["_id"]
+                items.append(
+                    {"index": {"_id": id, "status": 201, "result": next(results)}}
+                )
+        return {"took": 1, "items": items}
+
+    mock_es.bulk.side_effect = bulk
+    file_content = b"NOMBRE;PARTIDO\nAna;PSOE\nLuis;PP\nAna;Vox\n"
+    files = {"file": ("import.csv", io.BytesIO(file_content), "text/csv")}
+
+    response = await client.post(
+        "/bulk?reindex=true&chunk_size=2&bulk_chunk_size=2&workers=1", files=files
+    )
+    mock_es.bulk.side_effect = None
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["indexed"] == 2
+    assert body["rejected"] == 1
+    assert body["errors"][0]["error"] == "Duplicate id of a previous row"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_bulk_upload_rejects_non_csv(client, mock_es):
+    files = {"file": ("import.txt", io.BytesIO(b"foo"), "text/plain")}
+
+    response = await client.post("/bulk", files=files)
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_clear_index_endpoint_truncate(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.indices.exists_alias.return_value = False
+    mock_es.indices.get_mapping.return_value = {
+        "politicians": {"mappings": {"properties": {"nombre": {"type": "text"}}}}
+    }
+    mock_es.indices.get_settings.return_value = {
+        "politicians": {
+            "settings": {
+                "index.number_of_shards": "1",
+                "index.uuid": "abc",
+                "index.version.created": "8130099",
+            }
+        }
+    }
+
+    response = await client.delete("/clear_index/politicians?mode=truncate")
+
+    assert response.status_code == 200
+    mock_es.indices.delete.assert_awaited_with(index="politicians")
+    mock_es.indices.create.assert_awaited_with(
+        index="politicians",
+        mappings={"properties": {"nombre": {"type": "text"}}},
+        settings={"index.number_of_shards": "1"},
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_clear_index_endpoint_task(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.delete_by_query.return_value = {"task": "node:1"}
+    mock_es.tasks.get.return_value = {
+        "completed": False,
+        "task": {"status": {"total": 10, "deleted": 4}},
+    }
+
+    response = await client.delete("/clear_index/politicians?mode=task")
+    assert response.status_code == 200
+    assert response.json()["task_id"] == "node:1"
+    assert mock_es.delete_by_query.await_args.kwargs["wait_for_completion"] is False
+
+    response = await client.get("/clear_index/tasks/node:1")
+    assert response.status_code == 200
+    assert response.json() == {
+        "task_id": "node:1",
+        "completed": False,
+        "total": 10,
+        "deleted": 4,
+        "failures": [],
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_clear_index_task_skips_caches_until_completed(client, mock_es):
+    mock_es.indices.exists.return_value = True
+    mock_es.delete_by_query.return_value = {"task": "node:1"}
+    mock_es.tasks.get.return_value = {"completed": False, "task": {"status": {}}}
+    mock_es.search.reset_mock()
+    mock_es.search.return_value = {
+        "aggregations": {"available_values": {"buckets": [{"key": "PSOE"}]}}
+    }
+
+    await client.delete("/clear_index/politicians?mode=task")
+    await client.get("/available_parties")
+    await client.get("/available_parties")
+    assert mock_es.search.await_count == 2
+
+    main.pending_rollups.rebuild = False
+    mock_es.tasks.get.return_value = {"completed": True, "task": {"status": {}}}
+    await client.get("/clear_index/tasks/node:1")
+    assert main.pending_rollups.rebuild is True
+
+    await client.get("/available_parties")
+    await client.get("/available_parties")
+    assert mock_es.search.await_count == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_watch_clear_task(mock_es, monkeypatch):
+    monkeypatch.setattr(main, "CLEAR_TASK_POLL_INTERVAL", 0)
+    main.clear_tasks.add("node:1")
+    mock_es.tasks.get.reset_mock()
+    mock_es.tasks.get.side_effect = [
+        {"completed": False, "task": {"status": {}}},
+        {"completed": True, "task": {"status": {}}},
+    ]
+
+    await watch_clear_task(mock_es, "node:1")
+
+    assert mock_es.tasks.get.await_count == 2
+    assert main.clear_tasks == set()
+    assert main.pending_rollups.rebuild is True
+    mock_es.tasks.get.side_effect = None
+
+
+def politician_hit(id: str, sort=None):
+    hit = {
+        "_id": id,
+        "_source": {
+            "nombre": f"Politician {id}",
+            "partido": "PSOE",
+            "partido_para_filtro": "PSOE",
+            "genero": "Mujer",
+            "cargo_para_filtro": "Alcalde",
+            "cargo": "Alcaldesa",
+            "institucion": "Ayuntamiento de Agost",
+            "ccaa": "Comunidad Valenciana",
+            "sueldobase_sueldo": 37260.0,
+            "complementos_sueldo": None,
+            "pagasextra_sueldo": None,
+            "otrasdietaseindemnizaciones_sueldo": 0.0,
+            "trienios_sueldo": None,
+            "retribucionmensual": 2661.43,
+            "retribucionanual": 37260.0,
+            "observaciones": "Dedicación Exclusiva",
+        },
+    }
+    if sort is not None:
+        hit["sort"] = sort
+    return hit
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_all_politicians(client, mock_es):
+    mock_es.search.return_value = {
+        "hits": {"total": {"value": 11}, "hits": [politician_hit("1")]}
+    }
+
+    response = await client.get("/politicians?party=PSOE,PP&gender=Mujer")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_pages"] == 2
+    assert body["data"][0]["_id"] == "1"
+    assert body["data"][0]["complementos_sueldo"] == 0.0
+    query = mock_es.search.await_args.kwargs["body"]["query"]
+    assert query["bool"]["filter"] == [
+        {"terms": {"partido": ["PSOE", "PP"]}},
+        {"terms": {"genero": ["Mujer"]}},
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_all_politicians_fast(client, mock_es):
+    mock_es.search.return_value = {
+        "hits": {
+            "total": {"value": 2},
+            "hits": [politician_hit("1"), politician_hit("2")],
+        }
+    }
+
+    validated = await client.get("/politicians?fields=*")
+    fast = await client.get("/politicians?fields=*&fast=true")
+
+    assert fast.status_code == 200
+    assert fast.json() == validated.json()
+    assert mock_es.search.await_args.kwargs["body"]["_source"][0] == "nombre"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_all_politicians_fields(client, mock_es):
+    mock_es.search.return_value = {
+        "hits": {"total": {"value": 1}, "hits": [politician_hit("1")]}
+    }
+
+    response = await client.get("/politicians?fields=nombre,partido&fast=true")
+
+    assert response.status_code == 200
+    assert response.json()["data"] == [
+        {"_id": "1", "nombre": "Politician 1", "partido": "PSOE"}
+    ]
+    assert mock_es.search.await_args.kwargs["body"]["_source"] == ["nombre", "partido"]
+
+    response = await client.get("/politicians?fields=nombre,password")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_all_politicians_facets(client, mock_es):
+    def facet(*buckets):
+        return {
+            "values": {
+                "buckets": [{"key": key, "doc_count": count} for key, count in buckets]
+            }
+        }
+
+    mock_es.search.return_value = {
+        "hits": {"total": {"value": 1}, "hits": [politician_hit("1")]},
+        "aggregations": {
+            "partido": facet(("PSOE", 7), ("PP", 5)),
+            "genero": facet(("Mujer", 7)),
+            "ccaa": facet(("Comunidad Valenciana", 7)),
+            "cargo_para_filtro": facet(("Alcalde", 7)),
+        },
+    }
+
+    response = await client.get("/politicians?party=PSOE&gender=Mujer&facets=true")
+
+    assert response.status_code == 200
+    assert response.json()["facets"]["partido"] == [
+        {"value": "PSOE", "count": 7},
+        {"value": "PP", "count": 5},
+    ]
+    body = mock_es.search.await_args.kwargs["body"]
+    assert body["post_filter"] == {
+        "bool": {
+            "filter": [
+                {"terms": {"partido": ["PSOE"]}},
+                {"terms": {"genero": ["Mujer"]}},
+            ]
+        }
+    }
+    assert body["aggs"]["partido"]["filter"] == {
+        "bool": {"filter": [{"terms": {"genero": ["Mujer"]}}]}
+    }
+    assert "filter" not in body["query"]["bool"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_all_politicians_total_hits_threshold(client, mock_es):
+    mock_es.search.return_value = {
+        "hits": {"total": {"value": 1000, "relation": "gte"}, "hits": []}
+    }
+
+    response = await client.get("/politicians?name=ana")
+    assert response.json()["total_pages"] == 100
+    assert response.json()["total_pages_exact"] is False
+    assert mock_es.search.await_args.kwargs["body"]["track_total_hits"] == 1000
+
+    response = await client.get("/politicians?name=ana&exact_count=true")
+    assert mock_es.search.await_args.kwargs["body"]["track_total_hits"] is True
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_all_politicians_cursor(client, mock_es):
+    mock_es.open_point_in_time.return_value = {"id": "pit-1"}
+    mock_es.search.return_value = {
+        "pit_id": "pit-2",
+        "hits": {"total": {"value": 3}, "hits": [politician_hit("1", [1.0, 7])]},
+    }
+
+    response = await client.get("/politicians?per_page=1&cursor=")
+
+    assert response.status_code == 200
+    next_cursor = response.json()["next_cursor"]
+    assert next_cursor is not None
+    assert mock_es.search.await_args.kwargs["body"]["pit"]["id"] == "pit-1"
+
+    mock_es.search.return_value = {
+        "pit_id": "pit-2",
+        "hits": {"total": {"value": 3}, "hits": []},
+    }
+    response = await client.get(f"/politicians?per_page=1&cursor={next_cursor}")
+
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] is None
+    body = mock_es.search.await_args.kwargs["body"]
+    assert body["pit"]["id"] == "pit-2"
+    assert body["search_after"] == [1.0, 7]
+    mock_es.close_point_in_time.assert_awaited_with(id="pit-2")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_all_politicians_invalid_cursor(client, mock_es):
+    response = await client.get("/politicians?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+    cursor = encode_cursor({"pit": "pit", "after": "not a list"})
+    response = await client.get(f"/politicians?cursor={cursor}")
+    assert response.status_code == 400
+
+    meta = ApiResponseMeta(
+        400, "1.1", HttpHeaders(), 0.0, NodeConfig("http", "localhost", 9200)
+    )
+    mock_es.search.side_effect = BadRequestError("illegal_argument_exception", meta, {})
+    cursor = encode_cursor({"pit": "invalid", "after": [1.0, 3]})
+    response = await client.get(f"/politicians?cursor={cursor}")
+    mock_es.search.side_effect = None
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_available_parties_is_cached(client, mock_es):
+    mock_es.search.reset_mock()
+    mock_es.search.return_value = {
+        "aggregations": {
+            "available_values": {"buckets": [{"key": "PSOE"}, {"key": "PP"}]}
+        }
+    }
+
+    for _ in range(3):
+        response = await client.get("/available_parties")
+        assert response.json() == ["PSOE", "PP"]
+    assert mock_es.search.await_count == 1
+
+    await client.delete("/politicians/1")
+    await client.get("/available_parties")
+    assert mock_es.search.await_count == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_statistics_snapshot(client, mock_es):
+    mock_es.search.reset_mock()
+    mock_es.search.return_value = {
+        "hits": {"total": {"value": 1}, "hits": [politician_hit("1")]},
+        "aggregations": {
+            "mean_salary": {"value": 37260.004},
+            "median_salary": {"values": {"50.0": 37260.0}},
+        },
+    }
+
+    response = await client.get("/statistics")
+    assert response.status_code == 200
+    assert response.json()["mean_salary"] == 37260.0
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+
+    response = await client.get("/statistics", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = await client.get(
+        "/statistics", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+    assert mock_es.search.await_count == 1
+
+    # A snapshot rebuilt within the same second still gets a later date
+    invalidate_caches()
+    response = await client.get(
+        "/statistics", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 200
+    assert parsedate_to_datetime(
+        response.headers["last-modified"]
+    ) > parsedate_to_datetime(last_modified)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_get_politicians_by_ids(client, mock_es):
+    mock_es.mget.return_value = {
+        "docs": [{**politician_hit("1"), "found": True}, {"_id": "2", "found": False}]
+    }
+
+    response = await client.post("/politicians/batch/get", json={"ids": ["1", "2"]})
+
+    assert response.status_code == 200
+    assert [politician["_id"] for politician in response.json()["data"]] == ["1"]
+    assert response.json()["not_found"] == ["2"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_update_politicians(client, mock_es):
+    mock_es.bulk.return_value = {
+        "items": [
+            {"update": {"_id": "1", "status": 200, "result": "updated"}},
+            {
+                "update": {
+                    "_id": "2",
+                    "status": 404,
+                    "error": {
+                        "type": "document_missing_exception",
+                        "reason": "[2]: document missing",
+                    },
+                }
+            },
+        ]
+    }
+
+    response = await client.post(
+        "/politicians/batch/update?refresh=false",
+        json={
+            "updates": [
+                {"id": "1", "doc": {"partido": "PP"}},
+                {"id": "2", "doc": {"sueldobase_sueldo": "1000.5"}},
+            ]
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json()["succeeded"] == 1
+    assert response.json()["items"][1]["error"] == "[2]: document missing"
+    mock_es.bulk.assert_awaited_with(
+        operations=[
+            {"update": {"_index": "politicians", "_id": "1"}},
+            {"doc": {"partido": "PP", "content_hash": None}},
+            {"update": {"_index": "politicians", "_id": "2"}},
+            {"doc": {"sueldobase_sueldo": 1000.5, "content_hash": None}},
+        ],
+        refresh="false",
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_delete_politicians(client, mock_es):
+    mock_es.bulk.return_value = {
+        "items": [{"delete": {"_id": "1", "status": 200, "result": "deleted"}}]
+    }
+
+    response = await client.post("/politicians/batch/delete", json={"ids": ["1"]})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "succeeded": 1,
+        "failed": 0,
+        "items": [{"id": "1", "status": 200, "result": "deleted", "error": None}],
+    }
+    assert mock_es.bulk.await_args.kwargs["refresh"] == "wait_for"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_batch_writes_missing_index(client, mock_es):
+    mock_es.mget.side_effect = not_found_error()
+
+    response = await client.post(
+        "/politicians/batch/update",
+        json={"updates": [{"id": "1", "doc": {"partido": "PP"}}]},
+    )
+    assert response.status_code == 404
+    response = await client.post("/politicians/batch/delete", json={"ids": ["1"]})
+    assert response.status_code == 404
+    mock_es.mget.side_effect = None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_update_politician_refresh_policy(client, mock_es):
+    mock_es.mget.reset_mock()
+    response = await client.patch(
+        "/politicians/1?refresh=false", json={"nombre": "Ana"}
+    )
+
+    assert response.status_code == 200
+    assert mock_es.update.await_args.kwargs["refresh"] == "false"
+    # Only the fields sent are written, so the groups are not looked up for a name change
+    assert mock_es.update.await_args.kwargs["doc"] == {
+        "nombre": "Ana",
+        "content_hash": None,
+    }
+    mock_es.mget.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_write_behind_coalesces_writes(client, mock_es):
+    mock_es.bulk.reset_mock()
+    mock_es.bulk.return_value = {"items": []}
+    mock_es.mget.reset_mock()
+    mock_es.mget.return_value = {
+        "docs": [{"_id": "1", "found": True, "_source": {"partido": "PSOE"}}]
+    }
+
+    response = await client.patch(
+        "/politicians/1?write_behind=true", json={"partido": "PP"}
+    )
+    assert response.status_code == 202
+    await client.patch("/politicians/1?write_behind=true", json={"genero": "Mujer"})
+    await client.patch("/politicians/2?write_behind=true", json={"partido": "PP"})
+    await client.delete("/politicians/2?write_behind=true")
+    # The groups politicians leave are only looked up when the queue is flushed
+    mock_es.mget.assert_not_awaited()
+
+    await write_behind_queue.close()
+
+    mock_es.mget.assert_awaited_once_with(
+        index="politicians", ids=["1", "2"], source_includes=ANY
+    )
+    assert main.pending_rollups.take("partido") == {"PP", "PSOE"}
+
+    mock_es.bulk.assert_awaited_once_with(
+        operations=[
+            {"update": {"_index": "politicians", "_id": "1"}},
+            {"doc": {"partido": "PP", "content_hash": None, "genero": "Mujer"}},
+            {"delete": {"_index": "politicians", "_id": "2"}},
+        ],
+        refresh="wait_for",
+    )
+
+
+@pytest.mark.asyncio
+async def test_write_behind_retries_only_transient_errors():
+    es = MockES()
+    queue = WriteBehindQueue("politicians", flush_interval=60, max_retries=2)
+    meta = ApiResponseMeta(
+        429, "1.1", HttpHeaders(), 0.0, NodeConfig("http", "localhost", 9200)
+    )
+    es.bulk.side_effect = ApiError("es_rejected_execution_exception", meta, {})
+
+    queue.update(es, "1", {"partido": "PP"})
+    for _ in range(2):
+        await queue.flush()
+        assert len(queue) == 1
+    await queue.flush()
+    assert len(queue) == 0
+    assert es.bulk.await_count == 3
+
+    es.bulk.side_effect = not_found_error()
+    queue.update(es, "1", {"partido": "PP"})
+    await queue.flush()
+    assert len(queue) == 0
+    assert es.bulk.await_count == 4
+    await queue.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_synchronous_writes_apply_after_queued_writes(client, mock_es):
+    writes = []
+    mock_es.bulk.reset_mock()
+    mock_es.bulk.side_effect = lambda operations, refresh: (
+        writes.append(("bulk", operations)) or {"items": []}
+    )
+    mock_es.update.side_effect = lambda **kwargs: writes.append(
+        ("update", kwargs["doc"])
+    )
+    mock_es.mget.return_value = {"docs": []}
+
+    await client.patch("/politicians/1?write_behind=true", json={"partido": "PP"})
+    await client.patch("/politicians/2?write_behind=true", json={"partido": "PP"})
+    response = await client.patch("/politicians/1", json={"partido": "PSOE"})
+    assert response.status_code == 200
+    assert writes[0] == (
+        "bulk",
+        [
+            {"update": {"_index": "politicians", "_id": "1"}},
+            {"doc": {"partido": "PP", "content_hash": None}},
+        ],
+    )
+    assert writes[1][0] == "update"
+    assert writes[1][1]["partido"] == "PSOE"
+
+    # A deleted politician has nothing left to write
+    mock_es.bulk.side_effect = lambda operations, refresh: {"items": []}
+    await client.post("/politicians/batch/delete", json={"ids": ["2"]})
+    assert len(write_behind_queue) == 0
+
+    mock_es.bulk.side_effect = None
+    mock_es.update.side_effect = None
+    await write_behind_queue.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_suggest_politicians(client, mock_es):
+    mock_es.search.return_value = {
+        "hits": {
+            "hits": [
+                {"_id": "1", "_source": {"nombre": "Ana García"}},
+                {"_id": "2", "_source": {"nombre": "Ana López"}},
+            ]
+        }
+    }
+
+    response = await client.get("/politicians/suggest?q=ana g&size=5")
+
+    assert response.status_code == 200
+    assert response.json() == ["Ana García", "Ana López"]
+    body = mock_es.search.await_args.kwargs["body"]
+    assert body["query"]["multi_match"]["type"] == "bool_prefix"
+    assert body["query"]["multi_match"]["query"] == "ana g"
+    assert body["size"] == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_statistics_by_dimension_recomputes_updated_groups(client, mock_es):
+    mock_es.mget.return_value = {
+        "docs": [{"_id": "1", "found": True, "_source": {"partido": "PSOE"}}]
+    }
+    mock_es.search.reset_mock()
+    mock_es.bulk.reset_mock()
+    mock_es.bulk.return_value = {"items": []}
+    rollup = {
+        "value": "PP",
+        "count": 1,
+        "mean_salary": 1000.0,
+        "median_salary": 1000.0,
+        "min_salary": 1000.0,
+        "max_salary": 1000.0,
+    }
+    mock_es.search.side_effect = [
+        {
+            "aggregations": {
+                "groups": {
+                    "buckets": [
+                        {
+                            "key": "PP",
+                            "doc_count": 1,
+                            "salary": {"avg": 1000.0, "min": 1000.0, "max": 1000.0},
+                            "median": {"values": {"50.0": 1000.0}},
+                        }
+                    ]
+                }
+            }
+        },
+        {"hits": {"hits": [{"_source": {"dimension": "partido", **rollup}}]}},
+    ]
+
+    await client.patch("/politicians/1", json={"partido": "PP"})
+    response = await client.get("/statistics/by/party")
+    mock_es.search.side_effect = None
+
+    assert response.status_code == 200
+    assert response.json() == {"dimension": "party", "groups": [rollup]}
+    aggregation = mock_es.search.await_args_list[0].kwargs["body"]
+    assert aggregation["query"] == {"terms": {"partido": ["PP", "PSOE"]}}
+    operations = mock_es.bulk.await_args.kwargs["operations"]
+    assert operations[1]["value"] == "PP"
+    assert operations[2] == {"delete": {"_index": "politicians_rollups", "_id": ANY}}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_export_politicians_ndjson(client, mock_es):
+    mock_es.open_point_in_time.return_value = {"id": "pit"}
+    mock_es.close_point_in_time.reset_mock()
+    mock_es.search.return_value = {
+        "pit_id": "pit",
+        "hits": {
+            "hits": [politician_hit("1", sort=[1]), politician_hit("2", sort=[2])]
+        },
+    }
+
+    response = await client.get("/politicians/export?format=ndjson&party=PSOE")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["_id"] for line in lines] == ["1", "2"]
+    body = mock_es.search.await_args.kwargs["body"]
+    assert body["query"]["bool"]["filter"] == [{"terms": {"partido": ["PSOE"]}}]
+    assert body["pit"]["id"] == "pit"
+    mock_es.close_point_in_time.assert_awaited_once_with(id="pit")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_metrics(client, mock_es):
+    mock_es.cluster.health.return_value = "health"
+    async with client as ac:
+        await ac.get("/")
+        response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/",status="200"}'
+        in response.text
+    )
+    assert 'cache_hits_total{cache="statistics"}' in response.text
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mock_es", [mock_es])
+async def test_slow_queries(client, mock_es, monkeypatch):
+    monkeypatch.setattr(main, "slow_queries", main.SlowQueryLog(threshold_ms=1e-6))
+    mock_es.search.return_value = {
+        "took": 3,
+        "hits": {"total": {"value": 1}, "hits": [politician_hit("1")]},
+    }
+
+    await client.get("/politicians?name=ana&party=PSOE")
+    response = await client.get("/admin/slow_queries")
+
+    assert response.status_code == 200
+    [entry] = response.json()
+    assert entry["endpoint"] == "/politicians"
+    assert entry["params"] == {"name": "ana", "party": "PSOE"}
+    assert entry["took_ms"] == 3
+    assert entry["body"]["query"]["bool"]["filter"] == [
+        {"terms": {"partido": ["PSOE"]}}
+    ]
+
+
 # FIXME:
 # Tests below are not working and I didn't have enough time to fix them or implement more tets
 
@@ -0,0 +1,96 @@
+import pytest
+
+from app.metrics import (
+    ES_REQUEST_DURATION,
+    ES_REQUEST_ERRORS,
+    ES_TOOK,
+    CallbackMetric,
+    Counter,
+    Histogram,
+    InstrumentedClient,
+    Registry,
+)
+
+
+class FakeIndices:
+    async def refresh(self, index):
+        return {"_shards": {"failed": 0}}
+
+
+class FakeClient:
+    def __init__(self):
+        self.indices = FakeIndices()
+        self.closed = False
+
+    async def search(self, **kwargs):
+        return {"took": 12, "hits": {"hits": []}}
+
+    async def get(self, **kwargs):
+        raise KeyError("missing")
+
+    def options(self, **kwargs):
+        return self
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+
+    lines = histogram.render()
+
+    assert lines[:2] == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+    ]
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1.0' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2.0' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3.0' in lines
+    assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+    assert 'latency_seconds_count{route="/a"} 3.0' in lines
+
+
+def test_registry_renders_counters_and_callbacks():
+    registry = Registry()
+    counter = registry.register(Counter("rows_total", "Rows", ["result"]))
+    counter.inc(3, "indexed")
+    counter.inc(2, "indexed")
+    registry.register(
+        CallbackMetric(
+            "hits_total", "Hits", ["cache"], lambda: [(('a"b',), 7)], type="counter"
+        )
+    )
+
+    text = registry.render()
+
+    assert 'rows_total{result="indexed"} 5.0\n' in text
+    assert "# TYPE hits_total counter\n" in text
+    assert 'hits_total{cache="a\\"b"} 7.0\n' in text
+
+
+@pytest.mark.asyncio
+async def test_instrumented_client_records_operations():
+    client = InstrumentedClient(FakeClient())
+    searches = ES_REQUEST_DURATION.count("search")
+    refreshes = ES_REQUEST_DURATION.count("indices.refresh")
+    took = ES_TOOK.count("search")
+
+    assert (await client.search(index="politicians"))["took"] == 12
+    await client.options(request_timeout=1).indices.refresh(index="politicians")
+
+    assert ES_REQUEST_DURATION.count("search") == searches + 1
+    assert ES_REQUEST_DURATION.count("indices.refresh") == refreshes + 1
+    assert ES_TOOK.count("search") == took + 1
+    assert client.closed is False
+
+
+@pytest.mark.asyncio
+async def test_instrumented_client_counts_errors():
+    client = InstrumentedClient(FakeClient())
+    errors = ES_REQUEST_ERRORS.value("get", "KeyError")
+
+    with pytest.raises(KeyError):
+        await client.get(index="politicians", id="1")
+
+    assert ES_REQUEST_ERRORS.value("get", "KeyError") == errors + 1
@@ -0,0 +1,21 @@
+from app.rollups import ImportedGroups, PendingRollups
+
+
+def test_imported_groups():
+    groups = ImportedGroups()
+    groups.add({"partido": "PSOE", "ccaa": "Galicia", "sueldobase_sueldo": 1000.0})
+    groups.add({"partido": "PP", "sueldobase_sueldo": None})
+
+    assert groups.groups()["partido"] == {"PSOE", "PP"}
+    assert groups.groups()["ccaa"] == {"Galicia", ""}
+
+
+def test_pending_rollups():
+    pending = PendingRollups()
+    pending.mark({"partido": "PSOE", "ccaa": "Galicia"})
+    pending.mark({"partido": "PP", "sueldobase_sueldo": 1000.0})
+
+    assert pending.take("partido", keep=True) == {"PSOE", "PP"}
+    assert pending.take("partido") == {"PSOE", "PP"}
+    assert pending.take("partido") == set()
+    assert pending.take("ccaa") == {"Galicia"}
@@ -0,0 +1,40 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from app.search import create_es_mapping
+
+
+class Address(BaseModel):
+    city: str
+
+
+class Person(BaseModel):
+    name: str = Field(..., text_field=True)
+    salary: float = Field(..., es_type="scaled_float", scaling_factor=100, index=False)
+    notes: str = Field(..., index=False, doc_values=False)
+    address: Address
+    previous_addresses: List[Address]
+    tags: List[str]
+
+
+def test_create_es_mapping():
+    mapping = create_es_mapping(Person)
+
+    assert mapping["name"] == {"type": "text", "fields": {"raw": {"type": "keyword"}}}
+    assert mapping["salary"] == {
+        "type": "scaled_float",
+        "null_value": 0,
+        "index": False,
+        "scaling_factor": 100,
+    }
+    assert mapping["notes"] == {"type": "keyword", "index": False, "doc_values": False}
+    assert mapping["address"] == {
+        "type": "object",
+        "properties": {"city": {"type": "keyword", "null_value": ""}},
+    }
+    assert mapping["previous_addresses"]["type"] == "nested"
+    assert (
+        mapping["previous_addresses"]["properties"] == mapping["address"]["properties"]
+    )
+    assert mapping["tags"] == {"type": "keyword", "null_value": ""}
@@ -0,0 +1,95 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.slowlog import SlowQueryLog, profile_body
+
+
+def slow_client(delay=0.01, took=7):
+    es = AsyncMock()
+
+    async def search(**kwargs):
+        await asyncio.sleep(delay)
+        body = kwargs.get("body", {})
+        response = {"took": took, "hits": {"hits": []}}
+        if body.get("profile"):
+            response["profile"] = {"shards": [{"id": "shard", "searches": []}]}
+        return response
+
+    es.search.side_effect = search
+    return es
+
+
+def test_profile_body_drops_point_in_time():
+    body = {
+        "query": {"match_all": {}},
+        "pit": {"id": "pit", "keep_alive": "1m"},
+        "search_after": [1.0, 3],
+        "sort": [{"_score": {"order": "desc"}}, {"_shard_doc": {"order": "asc"}}],
+    }
+
+    assert profile_body(body) == {
+        "query": {"match_all": {}},
+        "sort": [{"_score": {"order": "desc"}}],
+        "profile": True,
+    }
+    assert "pit" in body
+
+
+@pytest.mark.asyncio
+async def test_fast_searches_are_not_logged():
+    log = SlowQueryLog(threshold_ms=1000)
+    es = slow_client(delay=0)
+
+    await log.search(es, "/politicians", {}, index="politicians", body={"size": 1})
+
+    assert log.recent() == []
+
+
+@pytest.mark.asyncio
+async def test_slow_searches_are_logged_newest_first(capsys):
+    log = SlowQueryLog(threshold_ms=1, size=2)
+    es = slow_client()
+
+    for page in range(3):
+        await log.search(
+            es,
+            "/politicians",
+            {"page": str(page)},
+            index="politicians",
+            body={"from": page},
+        )
+
+    entries = log.recent()
+    assert [entry["params"] for entry in entries] == [{"page": "2"}, {"page": "1"}]
+    assert entries[0]["body"] == {"from": 2}
+    assert entries[0]["index"] == "politicians"
+    assert entries[0]["took_ms"] == 7
+    assert entries[0]["wall_ms"] >= 1
+    assert entries[0]["profile"] is None
+    assert log.recent(1) == entries[:1]
+    assert "slow query on /politicians: took=7ms" in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_slow_searches_are_profiled():
+    log = SlowQueryLog(threshold_ms=1, profile=True)
+    es = slow_client()
+
+    await log.search(
+        es, "/statistics", {"fields": "nombre"}, index="politicians", body={"size": 10}
+    )
+    await log.search(
+        es, "/statistics", {"fields": "cargo"}, index="politicians", body={"size": 10}
+    )
+    await log._profiling
+
+    newest, oldest = log.recent()
+    assert oldest["profile"] == {"shards": [{"id": "shard", "searches": []}]}
+    assert newest["profile"] is None
+    assert newest["profile_error"].startswith("Skipped")
+    es.search.assert_awaited_with(
+        index="politicians", body={"size": 10, "profile": True}
+    )
+    await log.close()